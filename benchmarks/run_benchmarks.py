@@ -0,0 +1,313 @@
+"""Benchmarks of the analytics backends on synthetic cohorts
+
+Every case runs on cohorts of increasing size drawn with
+heartpredict.synthetic.synthetic_cohort. Time is the best of several
+repeats after an untimed warm-up run, peak memory is measured with
+tracemalloc in a separate run, and throughput is rows per second.
+Results are written as JSON and compared with the committed baseline:
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 5000 --case correlation_pearson
+    python benchmarks/run_benchmarks.py --update-baseline
+
+The run fails if a tracked metric regresses past the threshold. The
+baseline is machine specific, so refresh it with --update-baseline when
+the reference machine changes.
+"""
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import joblib
+import typer
+from heartpredict.backend.correlation import CorrelationBackend
+from heartpredict.backend.descriptive import DescriptiveBackend
+from heartpredict.backend.survival import SurvivalBackend
+from heartpredict.data import MLData, ProjectData
+from heartpredict.enums import BoolColumn, CorrelationMethod, DiscreteColumn
+from heartpredict.synthetic import synthetic_cohort
+from sklearn.linear_model import LogisticRegression
+from typing_extensions import Annotated
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+BASELINE_FILE = BENCHMARK_DIR / "baseline.json"
+RESULTS_FILE = BENCHMARK_DIR / "results" / "latest.json"
+SIZES = [5_000, 50_000, 500_000]
+# Metrics compared with the baseline, higher is worse for both
+TRACKED_METRICS = ["seconds", "peak_memory_bytes"]
+
+
+@dataclass
+class Cohort:
+    rows: int
+    csv: Path
+    project_data: ProjectData
+    ml_data: MLData
+    regressor: Path
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable[[Cohort], object]
+
+
+@dataclass
+class Measurement:
+    case: str
+    rows: int
+    seconds: float
+    peak_memory_bytes: int
+    rows_per_second: float
+
+
+def _discrete_statistics(cohort: Cohort) -> None:
+    backend = DescriptiveBackend(cohort.project_data)
+    for column in DiscreteColumn:
+        backend.calculate_discrete_statistics(column.value)
+
+
+def _boolean_statistics(cohort: Cohort) -> None:
+    backend = DescriptiveBackend(cohort.project_data)
+    for column in BoolColumn:
+        backend.calculate_boolean_statistics(column.value)
+
+
+def _conditional_dataset(cohort: Cohort) -> None:
+    backend = DescriptiveBackend(cohort.project_data)
+    older = backend.create_conditional_dataset("age", 60, ">")
+    backend.create_conditional_dataset("ejection_fraction", 40, "<", older)
+
+
+def _query(cohort: Cohort) -> None:
+    # A fresh backend, so building the bitmap index is part of the case
+    DescriptiveBackend(cohort.project_data).query(
+        "age > 60 and ejection_fraction < 40 or serum_creatinine >= 2"
+    ).materialize()
+
+
+def _kaplan_meier(cohort: Cohort) -> None:
+    backend = SurvivalBackend(cohort.ml_data)
+    # Predicted scores are cached on disk, every run predicts again
+    shutil.rmtree(backend.scores_dir, ignore_errors=True)
+    backend.create_kaplan_meier_plot_for(cohort.regressor)
+
+
+CASES = [
+    Case("load_csv", lambda cohort: ProjectData(cohort.csv)),
+    *[
+        Case(
+            f"correlation_{method.value}",
+            lambda cohort, method=method: CorrelationBackend(
+                cohort.project_data
+            ).get_correlation_matrix(method),
+        )
+        for method in CorrelationMethod
+    ],
+    Case("descriptive_discrete_statistics", _discrete_statistics),
+    Case("descriptive_boolean_statistics", _boolean_statistics),
+    Case("descriptive_profile",
+         lambda cohort: DescriptiveBackend(cohort.project_data).profile()),
+    Case("descriptive_conditional_dataset", _conditional_dataset),
+    Case("descriptive_query", _query),
+    Case("survival_kaplan_meier_plot", _kaplan_meier),
+]
+
+
+def prepare_cohort(rows: int, workdir: Path, seed: int = 42) -> Cohort:
+    """
+    Write a synthetic cohort and train the regressor the survival case needs.
+    Args:
+        rows: Number of patients.
+        workdir: Directory of the CSV and the regressor.
+        seed: Random seed of the cohort.
+
+    Returns:
+        Cohort with loaded data.
+    """
+    csv = workdir / f"cohort_{rows}.csv"
+    synthetic_cohort(rows, seed).to_csv(csv, index=False)
+    project_data = ProjectData(csv)
+    ml_data = MLData(project_data, 0.2, seed)
+    regressor = workdir / f"regressor_{rows}.joblib"
+    model = LogisticRegression().fit(ml_data.train.x, ml_data.train.y)
+    joblib.dump(model, regressor)
+    return Cohort(rows, csv, project_data, ml_data, regressor)
+
+
+def measure(case: Case, cohort: Cohort, repeats: int = 3) -> Measurement:
+    """
+    Time a case and measure its peak memory. An untimed warm-up run
+    first pays for imports, lazy initialisation and cold caches, so they
+    are not attributed to the first size measured.
+    Args:
+        case: Benchmark case.
+        cohort: Data to run it on.
+        repeats: Timed runs, the fastest one counts.
+
+    Returns:
+        Measurement of the case.
+    """
+    case.run(cohort)
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        case.run(cohort)
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        case.run(cohort)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Measurement(
+        case.name, cohort.rows, seconds, peak - baseline, cohort.rows / seconds
+    )
+
+
+def run_suite(
+        sizes: List[int], cases: List[Case], repeats: int = 3
+) -> dict[str, dict]:
+    """
+    Run every case on cohorts of every size in a temporary working
+    directory, so scalers and plots written by the backends do not touch
+    the results of the project.
+    Args:
+        sizes: Cohort sizes.
+        cases: Cases to run.
+        repeats: Timed runs per case and size.
+
+    Returns:
+        Dictionary mapping "<case>@<rows>" to the measured metrics.
+    """
+    results = {}
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            for rows in sizes:
+                cohort = prepare_cohort(rows, Path(workdir))
+                for case in cases:
+                    measurement = measure(case, cohort, repeats)
+                    key = f"{case.name}@{rows}"
+                    results[key] = asdict(measurement)
+                    print(f"{key:<45} {measurement.seconds:>9.4f}s "
+                          f"{measurement.peak_memory_bytes / 2 ** 20:>9.1f} MiB "
+                          f"{measurement.rows_per_second:>14,.0f} rows/s")
+        finally:
+            os.chdir(previous)
+    return results
+
+
+def find_regressions(
+        results: dict[str, dict],
+        baseline: dict[str, dict],
+        threshold: float = 0.25,
+        min_seconds: float = 0.005,
+) -> list[str]:
+    """
+    Compare results with a baseline.
+    Args:
+        results: Measured metrics per case and size.
+        baseline: Baseline metrics per case and size.
+        threshold: Allowed relative increase of a tracked metric.
+        min_seconds: Timings below this are too noisy to compare.
+
+    Returns:
+        Description of every regression, empty if there are none.
+    """
+    regressions = []
+    for key, result in sorted(results.items()):
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        for metric in TRACKED_METRICS:
+            old, new = reference[metric], result[metric]
+            if metric == "seconds" and max(old, new) < min_seconds:
+                continue
+            if new > old * (1 + threshold):
+                regressions.append(
+                    f"{key} {metric}: {old:.6g} -> {new:.6g} "
+                    f"(+{(new / old - 1) * 100 if old else float('inf'):.0f}%)"
+                )
+    return regressions
+
+
+def main(
+        sizes: Annotated[Optional[List[int]], typer.Option(
+            "--sizes", help="Cohort sizes, can be repeated."
+        )] = None,
+        case: Annotated[Optional[List[str]], typer.Option(
+            help="Only run these cases, can be repeated."
+        )] = None,
+        repeats: Annotated[int, typer.Option(
+            help="Timed runs per case, the fastest counts."
+        )] = 3,
+        threshold: Annotated[float, typer.Option(
+            help="Allowed relative regression of time and peak memory."
+        )] = 0.25,
+        output: Annotated[str, typer.Option()] = str(RESULTS_FILE),
+        baseline: Annotated[str, typer.Option()] = str(BASELINE_FILE),
+        update_baseline: Annotated[bool, typer.Option(
+            help="Store the results as the new baseline."
+        )] = False,
+) -> None:
+    cases = [c for c in CASES if not case or c.name in case]
+    unknown = set(case or ()) - {c.name for c in CASES}
+    if unknown:
+        raise typer.BadParameter(f"Unknown cases {sorted(unknown)}")
+    results = run_suite(sizes or SIZES, cases, repeats)
+
+    report = {
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "python": sys.version.split()[0],
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    output_file = Path(output)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    output_file.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+    print(f"Results written to {output_file}")
+
+    baseline_file = Path(baseline)
+    if update_baseline:
+        stored = {"machine": report["machine"], "results": {}}
+        if baseline_file.exists():
+            stored["results"] = json.loads(baseline_file.read_text())["results"]
+        stored["results"].update(results)
+        baseline_file.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {baseline_file}")
+        return
+    if not baseline_file.exists():
+        print(f"No baseline at {baseline_file}, nothing to compare")
+        return
+
+    regressions = find_regressions(
+        results, json.loads(baseline_file.read_text())["results"], threshold
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        raise typer.Exit(code=1)
+    print(f"No regressions beyond {threshold:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,265 @@
+"""Background writer for trained models, scalers and other joblib artifacts"""
+import atexit
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import joblib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+
+# zlib at its fastest level, a fraction of the pickled size of most models
+FAST_COMPRESSION = ("zlib", 1)
+
+
+def checksum_file(path: Path) -> Path:
+    """
+    Sidecar holding the sha256 of an artifact, in the format of sha256sum.
+    """
+    path = Path(path)
+    return path.with_name(f"{path.name}.sha256")
+
+
+def sha256_digest(path: Path) -> str:
+    """
+    Hex sha256 of a file, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _replace_text(path: Path, text: str) -> None:
+    tmp_file = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_file.write_text(text)
+    os.replace(tmp_file, path)
+
+
+@contextmanager
+def _directory_lock(directory: Path) -> Iterator[None]:
+    """
+    Exclusive lock on a directory, shared by the threads and processes
+    that replace artifacts in it. Without fcntl the lock is a no-op.
+    """
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _expected_digests(path: Path) -> list[str]:
+    sidecar = checksum_file(path)
+    if not sidecar.exists():
+        return []
+    return [line.split()[0] for line in sidecar.read_text().splitlines() if line]
+
+
+def _write_checksum(path: Path, digests: list[str]) -> None:
+    unique = list(dict.fromkeys(digests))
+    _replace_text(
+        checksum_file(path), "".join(f"{d}  {path.name}\n" for d in unique)
+    )
+
+
+def write_artifact(
+        obj: Any, path: Path, compress: bool = False, checksum: bool = True
+) -> Path:
+    """
+    Serialise an object with joblib so readers only ever see a complete
+    file: it is dumped under a unique temporary name in the same
+    directory, flushed to disk and renamed over the target. The rename
+    and the update of the checksum sidecar happen under a lock of the
+    directory, so concurrent writers of the same path (e.g. pipeline
+    workers) cannot pair a file with the checksum of another one. While
+    the file is renamed the sidecar lists the old and the new digest, so
+    neither a reader nor a crash in between sees a mismatch.
+    Args:
+        obj: Object to store.
+        path: Target file.
+        compress: Use FAST_COMPRESSION.
+        checksum: Also write the sha256 to a .sha256 sidecar.
+
+    Returns:
+        Path of the written file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        joblib.dump(obj, tmp_file, compress=FAST_COMPRESSION if compress else 0)
+        with open(tmp_file, "rb") as f:
+            os.fsync(f.fileno())
+        digest = sha256_digest(tmp_file) if checksum else None
+        with _directory_lock(path.parent):
+            if digest is None:
+                checksum_file(path).unlink(missing_ok=True)
+                os.replace(tmp_file, path)
+            else:
+                current = _expected_digests(path)
+                if path.exists() and not current:
+                    current = [sha256_digest(path)]
+                _write_checksum(path, [digest, *current])
+                os.replace(tmp_file, path)
+                _write_checksum(path, [digest])
+    finally:
+        tmp_file.unlink(missing_ok=True)
+    logging.debug(f"Artifact written to {path}")
+    return path
+
+
+def verify_artifact(path: Path) -> None:
+    """
+    Compare an artifact with its checksum sidecar, if it has one.
+    Args:
+        path: Artifact file.
+
+    Returns:
+        None, raises ValueError if the content does not match.
+    """
+    sidecar = checksum_file(path)
+    if not sidecar.exists():
+        return
+    if sha256_digest(path) in _expected_digests(path):
+        return
+    # A writer may have replaced the file while it was hashed, check again
+    # once no writer holds the directory
+    with _directory_lock(Path(path).parent):
+        matches = sha256_digest(path) in _expected_digests(path)
+    if not matches:
+        raise ValueError(
+            f"{path} does not match its checksum in {sidecar}, "
+            "the file is corrupted or was replaced by another tool"
+        )
+
+
+class ArtifactWriter:
+    def __init__(self, compress: bool = False, checksum: bool = True) -> None:
+        """
+        Write artifacts in a background thread, so training does not wait
+        for the disk. Writes are applied in submission order; readers call
+        wait (or load_artifact) for the file they need, and pending writes
+        are flushed at exit. Objects must not be modified after they are
+        submitted.
+        Args:
+            compress: Compress new artifacts with FAST_COMPRESSION.
+            checksum: Write a .sha256 sidecar next to every artifact.
+        """
+        self.compress = compress
+        self.checksum = checksum
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: dict[Path, list[Future]] = {}
+        if hasattr(os, "register_at_fork"):
+            # The writer thread does not exist in a forked child
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = {}
+
+    def save(self, obj: Any, path: Path) -> Future:
+        """
+        Queue an object to be written to path.
+        Args:
+            obj: Object to store.
+            path: Target file.
+
+        Returns:
+            Future resolving to the path once the file is in place.
+        """
+        key = Path(path).absolute()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    1, thread_name_prefix="artifact-writer"
+                )
+            future = self._executor.submit(
+                write_artifact, obj, key, self.compress, self.checksum
+            )
+            self._pending.setdefault(key, []).append(future)
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key: Path, future: Future) -> None:
+        # Failed writes stay pending, so waiting for them raises
+        if future.exception() is not None:
+            return
+        with self._lock:
+            futures = self._pending.get(key, [])
+            if future in futures:
+                futures.remove(future)
+            if not futures:
+                self._pending.pop(key, None)
+
+    def wait(self, path: Optional[Path] = None) -> None:
+        """
+        Block until pending writes are on disk.
+        Args:
+            path: Only wait for this file, default all files.
+
+        Returns:
+            None, raises the error of a failed write once.
+        """
+        with self._lock:
+            if path is None:
+                futures = [f for pending in self._pending.values() for f in pending]
+            else:
+                futures = list(self._pending.get(Path(path).absolute(), []))
+        errors = [f.exception() for f in futures]
+        with self._lock:
+            for key in list(self._pending):
+                self._pending[key] = [
+                    f for f in self._pending[key] if f not in futures
+                ]
+                if not self._pending[key]:
+                    del self._pending[key]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def close(self) -> None:
+        """
+        Wait for all pending writes and log the ones that failed.
+        Returns:
+            None
+        """
+        try:
+            self.wait()
+        except Exception as e:
+            logging.error(f"Writing an artifact failed: {e}")
+
+
+artifact_writer = ArtifactWriter()
+atexit.register(artifact_writer.close)
+
+
+def load_artifact(path: Path) -> Any:
+    """
+    Load a joblib artifact once pending writes to it have finished,
+    checking it against its checksum sidecar.
+    Args:
+        path: Artifact file.
+
+    Returns:
+        Loaded object.
+    """
+    artifact_writer.wait(path)
+    verify_artifact(path)
+    return joblib.load(path)
@@ -1,9 +1,25 @@
 import logging
-from functools import lru_cache
+from functools import cached_property, lru_cache
+from pathlib import Path
+from typing import Iterator, Optional
 
+import numpy as np
 import pandas as pd
+from heartpredict.backend.kendall import dense_ranks, kendall_matrix, kendall_tau_b
+from heartpredict.backend.sketches import KLLSketch
+from heartpredict.backend.significance import (
+    CorrelationSignificance,
+    correlation_significance,
+)
+from heartpredict.backend.streaming import (
+    Accumulator,
+    PearsonAccumulator,
+    SpearmanAccumulator,
+)
 from heartpredict.data import ProjectData
+from heartpredict.engine import pair_correlation
 from heartpredict.enums import Column, CorrelationMethod
+from scipy.stats import rankdata
 from typing_extensions import Self
 
 
@@ -11,7 +27,14 @@ class CorrelationBackend:
     def __init__(
             self, project_data: ProjectData
         ) -> None:
-        self.df = project_data.df
+        self.project_data = project_data
+        # Correlations are computed from the engine's columns
+        self.engine = project_data.engine
+        self.frame = project_data.frame
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self.project_data.df
 
 
     @classmethod
@@ -23,19 +46,221 @@ class CorrelationBackend:
     def get_column_correlation_to_death_event(
             self, column: Column, method: CorrelationMethod
         ) -> float:
-        death_event = self.df[Column.DEATH_EVENT]
+        correlations = self.get_correlations_to(
+            method, Column.DEATH_EVENT, [Column(column)]
+        )
+        return float(correlations.iloc[0])
+    
 
-        try:
-            correlation_column = self.df[column]
-        except KeyError:
-            logging.error("column not found")
+    def get_correlation_matrix(
+            self, method: CorrelationMethod, n_jobs: Optional[int] = None
+        ) -> pd.DataFrame:
+        if method == CorrelationMethod.KENDALL:
+            # O(n log n) engine, column pairs in parallel
+            columns = self.engine.column_names(self.frame)
+            matrix = kendall_matrix(self.engine.to_numpy(self.frame, columns), n_jobs)
+            return pd.DataFrame(matrix, index=columns, columns=columns).round(2)
+        return self.engine.correlation_matrix(self.frame, method).round(2)
 
-        return correlation_column.corr(death_event, method=method) # type: ignore
-    
+
+    def get_correlations_to(
+            self,
+            method: CorrelationMethod,
+            target: Column = Column.DEATH_EVENT,
+            columns: Optional[list[Column]] = None
+        ) -> pd.Series:
+        """
+        Correlate all columns with a target column in one batch.
+        Pearson and Spearman are a single matrix-vector product over the
+        centred columns; Spearman reuses ranks computed once per backend.
+        Columns with missing values are correlated over the rows where
+        both values are present, like pandas.
+
+        Args:
+            method: Correlation method
+            target: Column to correlate with (default DEATH_EVENT)
+            columns: Columns to correlate, default all other columns
+
+        Returns:
+            Series of correlations, sorted by absolute value
+        """
+        if columns is None:
+            columns = [c for c in Column if c != target]
+        names = [Column(c).value for c in columns]
+        target_name = Column(target).value
+
+        positions = {name: i for i, name in enumerate(self._columns)}
+        selected = [positions[name] for name in names]
+        target_position = positions[target_name]
+
+        if method == CorrelationMethod.KENDALL:
+            target_ranks = self._dense_ranks[:, target_position]
+            correlations = np.array([
+                kendall_tau_b(self._dense_ranks[:, i], target_ranks)
+                for i in selected
+            ])
+        elif np.isnan(self._values[:, selected + [target_position]]).any():
+            target_values = self._values[:, target_position]
+            correlations = np.array([
+                pair_correlation(self._values[:, i], target_values, method)
+                for i in selected
+            ])
+        else:
+            values = (
+                self._ranks if method == CorrelationMethod.SPEARMAN else self._values
+            )
+            correlations = _correlate_with(
+                values[:, selected], values[:, target_position]
+            )
+
+        result = pd.Series(correlations, index=names, name=target_name)
+        return result.reindex(result.abs().sort_values(ascending=False).index)
+
+    def get_correlation_significance(
+            self,
+            method: CorrelationMethod,
+            n_permutations: int = 1000,
+            n_bootstrap: int = 1000,
+            n_jobs: Optional[int] = None,
+            seed: int = 42
+        ) -> CorrelationSignificance:
+        """
+        Permutation p-values and bootstrap confidence intervals for the
+        correlation matrix, see correlation_significance.
+
+        Args:
+            method: Pearson or Spearman
+            n_permutations: Number of permutations, 0 to skip
+            n_bootstrap: Number of bootstrap resamples, 0 to skip
+            n_jobs: Number of worker processes, None for all cores
+            seed: Root random seed
+
+        Returns:
+            CorrelationSignificance with correlation, p-values and CI matrices
+        """
+        return correlation_significance(
+            self.df, method, n_permutations, n_bootstrap, seed=seed, n_jobs=n_jobs
+        )
+
+    @cached_property
+    def _columns(self) -> list[str]:
+        return self.engine.column_names(self.frame)
+
+    @cached_property
+    def _values(self) -> np.ndarray:
+        return self.engine.to_numpy(self.frame, self._columns)
+
+    @cached_property
+    def _dense_ranks(self) -> np.ndarray:
+        return dense_ranks(self._values)
+
+    @cached_property
+    def _ranks(self) -> np.ndarray:
+        # Only used for columns without missing values
+        logging.debug("Rank transform all columns")
+        return rankdata(self._values, axis=0)
+
+
+class StreamingCorrelationBackend:
+    def __init__(
+            self, csv: Path, chunksize: int = 100_000, sketch_k: int = 200
+        ) -> None:
+        """
+        Correlations over a CSV read in chunks, in constant memory.
+        Pearson is exact; Spearman is approximated with quantile sketches
+        and needs a second pass over the file.
+
+        Args:
+            csv: Path to the CSV file
+            chunksize: Rows per chunk
+            sketch_k: Accuracy parameter of the quantile sketches
+        """
+        self.csv = csv
+        self.chunksize = chunksize
+        self.sketch_k = sketch_k
+        self.columns = list(pd.read_csv(csv, nrows=0).columns)
+
+    def accumulate(
+            self,
+            method: CorrelationMethod,
+            sketches: Optional[dict[str, KLLSketch]] = None,
+            rank: bool = True,
+        ) -> Accumulator:
+        """
+        Stream the CSV into a mergeable accumulator.
+
+        Args:
+            method: Pearson or Spearman
+            sketches: Spearman only, rank with these sketches, e.g. merged
+                over all shards, instead of sketching this file first
+            rank: Spearman only, False to stop after the sketch pass
+
+        Returns:
+            Accumulator holding the partial aggregate of this file
+        """
+        if method == CorrelationMethod.PEARSON:
+            accumulator = PearsonAccumulator(self.columns)
+            for chunk in self._chunks():
+                accumulator.update(chunk)
+            return accumulator
+        if method == CorrelationMethod.SPEARMAN:
+            if sketches is None:
+                sketches = SpearmanAccumulator.build_sketches(
+                    self.columns, self.sketch_k
+                )
+                for chunk in self._chunks():
+                    SpearmanAccumulator.update_sketches(sketches, chunk)
+            spearman = SpearmanAccumulator(sketches)
+            if rank:
+                for chunk in self._chunks():
+                    spearman.update(chunk)
+            return spearman
+        raise ValueError("Kendall correlation is not supported for streaming input")
+
+    def get_column_correlation_to_death_event(
+            self, column: Column, method: CorrelationMethod
+        ) -> float:
+        matrix = self.accumulate(method).correlation()
+        return float(matrix.loc[Column(column).value, Column.DEATH_EVENT.value])
 
     def get_correlation_matrix(self, method: CorrelationMethod) -> pd.DataFrame:
-        return self.df.corr(method=method).round(2) # type: ignore
-        
+        return self.accumulate(method).correlation().round(2)
+
+    def _chunks(self) -> Iterator[pd.DataFrame]:
+        logging.debug(f"Stream {self.csv} in chunks of {self.chunksize} rows")
+        return pd.read_csv(self.csv, chunksize=self.chunksize)
+
+
+def combine_accumulators(accumulators: list[Accumulator]) -> Accumulator:
+    """
+    Merge partial aggregates of several chunks or shards.
+
+    Args:
+        accumulators: Accumulators of the same kind and columns
+
+    Returns:
+        Accumulator over all data
+    """
+    combined, *rest = accumulators
+    for accumulator in rest:
+        combined.merge(accumulator)  # type: ignore
+    return combined
+
+
+def _correlate_with(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Pearson correlation of every column of x with y.
 
+    Args:
+        x: Matrix with one column per variable
+        y: Target vector
 
-            
+    Returns:
+        Correlation per column of x
+    """
+    x_centred = x - x.mean(axis=0)
+    y_centred = y - y.mean()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (x_centred.T @ y_centred) / (
+            np.sqrt((x_centred ** 2).sum(axis=0)) * np.sqrt(y_centred @ y_centred)
+        )
@@ -0,0 +1,194 @@
+"""Statistics of every subgroup defined by combinations of boolean flags"""
+import logging
+from dataclasses import dataclass
+from itertools import product
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+from heartpredict.enums import BoolColumn, Column, DiscreteColumn
+
+STATISTICS = ["count", "mean", "std", "min", "max", "median", "death_rate"]
+
+
+@dataclass
+class SubgroupCube:
+    flags: list[str]
+    frame: pd.DataFrame
+
+    def cell(self, **flags: int) -> pd.DataFrame:
+        """
+        Statistics of one subgroup, e.g. cube.cell(diabetes=1, sex=0).
+        Flags that are not given are rolled up.
+        Args:
+            **flags: Value 0 or 1 per flag of the subgroup.
+
+        Returns:
+            DataFrame indexed by column with one column per statistic.
+        """
+        unknown = set(flags) - set(self.flags)
+        if unknown:
+            raise KeyError(f"Not a flag of this cube: {sorted(unknown)}")
+        selected = np.ones(len(self.frame), dtype=bool)
+        for flag in self.flags:
+            values = self.frame[flag]
+            if flag in flags:
+                selected &= (values == flags[flag]).fillna(False).to_numpy()
+            else:
+                selected &= values.isna().to_numpy()
+        return self.frame[selected].set_index("column")[STATISTICS]
+
+
+def _roll_up(
+        cells: np.ndarray, k: int, reduce: Callable[..., np.ndarray]
+) -> np.ndarray:
+    """
+    Append the rollup over every flag to an array of finest cells.
+    Args:
+        cells: Array of shape (2,) * k + trailing, one axis per flag.
+        k: Number of flags.
+        reduce: Aggregation like np.sum, called with axis and keepdims.
+
+    Returns:
+        Array of shape (3,) * k + trailing, index 2 is the rollup.
+    """
+    for axis in range(k):
+        cells = np.concatenate(
+            (cells, reduce(cells, axis=axis, keepdims=True)), axis=axis
+        )
+    return cells
+
+
+def _histogram_median(
+        histogram: np.ndarray, edges: np.ndarray, counts: np.ndarray
+) -> np.ndarray:
+    """
+    Median interpolated within the histogram bin that holds it.
+    Args:
+        histogram: Counts per bin, bins along the last axis.
+        edges: Bin edges.
+        counts: Number of values per histogram.
+
+    Returns:
+        Approximate medians, NaN for empty histograms.
+    """
+    cumulative = np.cumsum(histogram, axis=-1)
+    half = counts[..., None] / 2
+    position = np.minimum((cumulative < half).sum(axis=-1), histogram.shape[-1] - 1)
+    before = np.take_along_axis(cumulative - histogram, position[..., None], -1)
+    inside = np.take_along_axis(histogram, position[..., None], -1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = ((half - before) / inside)[..., 0]
+    width = edges[1] - edges[0]
+    median = edges[position] + np.clip(fraction, 0, 1) * width
+    return np.where(counts > 0, median, np.nan)
+
+
+def subgroup_cube(
+        df: pd.DataFrame,
+        flags: list[BoolColumn],
+        columns: Optional[list[DiscreteColumn]] = None,
+        bins: int = 1024,
+) -> SubgroupCube:
+    """
+    Count, mean, standard deviation, extremes, approximate median and death
+    rate of every discrete column for all 2^k combinations of the flags,
+    plus every rollup (flag value "all").
+    The finest cells come from a single grouped pass of bincounts over a
+    cell code per row; rollups are reductions of the finest cells, and the
+    median is read from per-cell histograms, so no subset is copied.
+    Args:
+        df: Data with the flags, the columns and DEATH_EVENT.
+        flags: Boolean columns that define the subgroups.
+        columns: Discrete columns to aggregate, default all.
+        bins: Histogram bins per column; the median error is at most
+            the range of the column divided by bins.
+
+    Returns:
+        SubgroupCube with one row per subgroup and column. Rolled up
+        flags are <NA>.
+    """
+    flag_names = [BoolColumn(flag).value for flag in flags]
+    if columns is None:
+        columns = list(DiscreteColumn)
+    column_names = [DiscreteColumn(column).value for column in columns]
+    k = len(flag_names)
+    logging.debug(f"Build cube over {k} flags and {len(column_names)} columns")
+
+    flag_values = df[flag_names].to_numpy(dtype=np.float64)
+    valid = np.isin(flag_values, (0, 1)).all(axis=1)
+    # Flag i is bit k - 1 - i, so reshaping to (2,) * k gives one axis per flag
+    weights = 1 << np.arange(k - 1, -1, -1)
+    codes = (flag_values[valid].astype(np.int64) * weights).sum(axis=1)
+    n_cells = 2 ** k
+    shape = (2,) * k
+
+    def grouped(weights: Optional[np.ndarray] = None) -> np.ndarray:
+        return np.bincount(codes, weights, minlength=n_cells).reshape(shape)
+
+    deaths = df[Column.DEATH_EVENT.value].to_numpy(dtype=np.float64)[valid]
+    rows = _roll_up(grouped(), k, np.sum)
+    death_rate = _roll_up(grouped(deaths), k, np.sum) / np.maximum(rows, 1)
+    death_rate = np.where(rows > 0, death_rate, np.nan)
+
+    statistics: dict[str, np.ndarray] = {}
+    for name in column_names:
+        values = df[name].to_numpy(dtype=np.float64)[valid]
+        present = ~np.isnan(values)
+        x, cell = values[present], codes[present]
+        # Shift by the overall mean so sums of squares do not cancel
+        shift = x.mean() if len(x) else 0.0
+        centred = x - shift
+
+        count = _roll_up(
+            np.bincount(cell, minlength=n_cells).reshape(shape), k, np.sum
+        )
+        total = _roll_up(
+            np.bincount(cell, centred, minlength=n_cells).reshape(shape), k, np.sum
+        )
+        squares = _roll_up(
+            np.bincount(cell, centred ** 2, minlength=n_cells).reshape(shape),
+            k, np.sum,
+        )
+        minimum = np.full(n_cells, np.inf)
+        maximum = np.full(n_cells, -np.inf)
+        np.minimum.at(minimum, cell, x)
+        np.maximum.at(maximum, cell, x)
+        minimum = _roll_up(minimum.reshape(shape), k, np.min)
+        maximum = _roll_up(maximum.reshape(shape), k, np.max)
+
+        low, high = (x.min(), x.max()) if len(x) else (0.0, 1.0)
+        edges = np.linspace(low, high if high > low else low + 1, bins + 1)
+        bin_ids = np.minimum(
+            ((x - edges[0]) / (edges[1] - edges[0])).astype(np.int64), bins - 1
+        )
+        histogram = np.bincount(
+            cell * bins + bin_ids, minlength=n_cells * bins
+        ).reshape(shape + (bins,))
+        histogram = _roll_up(histogram, k, np.sum)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = total / count
+            std = np.sqrt(
+                np.maximum(squares - total * mean, 0) / (count - 1)
+            )
+        empty = count == 0
+        statistics[name] = np.stack([
+            count,
+            np.where(empty, np.nan, mean + shift),
+            np.where(count > 1, std, np.nan),
+            np.where(empty, np.nan, minimum),
+            np.where(empty, np.nan, maximum),
+            np.clip(_histogram_median(histogram, edges, count), minimum, maximum),
+            death_rate,
+        ], axis=-1)
+
+    records = []
+    for index in product(range(3), repeat=k):
+        levels = [None if level == 2 else level for level in index]
+        for name in column_names:
+            records.append(levels + [name] + statistics[name][index].tolist())
+    frame = pd.DataFrame(records, columns=flag_names + ["column"] + STATISTICS)
+    frame[flag_names] = frame[flag_names].astype("Int64")
+    frame["count"] = frame["count"].astype(np.int64)
+    return SubgroupCube(flags=flag_names, frame=frame)
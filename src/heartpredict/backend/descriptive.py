@@ -1,12 +1,26 @@
 """Utilities for conducting a descriptive data analysis"""
 import logging
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
+from functools import cached_property
+from pathlib import Path
 from typing import Optional
 
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
+from heartpredict.backend.cube import SubgroupCube, subgroup_cube
+from heartpredict.backend.query import OPERATORS, BitmapIndex, QueryResult
+from heartpredict.backend.streaming import ColumnSummary
 from heartpredict.data import ProjectData
-from heartpredict.enums import BoolColumn, Column
+from heartpredict.engine import get_engine
+from heartpredict.enums import (
+    BoolColumn,
+    Column,
+    DataFrameEngine,
+    DiscreteColumn,
+    ImageFormat,
+)
+from heartpredict.metrics import metrics
+from heartpredict.parallel import run_tasks
 
 MEANING_BINARY_COLUMNS = {
     BoolColumn.ANAEMIA: {0: "No anaemia", 1: "anaemia"},
@@ -35,13 +49,44 @@ class BooleanStatistics:
     name: str
     zero: float
     one: float
+
+
+@dataclass
+class DatasetProfile:
+    discrete: list[DiscreteStatistics]
+    boolean: list[BooleanStatistics]
+
+    def to_dict(self) -> dict:
+        return {
+            "discrete": [asdict(stats) for stats in self.discrete],
+            "boolean": [asdict(stats) for stats in self.boolean],
+        }
+
+    def to_frames(self) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Both parts of the profile as tables indexed by column name
+
+        Returns:
+            Tuple of (discrete statistics, boolean statistics)
+        """
+        return (
+            pd.DataFrame([asdict(s) for s in self.discrete]).set_index("name"),
+            pd.DataFrame([asdict(s) for s in self.boolean]).set_index("name"),
+        )
     
 
 class DescriptiveBackend:
     def __init__(self, project_data: ProjectData) -> None:
-        self.df = project_data.df
+        self.project_data = project_data
+        # Value counts, groups and filters run on the engine's own frame
+        self.engine = project_data.engine
+        self.frame = project_data.frame
         logging.debug("DataFrame added to DescriptiveBackend")
 
+    @property
+    def df(self) -> pd.DataFrame:
+        return self.project_data.df
+
     def calculate_boolean_statistics(self, boolean_column: str) -> BooleanStatistics:
         """
         Create a BooleanStatistics object containing main statistics
@@ -53,9 +98,8 @@ class DescriptiveBackend:
             BooleanStatistics object
         """
         logging.debug("Read in Boolean column")
-        col_data = self.df[boolean_column]
-        col_size = len(col_data)
-        col_distribution = col_data.value_counts().to_dict()
+        col_size = self.engine.num_rows(self.frame)
+        col_distribution = self.engine.value_counts(self.frame, boolean_column)
         zero_val = col_distribution[0] / col_size
         one_val = col_distribution[1] / col_size
         logging.debug("Boolean statistics calculated")
@@ -78,12 +122,13 @@ class DescriptiveBackend:
             DiscreteStatistics object
         """
         logging.debug("Read in Discrete column")
-        col_data = self.df[discrete_column]
-        min_val = col_data.min()
-        max_val = col_data.max()
-        median_val = col_data.median()
-        mean_val = col_data.mean()
-        standard_dev_val = col_data.std()
+        col_data = self.engine.column(self.frame, discrete_column)
+        # Missing values are skipped and the deviation uses ddof=1, like pandas
+        min_val = np.nanmin(col_data)
+        max_val = np.nanmax(col_data)
+        median_val = np.nanmedian(col_data)
+        mean_val = np.nanmean(col_data)
+        standard_dev_val = np.nanstd(col_data, ddof=1)
         logging.debug("Discrete statistics calculated")
 
         return DiscreteStatistics(
@@ -96,6 +141,166 @@ class DescriptiveBackend:
         )
     
 
+    def profile(self) -> DatasetProfile:
+        """
+        Statistics of every discrete and boolean column at once.
+        Each statistic is a single vectorised reduction over the matrix of
+        all columns of a kind, instead of one pass per column and statistic.
+        Missing values are skipped like in pandas.
+
+        Returns:
+            DatasetProfile with one entry per DiscreteColumn and BoolColumn
+        """
+        discrete_names = [c.value for c in DiscreteColumn]
+        values = self.engine.to_numpy(self.frame, discrete_names)
+        counts = np.sum(~np.isnan(values), axis=0)
+        means = np.nansum(values, axis=0) / counts
+        # Sum of squared deviations reuses the means, ddof=1 like pandas
+        squares = np.nansum((values - means) ** 2, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            standard_devs = np.sqrt(squares / (counts - 1))
+        minima = np.nanmin(values, axis=0)
+        maxima = np.nanmax(values, axis=0)
+        medians = np.nanmedian(values, axis=0)
+        discrete = [
+            DiscreteStatistics(
+                name=name,
+                minimum=float(minima[i]),
+                maximum=float(maxima[i]),
+                median=float(medians[i]),
+                mean=float(means[i]),
+                standard_dev=float(standard_devs[i])
+            )
+            for i, name in enumerate(discrete_names)
+        ]
+
+        bool_names = [c.value for c in BoolColumn]
+        flags = self.engine.to_numpy(self.frame, bool_names)
+        n_rows = len(flags)
+        zeros = np.sum(flags == 0, axis=0) / n_rows
+        ones = np.sum(flags == 1, axis=0) / n_rows
+        boolean = [
+            BooleanStatistics(name=name, zero=float(zeros[i]), one=float(ones[i]))
+            for i, name in enumerate(bool_names)
+        ]
+        logging.debug("Profile of all columns calculated")
+        return DatasetProfile(discrete=discrete, boolean=boolean)
+
+
+    @cached_property
+    def bitmap_index(self) -> BitmapIndex:
+        return BitmapIndex(self.df)
+
+
+    def query(self, query: str) -> QueryResult:
+        """
+        Select rows with a compound query, e.g.
+        "age > 60 and smoking == 1 and sex == 0", using bitmap indexes.
+        Unlike create_conditional_dataset nothing is copied until
+        the result is materialized.
+
+        Args:
+            query: Predicates joined with "and" / "or"
+
+        Returns:
+            Lazy QueryResult
+        """
+        return self.bitmap_index.query(query)
+
+
+    def subgroup_cube(
+            self,
+            flags: list[BoolColumn],
+            columns: Optional[list[DiscreteColumn]] = None
+        ) -> SubgroupCube:
+        """
+        Statistics of every discrete column for all combinations of the
+        flags and their rollups, see heartpredict.backend.cube
+
+        Args:
+            flags: Boolean columns that define the subgroups
+            columns: Discrete columns to aggregate, default all
+
+        Returns:
+            SubgroupCube
+        """
+        return subgroup_cube(self.df, flags, columns)
+
+
+    def subgroup_distributions(
+            self, column: Column, flags: list[BoolColumn]
+        ) -> dict[tuple, dict]:
+        """
+        Variable distribution of a column within every subgroup of the flags,
+        counted in one grouped pass
+
+        Args:
+            column: Column to be analyzed
+            flags: Boolean columns that define the subgroups
+
+        Returns:
+            Dictionary mapping the flag values of a subgroup to its distribution
+        """
+        name = Column(column).value
+        flag_names = [BoolColumn(flag).value for flag in flags]
+        bool_meaning = {}
+        if name in [c.value for c in BoolColumn]:
+            bool_meaning = MEANING_BINARY_COLUMNS[BoolColumn(name)]
+        counts = self.engine.group_sizes(self.frame, flag_names + [name])
+        distributions: dict[tuple, dict] = {}
+        for key, count in counts.items():
+            *group, value = key # type: ignore
+            distribution = distributions.setdefault(tuple(group), {})
+            distribution[bool_meaning.get(value, value)] = int(count)
+        return distributions
+
+
+    def distribution_plot_jobs(
+            self,
+            columns: Optional[list[Column]] = None,
+            by: Optional[list[BoolColumn]] = None,
+            output_dir: Path = Path("results/plots"),
+            image_format: ImageFormat = ImageFormat.PNG
+        ) -> list[tuple[dict, str, Path]]:
+        """
+        Count distributions for a batch of plots, one per column or one per
+        column and subgroup, so only small dicts go to the render workers
+
+        Args:
+            columns: Columns to plot, default all
+            by: Boolean columns that split each plot into subgroups
+            output_dir: Directory of the image files
+            image_format: png or svg
+
+        Returns:
+            List of (distribution, column name / title, output file)
+        """
+        if columns is None:
+            columns = list(Column)
+        jobs = []
+        for column in columns:
+            name = Column(column).value
+            if not by:
+                jobs.append((
+                    self.save_variable_distribution(column), name,
+                    output_dir / f"{name}.{image_format.value}"
+                ))
+                continue
+            flag_names = [BoolColumn(flag).value for flag in by]
+            for group, distribution in self.subgroup_distributions(
+                    column, by
+            ).items():
+                # Flag names contain underscores, so conditions are joined
+                # with ", " in titles and "__" in file names
+                conditions = [f"{f}={v}" for f, v in zip(flag_names, group)]
+                stem = "__".join([name, *conditions])
+                jobs.append((
+                    distribution, f"{name} ({', '.join(conditions)})",
+                    output_dir / f"{stem}.{image_format.value}"
+                ))
+        return jobs
+
+
     def create_conditional_dataset(
             self, col: str, num: int, rel: str, df: Optional[pd.DataFrame] = None
         ) -> pd.DataFrame:
@@ -111,29 +316,22 @@ class DescriptiveBackend:
         Returns:
             DataFrame of filtered dataset
         """
-        # Check which DataFrame to use
-        logging.debug("Read-in DataFrame")
-        if df is None:
-            df = self.df
-        
-        # Check the condition's relation
+        # The whole dataset is filtered by its engine, a subset by pandas
         logging.debug("Assemble filter condition")
-        if rel == "==":
-            cond = df[col] == num
-        elif rel == "<":
-            cond = df[col] < num
-        elif rel == ">":
-            cond = df[col] > num
-        elif rel == "<=":
-            cond = df[col] <= num
-        elif rel == ">=":
-            cond = df[col] >= num
-
-        # Return conditioned dataset
+        if rel not in OPERATORS:
+            raise ValueError(f"Unknown relation '{rel}', use one of {list(OPERATORS)}")
+        engine, frame = self.engine, self.frame
+        if df is not None:
+            engine, frame = get_engine(DataFrameEngine.PANDAS), df
+        mask = np.asarray(OPERATORS[rel](engine.column(frame, col), num))
+
         logging.debug("Create conditional DataFrame")
-        df_cond = df[cond].copy()
+        df_cond = engine.to_pandas(engine.filter(frame, mask))
+        if engine.name != DataFrameEngine.PANDAS:
+            # Row labels of the CSV, as the pandas engine keeps them
+            df_cond.index = pd.Index(np.flatnonzero(mask))
         return df_cond
-    
+
 
     def save_variable_distribution(
             self, column: Column, df: Optional[pd.DataFrame] = None
@@ -148,31 +346,127 @@ class DescriptiveBackend:
         Returns:
             Dictionary counting the variable expressions
         """
-        # Check which DataFrame to use
-        logging.debug("Read-in DataFrame")
+        # Count on the engine's frame unless a subset is given
+        logging.debug("Count variable expressions")
         if df is None:
-            df = self.df
-        
+            distribution = self.engine.value_counts(self.frame, Column(column).value)
+        else:
+            distribution = df[column].value_counts().to_dict()
+
         # Check if the column is boolean or discrete
         logging.debug("Check if column is boolean/discrete")
-        condition = set(df[column].unique()) == {0,1}
+        condition = set(distribution) == {0,1}
         if condition:
             logging.debug("Interpret Boolean distribution")
             interpreted_distribution = {}
             bool_meaning = MEANING_BINARY_COLUMNS[column]   # type: ignore
-            distribution = df[column].value_counts().to_dict()
             for num in distribution.keys():
                 interpreted_distribution[bool_meaning[num]] = distribution[num]
             logging.debug("Return Boolean distribution")
             return interpreted_distribution
 
         else:
-            logging.debug("Create distribution dict for Discrete column")
-            distribution = df[column].value_counts().to_dict()
             logging.debug("Return Discrete distribution")
             return distribution
 
 
+class StreamingDescriptiveBackend:
+    def __init__(
+            self,
+            csv: Path,
+            chunksize: int = 100_000,
+            error_bound: float = 0.01,
+            max_distinct: int = 1000
+        ) -> None:
+        """
+        Descriptive statistics over a CSV read in chunks, in constant memory.
+        One pass summarises every column. Count, extremes, mean and standard
+        deviation are exact; the median comes from a quantile sketch and
+        distributions of columns with many distinct values from a
+        count-min sketch, both within the error bound.
+
+        Args:
+            csv: Path to the CSV file
+            chunksize: Rows per chunk
+            error_bound: Normalised rank error of the median and relative
+                error of counts
+            max_distinct: Distinct values per column that are counted exactly
+        """
+        self.csv = csv
+        self.chunksize = chunksize
+        self.error_bound = error_bound
+        self.max_distinct = max_distinct
+
+    @cached_property
+    def summaries(self) -> dict[str, ColumnSummary]:
+        logging.debug(f"Summarise {self.csv} in chunks of {self.chunksize} rows")
+        summaries: dict[str, ColumnSummary] = {}
+        for chunk in pd.read_csv(self.csv, chunksize=self.chunksize):
+            for column in chunk.columns:
+                if column not in summaries:
+                    summaries[column] = ColumnSummary(
+                        column, self.error_bound, self.max_distinct
+                    )
+                summaries[column].update(chunk[column].to_numpy())
+        return summaries
+
+    def calculate_boolean_statistics(self, boolean_column: str) -> BooleanStatistics:
+        """
+        Create a BooleanStatistics object from the column summary
+
+        Args:
+            boolean_column: Boolean column (e.g. smoking)
+
+        Returns:
+            BooleanStatistics object
+        """
+        summary = self.summaries[boolean_column]
+        distribution = summary.distribution()
+        return BooleanStatistics(
+            name=boolean_column,
+            zero=distribution.get(0, 0) / summary.rows,
+            one=distribution.get(1, 0) / summary.rows
+        )
+
+    def calculate_discrete_statistics(self, discrete_column: str) -> DiscreteStatistics:
+        """
+        Create a DiscreteStatistics object from the column summary,
+        with an approximate median
+
+        Args:
+            discrete_column: Discrete column (e.g. age)
+
+        Returns:
+            DiscreteStatistics object
+        """
+        summary = self.summaries[discrete_column]
+        return DiscreteStatistics(
+            name=discrete_column,
+            minimum=summary.minimum,
+            maximum=summary.maximum,
+            median=summary.quantiles.quantile(0.5),
+            mean=summary.mean,
+            standard_dev=summary.standard_dev
+        )
+
+    def save_variable_distribution(self, column: Column) -> dict:
+        """
+        Save variable expressions of a column in a dict, exact for columns
+        with at most max_distinct values
+
+        Args:
+            column: Column to be analyzed
+
+        Returns:
+            Dictionary counting the variable expressions
+        """
+        distribution = self.summaries[column].distribution()
+        if set(distribution) == {0, 1}:
+            bool_meaning = MEANING_BINARY_COLUMNS[column]   # type: ignore
+            return {bool_meaning[num]: count for num, count in distribution.items()}
+        return distribution
+
+
 def save_distribution_plot(distribution: dict, col_name: str) -> tuple:
     """
     Create and return a simple bar plot for a specific column
@@ -183,6 +477,8 @@ def save_distribution_plot(distribution: dict, col_name: str) -> tuple:
 
     Returns:
     Tuple for the plot variables (fig, ax)"""
+    import matplotlib.pyplot as plt
+
     logging.debug("Read-in plot labels and values")
     labels = distribution.keys()
     values = distribution.values()
@@ -193,10 +489,7 @@ def save_distribution_plot(distribution: dict, col_name: str) -> tuple:
 
     # Create a Bar Plot
     logging.debug("Create a bar plot")
-    ax.bar(labels, values)
-    ax.set_xlabel(col_name)
-    ax.set_ylabel("Count")
-    ax.set_title(f"{col_name} distribution")
+    _draw_distribution(ax, labels, values, col_name)
 
     # Save the Bar Plot to a variable
     logging.debug("Save fig,ax tuple to plot variable")
@@ -204,6 +497,60 @@ def save_distribution_plot(distribution: dict, col_name: str) -> tuple:
     return plot_variable
 
 
+def _draw_distribution(ax, labels, values, col_name: str) -> None: # type: ignore
+    ax.bar(labels, values)
+    ax.set_xlabel(col_name)
+    ax.set_ylabel("Count")
+    ax.set_title(f"{col_name} distribution")
+
+
+# Figure template reused by every plot of a render worker
+_FIGURE = None
+
+
+def _init_render_worker() -> None:
+    global _FIGURE
+    # A standalone Figure renders with Agg and never needs a display
+    from matplotlib.figure import Figure
+
+    _FIGURE = Figure()
+    _FIGURE.add_subplot()
+
+
+def _render_distribution(
+        distribution: dict, col_name: str, output_file: Path
+    ) -> Path:
+    ax = _FIGURE.axes[0] # type: ignore
+    ax.clear()
+    _draw_distribution(
+        ax, list(distribution.keys()), list(distribution.values()), col_name
+    )
+    with metrics.stage("plot"):
+        _FIGURE.savefig(output_file) # type: ignore
+    return output_file
+
+
+def render_distribution_plots(
+        jobs: list[tuple[dict, str, Path]], n_jobs: Optional[int] = None
+    ) -> list[Path]:
+    """
+    Render a batch of distribution plots to image files in a process pool.
+    Each worker reuses one figure and only receives the count dicts.
+
+    Args:
+        jobs: List of (distribution, column name / title, output file),
+            e.g. from DescriptiveBackend.distribution_plot_jobs
+        n_jobs: Number of worker processes, None for all cores
+
+    Returns:
+        Paths of the written files
+    """
+    for _, _, output_file in jobs:
+        Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+    logging.debug(f"Render {len(jobs)} distribution plots")
+    return run_tasks(_render_distribution, jobs, n_jobs, _init_render_worker)
+
+
 def show_plot(plot_variable: tuple) -> None:
     """
     Visualize a given plot variable
@@ -214,6 +561,8 @@ def show_plot(plot_variable: tuple) -> None:
         None
         Prints plot
     """
+    import matplotlib.pyplot as plt
+
     logging.debug("Decode fig,ax tuple")
     fig, ax = plot_variable
     logging.debug("Show plot")
@@ -0,0 +1,106 @@
+"""Model selection repeated over many train/validation splits"""
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from heartpredict.backend.ml import MLBackend
+from heartpredict.data import MLData, ProjectData
+from heartpredict.enums import ModelType
+from heartpredict.parallel import run_tasks
+
+# Data of a worker process, sent once instead of with every seed
+_PROJECT_DATA: Optional[ProjectData] = None
+
+
+@dataclass
+class SeedResult:
+    seed: int
+    score_name: str
+    scores: dict[str, float]
+    selected: str
+
+
+@dataclass
+class ExperimentResult:
+    model_type: str
+    score_name: str
+    # One row per seed, one column per model
+    scores: pd.DataFrame
+    # Model selected for every seed
+    selected: pd.Series
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Score distribution and selection frequency of every model.
+        Returns:
+            DataFrame indexed by model, sorted by how often it was selected.
+        """
+        summary = self.scores.describe().T.drop(columns="count")
+        counts = self.selected.value_counts().reindex(summary.index, fill_value=0)
+        summary.insert(0, "selected", counts.astype(np.int64))
+        summary.insert(1, "selection_frequency", counts / len(self.selected))
+        summary.index.name = "model"
+        return summary.sort_values("selected", ascending=False, kind="stable")
+
+
+def _init_worker(project_data: ProjectData) -> None:
+    global _PROJECT_DATA
+    _PROJECT_DATA = project_data
+
+
+def _run_seed(seed: int, test_size: float, model_type: ModelType) -> SeedResult:
+    data = MLData(_PROJECT_DATA, test_size, seed, save_scaler=False)  # type: ignore
+    backend = MLBackend(data, save_artifacts=False)
+    if model_type == ModelType.CLASSIFIER:
+        models, eval_metric = backend.classifier_candidates()
+    else:
+        models, eval_metric = backend.regressor_candidates()
+    results = backend.train_candidates(models, eval_metric)
+    scores = {type(r.model).__name__: r.score for r in results}
+    selected = results[eval_metric.optimum([r.score for r in results])]
+    return SeedResult(
+        seed, eval_metric.name, scores, type(selected.model).__name__
+    )
+
+
+def run_seed_experiment(
+        project_data: ProjectData,
+        seeds: list[int],
+        model_type: ModelType = ModelType.CLASSIFIER,
+        test_size: float = 0.2,
+        n_jobs: Optional[int] = None,
+) -> ExperimentResult:
+    """
+    Run model selection for every seed, each with its own train/validation
+    split of the same loaded data. Seeds are spread over a process pool;
+    nothing is saved or registered, and the result does not depend on
+    the number of workers.
+    Args:
+        project_data: Loaded data.
+        seeds: Random seeds of the splits and models.
+        model_type: Select among the classifiers or the regressors.
+        test_size: Share of the validation split.
+        n_jobs: Number of worker processes, None for all cores.
+
+    Returns:
+        ExperimentResult with every validation score and selection.
+    """
+    if not seeds:
+        raise ValueError("At least one seed is needed")
+    model_type = ModelType(model_type)
+    logging.info(f"Selecting {model_type.value}s over {len(seeds)} seeds")
+    results = run_tasks(
+        _run_seed,
+        [(seed, test_size, model_type) for seed in seeds],
+        n_jobs,
+        _init_worker,
+        (project_data,),
+    )
+    index = pd.Index([r.seed for r in results], name="seed")
+    scores = pd.DataFrame([r.scores for r in results], index=index)
+    selected = pd.Series([r.selected for r in results], index=index, name="selected")
+    return ExperimentResult(
+        model_type.value, results[0].score_name, scores, selected
+    )
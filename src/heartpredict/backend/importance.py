@@ -0,0 +1,157 @@
+"""Permutation feature importance of trained models"""
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+from heartpredict.enums import Column, ModelType
+from heartpredict.parallel import run_tasks, spawn_seeds
+from sklearn.base import is_regressor
+from sklearn.metrics import accuracy_score, root_mean_squared_error
+
+# Model, data and permutation buffer of a worker process
+_MODEL: Any = None
+_X: Optional[np.ndarray] = None
+_Y: Optional[np.ndarray] = None
+_BUFFER: Optional[np.ndarray] = None
+_SCORE: Optional[Callable[..., float]] = None
+
+
+@dataclass
+class FeatureImportance:
+    score_name: str
+    baseline_score: float
+    features: list[str]
+    # Score loss of every feature (rows) and repeat (columns)
+    importances: np.ndarray
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Mean and standard deviation of the importance of every feature.
+        Returns:
+            DataFrame indexed by feature, most important first.
+        """
+        frame = pd.DataFrame({
+            "importance_mean": self.importances.mean(axis=1),
+            "importance_std": self.importances.std(axis=1),
+        }, index=pd.Index(self.features, name="feature"))
+        return frame.sort_values("importance_mean", ascending=False)
+
+
+def infer_model_type(model_file: Path, model: Any) -> ModelType:
+    """
+    Model type of a trained model. MLBackend saves models in a directory
+    named after their type, which also covers the regressors that are
+    sklearn classifiers; other models are judged by sklearn's estimator
+    type.
+    Args:
+        model_file: Path the model was loaded from.
+        model: Loaded model.
+
+    Returns:
+        ModelType of the model.
+    """
+    directory = Path(model_file).parent.name
+    if directory in {t.value for t in ModelType}:
+        return ModelType(directory)
+    return ModelType.REGRESSOR if is_regressor(model) else ModelType.CLASSIFIER
+
+
+def _scoring(model_type: ModelType) -> tuple[str, Callable[..., float], int]:
+    """
+    Metric MLBackend selects models of a type with.
+    Returns:
+        Name, function and sign that turns a score loss into a positive
+        importance.
+    """
+    if ModelType(model_type) == ModelType.CLASSIFIER:
+        return "Accuracy", accuracy_score, 1
+    return "Root Mean Squared Error", root_mean_squared_error, -1
+
+
+def _init_worker(
+        model: Any, x: np.ndarray, y: np.ndarray, score: Callable[..., float]
+) -> None:
+    global _MODEL, _X, _Y, _BUFFER, _SCORE
+    _MODEL, _X, _Y, _SCORE = model, x, y, score
+    # Column-major, so permuting a feature writes one contiguous block
+    _BUFFER = np.asfortranarray(x)
+    if _BUFFER is x:
+        _BUFFER = x.copy(order="F")
+
+
+def _clear_worker() -> None:
+    global _MODEL, _X, _Y, _BUFFER, _SCORE
+    _MODEL = _X = _Y = _BUFFER = _SCORE = None
+
+
+def _permuted_score(column: int, seed: np.random.SeedSequence) -> float:
+    rng = np.random.default_rng(seed)
+    permutation = rng.permutation(len(_X))  # type: ignore
+    np.take(_X[:, column], permutation, out=_BUFFER[:, column])  # type: ignore
+    try:
+        return _SCORE(_Y, _MODEL.predict(_BUFFER))  # type: ignore
+    finally:
+        _BUFFER[:, column] = _X[:, column]  # type: ignore
+
+
+def permutation_importance(
+        model: Any,
+        x: np.ndarray,
+        y: np.ndarray,
+        model_type: ModelType = ModelType.CLASSIFIER,
+        n_repeats: int = 10,
+        seed: int = 42,
+        n_jobs: Optional[int] = None,
+        features: Optional[list[str]] = None,
+) -> FeatureImportance:
+    """
+    Loss of the validation score when one feature is shuffled.
+    Every worker copies the data once into a buffer and permutes a single
+    column of it in place per evaluation, restoring it afterwards, so no
+    frame is copied per feature and repeat. The feature x repeat grid is
+    spread over a process pool; every cell has its own seed, so the result
+    does not depend on the number of workers.
+    Args:
+        model: Trained model with a predict method.
+        x: Scaled feature matrix, e.g. MLData.valid.x.
+        y: Targets of x.
+        model_type: Score classifiers by accuracy, regressors by RMSE,
+            like MLBackend does.
+        n_repeats: Permutations per feature.
+        seed: Root random seed.
+        n_jobs: Number of worker processes, None for all cores.
+        features: Feature names, default the Columns without DEATH_EVENT.
+
+    Returns:
+        FeatureImportance with the score loss of every feature and repeat.
+    """
+    if features is None:
+        features = [c.value for c in Column if c != Column.DEATH_EVENT]
+    if len(features) != x.shape[1]:
+        raise ValueError(
+            f"Got {len(features)} feature names for {x.shape[1]} columns"
+        )
+    score_name, score, sign = _scoring(model_type)
+    baseline = score(y, model.predict(x))
+    n_features = x.shape[1]
+    seeds = spawn_seeds(seed, n_features * n_repeats)
+    tasks = [
+        (column, seeds[column * n_repeats + repeat])
+        for column in range(n_features)
+        for repeat in range(n_repeats)
+    ]
+    logging.debug(f"Permute {n_features} features {n_repeats} times")
+    try:
+        scores = run_tasks(
+            _permuted_score, tasks, n_jobs, _init_worker, (model, x, y, score)
+        )
+    finally:
+        # Release the buffer if the grid ran in this process
+        _clear_worker()
+    importances = sign * (
+        baseline - np.asarray(scores).reshape(n_features, n_repeats)
+    )
+    return FeatureImportance(score_name, float(baseline), features, importances)
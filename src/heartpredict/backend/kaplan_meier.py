@@ -0,0 +1,441 @@
+"""Vectorised Kaplan-Meier estimation for many strata at once"""
+from dataclasses import dataclass
+from itertools import combinations
+from statistics import NormalDist
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+from heartpredict.parallel import run_tasks, spawn_seeds, split_batches
+from scipy.stats import chi2
+
+
+@dataclass
+class SurvivalTable:
+    label: str
+    timeline: np.ndarray
+    at_risk: np.ndarray
+    observed: np.ndarray
+    censored: np.ndarray
+    survival: np.ndarray
+    ci_lower: np.ndarray
+    ci_upper: np.ndarray
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Convert the survival table to a DataFrame indexed by time.
+        Returns:
+            DataFrame with at-risk counts, events, survival and its CI.
+        """
+        return pd.DataFrame(
+            {
+                "at_risk": self.at_risk,
+                "observed": self.observed,
+                "censored": self.censored,
+                "survival": self.survival,
+                "ci_lower": self.ci_lower,
+                "ci_upper": self.ci_upper,
+            },
+            index=pd.Index(self.timeline, name="timeline"),
+        )
+
+
+@dataclass
+class SurvivalBand:
+    label: str
+    timeline: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+
+
+@dataclass
+class LogRankResult:
+    groups: tuple[str, ...]
+    test_statistic: float
+    degrees_of_freedom: int
+    p_value: float
+
+
+def factorize_groups(groups: Any) -> tuple[np.ndarray, list]:
+    """
+    Turn group labels into integer codes.
+    Categorical labels keep their category order, unobserved
+    categories are dropped.
+    Args:
+        groups: Group label per subject.
+
+    Returns:
+        Integer code per subject and the label of every code.
+    """
+    series = pd.Series(groups)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.cat.remove_unused_categories()
+        return series.cat.codes.to_numpy(), list(series.cat.categories)
+    codes, labels = pd.factorize(series, sort=True)
+    return codes, list(labels)
+
+
+@dataclass
+class GroupedCells:
+    times: np.ndarray
+    events: np.ndarray
+    starts: np.ndarray
+    removed: np.ndarray
+    observed: np.ndarray
+    cell_times: np.ndarray
+    group_bounds: np.ndarray
+    subject_bounds: np.ndarray
+
+
+def _group_cells(
+        durations: np.ndarray,
+        events: np.ndarray,
+        codes: np.ndarray,
+        n_groups: int,
+        time_order: Optional[np.ndarray] = None,
+) -> GroupedCells:
+    """
+    Sort subjects by group and time and collapse them into cells of
+    distinct (group, time) pairs.
+    Args:
+        durations: Follow-up time per subject.
+        events: 1 if the death event was observed, 0 if censored.
+        codes: Integer group code per subject.
+        n_groups: Number of group codes.
+        time_order: Optional argsort of durations to reuse.
+
+    Returns:
+        GroupedCells with the sorted subjects and per-cell counts.
+    """
+    durations = np.asarray(durations, dtype=np.float64)
+    events = np.asarray(events).astype(np.int64)
+    codes = np.asarray(codes, dtype=np.int64)
+
+    if time_order is None:
+        time_order = np.argsort(durations, kind="stable")
+    order = time_order[np.argsort(codes[time_order], kind="stable")]
+    t = durations[order]
+    e = events[order]
+    c = codes[order]
+
+    new_cell = np.ones(len(t), dtype=bool)
+    new_cell[1:] = (c[1:] != c[:-1]) | (t[1:] != t[:-1])
+    starts = np.flatnonzero(new_cell)
+    cell_codes = c[starts]
+    group_range = np.arange(n_groups + 1)
+    return GroupedCells(
+        times=t,
+        events=e,
+        starts=starts,
+        removed=np.diff(np.append(starts, len(t))),
+        observed=np.add.reduceat(e, starts) if len(starts) else e[:0],
+        cell_times=t[starts],
+        group_bounds=np.searchsorted(cell_codes, group_range),
+        subject_bounds=np.searchsorted(c, group_range),
+    )
+
+
+def kaplan_meier_by_group(
+        durations: np.ndarray,
+        events: np.ndarray,
+        codes: np.ndarray,
+        labels: list,
+        time_order: Optional[np.ndarray] = None,
+        alpha: float = 0.05,
+) -> dict[Any, SurvivalTable]:
+    """
+    Estimate the Kaplan-Meier survival curve of every group in one pass.
+    Subjects are sorted by time once (or a precomputed time order is
+    reused) and then stably by group, so at-risk counts and event counts
+    of all groups come out of a single reduction. Results match
+    lifelines' KaplanMeierFitter, including its exponential Greenwood CI.
+    Args:
+        durations: Follow-up time per subject.
+        events: 1 if the death event was observed, 0 if censored.
+        codes: Integer group code per subject (see factorize_groups).
+        labels: Label of every group code.
+        time_order: Optional argsort of durations to reuse.
+        alpha: Significance level of the confidence interval.
+
+    Returns:
+        Survival table per group label.
+    """
+    cells = _group_cells(durations, events, codes, len(labels), time_order)
+    z = NormalDist().inv_cdf(1 - alpha / 2)
+
+    tables = {}
+    for code, label in enumerate(labels):
+        lo, hi = cells.group_bounds[code], cells.group_bounds[code + 1]
+        if lo == hi:
+            continue
+        tables[label] = _survival_table(
+            str(label),
+            cells.cell_times[lo:hi],
+            cells.removed[lo:hi],
+            cells.observed[lo:hi],
+            z,
+        )
+    return tables
+
+
+def logrank_test(
+        durations: np.ndarray,
+        events: np.ndarray,
+        codes: np.ndarray,
+        labels: list,
+) -> LogRankResult:
+    """
+    Multi-group log-rank test for equal survival in all groups.
+    Args:
+        durations: Follow-up time per subject.
+        events: 1 if the death event was observed, 0 if censored.
+        codes: Integer group code per subject.
+        labels: Label of every group code.
+
+    Returns:
+        LogRankResult over all groups.
+    """
+    deaths, at_risk = _risk_matrices(durations, events, codes, len(labels))
+    return _logrank_from_matrices(deaths, at_risk, tuple(map(str, labels)))
+
+
+def pairwise_logrank_tests(
+        durations: np.ndarray,
+        events: np.ndarray,
+        codes: np.ndarray,
+        labels: list,
+) -> list[LogRankResult]:
+    """
+    Log-rank test for every pair of groups.
+    The death and at-risk matrices are built once and sliced per pair.
+    Args:
+        durations: Follow-up time per subject.
+        events: 1 if the death event was observed, 0 if censored.
+        codes: Integer group code per subject.
+        labels: Label of every group code.
+
+    Returns:
+        One LogRankResult per pair of groups.
+    """
+    deaths, at_risk = _risk_matrices(durations, events, codes, len(labels))
+    return [
+        _logrank_from_matrices(
+            deaths[:, [a, b]], at_risk[:, [a, b]], (str(labels[a]), str(labels[b]))
+        )
+        for a, b in combinations(range(len(labels)), 2)
+    ]
+
+
+def bootstrap_survival_bands(
+        durations: np.ndarray,
+        events: np.ndarray,
+        codes: np.ndarray,
+        labels: list,
+        n_resamples: int = 1000,
+        alpha: float = 0.05,
+        seed: int = 42,
+        batch_size: int = 200,
+        n_jobs: Optional[int] = None,
+        time_order: Optional[np.ndarray] = None,
+) -> dict[Any, SurvivalBand]:
+    """
+    Percentile bootstrap confidence bands of the Kaplan-Meier curves.
+    Subjects are resampled within their group. Every batch draws an index
+    matrix at once and turns it into per-subject weights, so no resampled
+    DataFrame is ever built. Batches run in a process pool, each with its
+    own seed derived from the root seed, which keeps results independent
+    of the number of workers.
+    Args:
+        durations: Follow-up time per subject.
+        events: 1 if the death event was observed, 0 if censored.
+        codes: Integer group code per subject.
+        labels: Label of every group code.
+        n_resamples: Number of bootstrap resamples per group.
+        alpha: Significance level of the bands.
+        seed: Root random seed.
+        batch_size: Resamples drawn per batch, bounds memory per worker.
+        n_jobs: Number of worker processes, None for all cores.
+        time_order: Optional argsort of durations to reuse.
+
+    Returns:
+        Survival band per group label, on the survival table's timeline.
+    """
+    cells = _group_cells(durations, events, codes, len(labels), time_order)
+    batches = split_batches(n_resamples, batch_size)
+    seeds = spawn_seeds(seed, len(labels) * len(batches))
+    observed_codes = [
+        code for code in range(len(labels))
+        if cells.group_bounds[code] < cells.group_bounds[code + 1]
+    ]
+
+    tasks = []
+    for code in observed_codes:
+        lo, hi = cells.subject_bounds[code], cells.subject_bounds[code + 1]
+        clo, chi = cells.group_bounds[code], cells.group_bounds[code + 1]
+        starts = cells.starts[clo:chi] - lo
+        for b, size in enumerate(batches):
+            tasks.append((
+                cells.events[lo:hi], starts, size, seeds[code * len(batches) + b]
+            ))
+    curves = run_tasks(_bootstrap_batch, tasks, n_jobs)
+
+    bands = {}
+    for position, code in enumerate(observed_codes):
+        clo, chi = cells.group_bounds[code], cells.group_bounds[code + 1]
+        first = position * len(batches)
+        survival = np.vstack(curves[first:first + len(batches)])
+        timeline = cells.cell_times[clo:chi]
+        if timeline[0] > 0:
+            timeline = np.insert(timeline, 0, 0.0)
+            survival = np.hstack([np.ones((len(survival), 1)), survival])
+        lower, upper = np.quantile(survival, [alpha / 2, 1 - alpha / 2], axis=0)
+        bands[labels[code]] = SurvivalBand(str(labels[code]), timeline, lower, upper)
+    return bands
+
+
+def _bootstrap_batch(
+        events: np.ndarray,
+        starts: np.ndarray,
+        size: int,
+        seed: np.random.SeedSequence,
+) -> np.ndarray:
+    """
+    Kaplan-Meier curves of one batch of resamples of a single group.
+    Args:
+        events: Events of the group's subjects sorted by time.
+        starts: Index of the first subject of every distinct time.
+        size: Number of resamples in the batch.
+        seed: Seed of the batch.
+
+    Returns:
+        Survival probabilities, one row per resample and one column per time.
+    """
+    n = len(events)
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, n, size=(size, n))
+    idx += np.arange(size)[:, None] * n
+    weights = np.bincount(idx.ravel(), minlength=size * n).reshape(size, n)
+
+    removed = np.add.reduceat(weights, starts, axis=1)
+    deaths = np.add.reduceat(weights * events, starts, axis=1)
+    at_risk = n - np.cumsum(removed, axis=1) + removed
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = np.where(at_risk > 0, 1.0 - deaths / at_risk, 1.0)
+    return np.cumprod(factor, axis=1)
+
+
+def _risk_matrices(
+        durations: np.ndarray,
+        events: np.ndarray,
+        codes: np.ndarray,
+        n_groups: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Deaths and subjects at risk per distinct time and group.
+    Args:
+        durations: Follow-up time per subject.
+        events: 1 if the death event was observed, 0 if censored.
+        codes: Integer group code per subject.
+        n_groups: Number of group codes.
+
+    Returns:
+        Death matrix and at-risk matrix of shape (times, groups).
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    _, time_idx = np.unique(np.asarray(durations), return_inverse=True)
+    n_times = time_idx.max() + 1
+    flat = time_idx * n_groups + codes
+    size = n_times * n_groups
+    removed = np.bincount(flat, minlength=size).reshape(n_times, n_groups)
+    deaths = np.bincount(
+        flat, weights=np.asarray(events, dtype=np.float64), minlength=size
+    ).reshape(n_times, n_groups)
+    at_risk = np.cumsum(removed[::-1], axis=0)[::-1]
+    return deaths, at_risk.astype(np.float64)
+
+
+def _logrank_from_matrices(
+        deaths: np.ndarray, at_risk: np.ndarray, groups: tuple[str, ...]
+) -> LogRankResult:
+    """
+    Log-rank statistic from death and at-risk matrices.
+    Args:
+        deaths: Deaths per distinct time and group.
+        at_risk: Subjects at risk per distinct time and group.
+        groups: Labels of the compared groups.
+
+    Returns:
+        LogRankResult of the compared groups.
+    """
+    total_deaths = deaths.sum(axis=1)
+    total_at_risk = at_risk.sum(axis=1)
+    keep = total_at_risk > 0
+    deaths, at_risk = deaths[keep], at_risk[keep]
+    total_deaths, total_at_risk = total_deaths[keep], total_at_risk[keep]
+
+    expected = at_risk * (total_deaths / total_at_risk)[:, None]
+    difference = (deaths - expected).sum(axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = (
+            total_deaths * (total_at_risk - total_deaths)
+            / (total_at_risk ** 2 * (total_at_risk - 1))
+        )
+    scale = np.where(total_at_risk > 1, scale, 0.0)
+    share = at_risk * scale[:, None]
+    variance = np.diag(share.T @ total_at_risk) - share.T @ at_risk
+
+    dof = len(groups) - 1
+    statistic = float(
+        difference[:-1] @ np.linalg.pinv(variance[:-1, :-1]) @ difference[:-1]
+    )
+    return LogRankResult(groups, statistic, dof, float(chi2.sf(statistic, dof)))
+
+
+def _survival_table(
+        label: str,
+        times: np.ndarray,
+        removed: np.ndarray,
+        observed: np.ndarray,
+        z: float,
+) -> SurvivalTable:
+    """
+    Build the survival table of a single group from its event counts.
+    Args:
+        label: Group label.
+        times: Distinct event or censoring times in ascending order.
+        removed: Subjects leaving the risk set at each time.
+        observed: Death events at each time.
+        z: Normal quantile of the confidence level.
+
+    Returns:
+        SurvivalTable of the group.
+    """
+    if times[0] > 0:
+        times = np.insert(times, 0, 0.0)
+        removed = np.insert(removed, 0, 0)
+        observed = np.insert(observed, 0, 0)
+
+    at_risk = removed.sum() - np.concatenate(([0], np.cumsum(removed)[:-1]))
+    censored = removed - observed
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_survival = np.cumsum(np.log(at_risk - observed) - np.log(at_risk))
+        variance = observed / (at_risk * (at_risk - observed)).astype(np.float64)
+        variance = np.cumsum(np.where(np.isinf(variance), 0.0, variance))
+
+        # Exponential Greenwood confidence interval.
+        spread = z * np.sqrt(variance) / log_survival
+        ci_lower = np.exp(-np.exp(np.log(-log_survival) - spread))
+        ci_upper = np.exp(-np.exp(np.log(-log_survival) + spread))
+
+    return SurvivalTable(
+        label=label,
+        timeline=times,
+        at_risk=at_risk,
+        observed=observed,
+        censored=censored,
+        survival=np.exp(log_survival),
+        ci_lower=np.nan_to_num(ci_lower, nan=1.0),
+        ci_upper=np.nan_to_num(ci_upper, nan=1.0),
+    )
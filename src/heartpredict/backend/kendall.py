@@ -0,0 +1,164 @@
+"""Kendall tau-b in O(n log n) by merge-sort inversion counting"""
+from itertools import combinations
+from typing import Optional
+
+import numpy as np
+from heartpredict.parallel import run_tasks
+
+# Dense ranks of all columns, set once per worker process.
+_RANKS: Optional[np.ndarray] = None
+
+# Column pairs times rows below which a matrix is computed serially,
+# about a second of work; starting the pool and sending every worker
+# the ranks costs more than it saves on smaller data
+PARALLEL_MIN_PAIR_ROWS = 2_000_000
+
+
+def dense_ranks(values: np.ndarray) -> np.ndarray:
+    """
+    Replace every value by its dense rank, column by column.
+    Missing values get the rank -1.
+
+    Args:
+        values: Matrix with one column per variable
+
+    Returns:
+        Integer matrix of dense ranks
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        return dense_ranks(values[:, None])[:, 0]
+    ranks = np.full(values.shape, -1, dtype=np.int64)
+    for j in range(values.shape[1]):
+        present = ~np.isnan(values[:, j])
+        ranks[present, j] = np.unique(values[present, j], return_inverse=True)[1]
+    return ranks
+
+
+def count_inversions(values: np.ndarray) -> int:
+    """
+    Count pairs i < j with values[i] > values[j] by a bottom-up merge sort.
+    Every level merges all neighbouring runs at once with a stable sort,
+    which finds the two presorted runs in linear time, and counts for each
+    element of a right run how many elements of its left run are larger.
+    Equal values are not inversions.
+
+    Args:
+        values: Non-negative integers, e.g. dense ranks
+
+    Returns:
+        Number of inversions
+    """
+    a = np.asarray(values, dtype=np.int64)
+    n = len(a)
+    if n < 2:
+        return 0
+    span = int(a.max()) + 1
+    position = np.arange(n)
+    inversions = 0
+    width = 1
+    while width < n:
+        pair = position // (2 * width)
+        is_left = (position // width) % 2 == 0
+        order = np.argsort(pair * span + a, kind="stable")
+        left_sorted = is_left[order]
+
+        # Left elements of the same pair merged before each element;
+        # every earlier pair holds exactly `width` left elements.
+        left_before = np.cumsum(left_sorted) - pair * width
+        left_in_pair = np.minimum(width, n - pair * 2 * width)
+        right = ~left_sorted
+        inversions += int((left_in_pair[right] - left_before[right]).sum())
+
+        a = a[order]
+        width *= 2
+    return inversions
+
+
+def _tied_pairs(sorted_values: np.ndarray) -> int:
+    """
+    Number of pairs sharing a value in a sorted array.
+
+    Args:
+        sorted_values: Sorted array, or rows of a lexicographically sorted matrix
+
+    Returns:
+        Sum of t * (t - 1) / 2 over all runs of t equal values
+    """
+    if len(sorted_values) == 0:
+        return 0
+    change = np.ones(len(sorted_values), dtype=bool)
+    if sorted_values.ndim == 1:
+        change[1:] = sorted_values[1:] != sorted_values[:-1]
+    else:
+        change[1:] = (sorted_values[1:] != sorted_values[:-1]).any(axis=1)
+    runs = np.diff(np.append(np.flatnonzero(change), len(sorted_values)))
+    return int((runs * (runs - 1) // 2).sum())
+
+
+def kendall_tau_b(x_ranks: np.ndarray, y_ranks: np.ndarray) -> float:
+    """
+    Kendall's tau-b with tie correction (Knight's algorithm).
+    Pairs with a missing value (rank -1) are dropped.
+
+    Args:
+        x_ranks: Dense ranks of the first variable
+        y_ranks: Dense ranks of the second variable
+
+    Returns:
+        Kendall's tau-b, NaN if a variable is constant
+    """
+    present = (x_ranks >= 0) & (y_ranks >= 0)
+    x, y = x_ranks[present], y_ranks[present]
+    n = len(x)
+    order = np.lexsort((y, x))
+    x, y = x[order], y[order]
+
+    total = n * (n - 1) // 2
+    x_ties = _tied_pairs(x)
+    joint_ties = _tied_pairs(np.column_stack((x, y)))
+    discordant = count_inversions(y)
+    y_ties = _tied_pairs(np.sort(y))
+
+    concordant_minus_discordant = total - x_ties - y_ties + joint_ties - 2 * discordant
+    denominator = np.sqrt(float(total - x_ties) * float(total - y_ties))
+    if denominator == 0:
+        return float("nan")
+    return concordant_minus_discordant / denominator
+
+
+def _init_worker(ranks: np.ndarray) -> None:
+    global _RANKS
+    _RANKS = ranks
+
+
+def _tau_for_pair(i: int, j: int) -> float:
+    return kendall_tau_b(_RANKS[:, i], _RANKS[:, j])  # type: ignore
+
+
+def kendall_matrix(values: np.ndarray, n_jobs: Optional[int] = None) -> np.ndarray:
+    """
+    Kendall tau-b of every pair of columns, pairs computed in parallel
+    on large data. Columns are ranked once and shared with each worker
+    process.
+
+    Args:
+        values: Matrix with one column per variable
+        n_jobs: Number of worker processes, None to use all cores once
+            the pairs times rows reach PARALLEL_MIN_PAIR_ROWS and a
+            single process below
+
+    Returns:
+        Symmetric correlation matrix
+    """
+    ranks = dense_ranks(values)
+    n_columns = ranks.shape[1]
+    pairs = list(combinations(range(n_columns), 2))
+    if n_jobs is None and len(pairs) * len(ranks) < PARALLEL_MIN_PAIR_ROWS:
+        n_jobs = 1
+    taus = run_tasks(_tau_for_pair, pairs, n_jobs, _init_worker, (ranks,))
+
+    matrix = np.eye(n_columns)
+    for (i, j), tau in zip(pairs, taus):
+        matrix[i, j] = matrix[j, i] = tau
+    return matrix
@@ -1,12 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
-import joblib
 import logging
 import numpy as np
+import pandas as pd
+from heartpredict.artifacts import artifact_writer, load_artifact, sha256_digest
+from heartpredict.cache import PredictionCache, file_identity, normalise_rows
 from heartpredict.data import MLData, FeatureData
+from heartpredict.metrics import metrics
+from heartpredict.registry import ModelRegistry, RegistryEntry
 from sklearn.base import BaseEstimator
 from sklearn.discriminant_analysis import (
     LinearDiscriminantAnalysis,
@@ -49,15 +54,46 @@ class OptimalModel:
     model: BaseEstimator
     score_name: str
     score: float
-    model_file: Path
+    model_file: Optional[Path]
+
+
+@dataclass
+class EnsemblePrediction:
+    model_names: list[str]
+    predictions: np.ndarray
+    probabilities: np.ndarray
+    soft_vote: np.ndarray
+    majority_vote: np.ndarray
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Combine the per-model predictions and the ensemble votes.
+        Returns:
+            DataFrame with one row per data point and one column per model.
+        """
+        frame = pd.DataFrame(self.predictions, columns=self.model_names)
+        frame["soft_vote"] = self.soft_vote
+        frame["majority_vote"] = self.majority_vote
+        return frame
 
 
 class MLBackend:
     def __init__(
             self,
             data: MLData,
+            registry: Optional[ModelRegistry] = None,
+            save_artifacts: bool = True,
     ) -> None:
+        """
+        Args:
+            data: Training and validation data.
+            registry: Registry of the best models, default the one in results.
+            save_artifacts: Save trained models and register the best one,
+                False for throwaway runs such as seed studies.
+        """
         self.data = data
+        self.registry = registry if registry is not None else ModelRegistry()
+        self.save_artifacts = save_artifacts
 
         self.max_tree_depth = self._calculate_max_tree_depth()
         self.k_min = self._calculate_k_min()
@@ -68,6 +104,18 @@ class MLBackend:
         Returns:
             OptimalModel: Best performing model of all classifiers.
         """
+        logging.debug("Start training different classifiers...")
+        return self._train_models(*self.classifier_candidates())
+
+    def classifier_candidates(
+            self
+    ) -> tuple[list[ModelWithParams], EvaluationMetric]:
+        """
+        Untrained classifiers to select from.
+        Returns:
+            Classifiers with their hyperparameter grids and the metric
+            used to compare them.
+        """
         classifiers = [
             ModelWithParams(
                 DecisionTreeClassifier(random_state=self.data.random_seed),
@@ -90,9 +138,7 @@ class MLBackend:
         ]
 
         eval_metric = EvaluationMetric("Accuracy", accuracy_score, np.argmax)
-
-        logging.debug("Start training different classifiers...")
-        return self._train_models(classifiers, eval_metric)
+        return classifiers, eval_metric
 
     def regression_for_different_regressors(self) -> OptimalModel:
         """
@@ -101,6 +147,18 @@ class MLBackend:
         Returns:
             OptimalModel: Best performing model of all regressors.
         """
+        logging.debug("Start training different regressors...")
+        return self._train_models(*self.regressor_candidates())
+
+    def regressor_candidates(
+            self
+    ) -> tuple[list[ModelWithParams], EvaluationMetric]:
+        """
+        Untrained regressors to select from.
+        Returns:
+            Regressors with their hyperparameter grids and the metric
+            used to compare them.
+        """
         regressors = [
             ModelWithParams(
                 LogisticRegression(random_state=self.data.random_seed),
@@ -123,9 +181,27 @@ class MLBackend:
             root_mean_squared_error,
             np.argmin
         )
+        return regressors, eval_metric
 
-        logging.debug("Start training different regressors...")
-        return self._train_models(regressors, eval_metric)
+    def find_or_train_regressor(self) -> Path:
+        """
+        Return the best stored regressor for this dataset and seed,
+        training all regressors only if none was registered yet.
+        Returns:
+            Path to the regressor model file.
+        """
+        # Registered models may still be written in the background
+        artifact_writer.wait()
+        entry = self.registry.find_best(
+            "regressor",
+            self.data.project_data.dataset_hash,
+            self.data.random_seed,
+            self.data.test_size,
+        )
+        if entry is not None:
+            logging.info(f"Reusing stored regressor {entry.model_file}")
+            return Path(entry.model_file)
+        return self.regression_for_different_regressors().model_file
 
     def _k_fold_cross_validation(
             self, model: BaseEstimator, hyperparam_name: str, value: Any
@@ -144,7 +220,8 @@ class MLBackend:
                       f"{hyperparam_name}={value}...")
         if hyperparam_name:
             model.set_params(**{hyperparam_name: value})
-        accuracy = cross_val_score(model, self.data.train.x, self.data.train.y)
+        with metrics.stage("cross_validate", rows=len(self.data.train.x)):
+            accuracy = cross_val_score(model, self.data.train.x, self.data.train.y)
         logging.debug(f"Hyperparameter: {hyperparam_name}={value}, "
                       f"Accuracy: {accuracy.mean()}")
         return accuracy.mean()
@@ -173,7 +250,8 @@ class MLBackend:
                 **{model.hyperparam_name: best_hyperparam_value}
             )
 
-        model.model.fit(self.data.train.x, self.data.train.y)
+        with metrics.stage("fit", rows=len(self.data.train.x)):
+            model.model.fit(self.data.train.x, self.data.train.y)
         logging.debug(f"Model {type(model.model).__name__} performed best with "
                       f"hyperparameter value: {best_hyperparam_value}")
         return TrainingResult(
@@ -196,7 +274,8 @@ class MLBackend:
         """
         training_result = self._train_w_best_hyperparam(model)
 
-        y_pred = training_result.model.predict(self.data.valid.x)  # type: ignore
+        with metrics.stage("predict", rows=len(self.data.valid.x)):
+            y_pred = training_result.model.predict(self.data.valid.x)  # type: ignore
         score = eval_metric.function(self.data.valid.y, y_pred)
         logging.info(
             f"Best Model for {training_result.model_name}"
@@ -206,14 +285,18 @@ class MLBackend:
             f"{eval_metric.name} Score: {score}"
         )
 
-        # Save the trained model
+        if not self.save_artifacts:
+            return OptimalModel(
+                training_result.model, eval_metric.name, float(score), None
+            )
+
+        # Save the trained model in the background, loading it waits for it
         output_dir = Path(f"results/trained_models/{model.model_type}")
-        output_dir.mkdir(parents=True, exist_ok=True)
         model_file = (
                 output_dir
                 / f"{training_result.model_name}_model_{self.data.random_seed}.joblib"
         )
-        joblib.dump(training_result.model, model_file, compress=False)
+        artifact_writer.save(training_result.model, model_file)
         return OptimalModel(
             training_result.model,
             eval_metric.name,
@@ -221,6 +304,20 @@ class MLBackend:
             model_file
         )
 
+    def train_candidates(
+            self, models: list[ModelWithParams], eval_metric: EvaluationMetric
+    ) -> list[OptimalModel]:
+        """
+        Tune and train every candidate and score it on the validation set.
+        Args:
+            models: Candidates, e.g. from classifier_candidates.
+            eval_metric: Evaluation metric for the validation score.
+
+        Returns:
+            OptimalModel of every candidate, in the order of models.
+        """
+        return [self._train_model(m, eval_metric) for m in models]
+
     def _train_models(self, models, eval_metric) -> OptimalModel:
         """
         Train models and return the best performing model.
@@ -231,16 +328,32 @@ class MLBackend:
         Returns:
             TrainingResult: Best performing model of all models.
         """
-        training_results = [self._train_model(m, eval_metric) for m in models]
+        training_results = self.train_candidates(models, eval_metric)
 
         scores = [res.score for res in training_results]
         best_performance = eval_metric.optimum(scores)
+        best = training_results[best_performance]
         logging.info(
-            f"Best Model: {type(training_results[best_performance].model).__name__} "
+            f"Best Model: {type(best.model).__name__} "
             f"with {eval_metric.name}: "
-            f"{training_results[best_performance].score}"
+            f"{best.score}"
         )
-        return training_results[best_performance]
+        if not self.save_artifacts:
+            return best
+        # The checksum needs the file on disk
+        artifact_writer.wait(best.model_file)
+        self.registry.register(RegistryEntry(
+            model_type=models[best_performance].model_type,
+            dataset_hash=self.data.project_data.dataset_hash,
+            random_seed=self.data.random_seed,
+            test_size=self.data.test_size,
+            model_name=type(best.model).__name__,
+            score_name=best.score_name,
+            score=best.score,
+            model_file=str(best.model_file),
+            model_sha256=sha256_digest(best.model_file),  # type: ignore
+        ))
+        return best
 
     def _calculate_max_tree_depth(self):
         """
@@ -264,9 +377,28 @@ class MLBackend:
         return int(np.sqrt(self.data.train.x.shape[0]))
 
 
+@lru_cache(maxsize=32)
+def load_model_file(model_file: Path, identity: str) -> Any:
+    """
+    Load a trained model, reusing it while the file is unchanged.
+    Pending background writes of the file are waited for and the file
+    is checked against its checksum.
+    Args:
+        model_file: Path to the model file.
+        identity: file_identity of the model file, part of the cache key
+            so a changed file is loaded again.
+
+    Returns:
+        Loaded model.
+    """
+    return load_artifact(model_file)
+
+
 class PretrainedModel:
-    def __init__(self) -> None:
+    def __init__(self, cache: Optional[PredictionCache] = None) -> None:
         self.model = None
+        self.model_identity: Optional[str] = None
+        self.cache = cache
 
     def load_model(self, model_file) -> Any:
         """
@@ -278,7 +410,12 @@ class PretrainedModel:
             Loaded model.
         """
         logging.debug(f"Loading model from {model_file}")
-        self.model = joblib.load(model_file)
+        artifact_writer.wait(model_file)
+        self.model_identity = file_identity(model_file)
+        with metrics.stage("load_model"):
+            self.model = load_model_file(model_file, self.model_identity)
+        if self.cache is not None:
+            self.cache.bind_model(self.model_identity)
 
     def predict_death_event(self, feature_data: FeatureData) -> np.array:
         """
@@ -289,13 +426,141 @@ class PretrainedModel:
         Returns:
             Predicted death event.
         """
-        prediction = self.model.predict(feature_data.feature_matrix)
+        if self.cache is None:
+            x = feature_data.feature_matrix
+            with metrics.stage("predict", rows=len(x)):
+                prediction = self.model.predict(x)
+        else:
+            prediction = self._predict_cached(feature_data)
         idx = 0
         for y in prediction:
             logging.info(f"x{idx}: {y}")
             idx += 1
         return prediction
 
+    def _predict_cached(self, feature_data: FeatureData) -> np.ndarray:
+        """
+        Predict the death event, serving repeated rows from the cache.
+        Only rows missing from the cache are scaled and predicted.
+        Args:
+            feature_data: FeatureData instance.
+
+        Returns:
+            Predicted death event.
+        """
+        rows = normalise_rows(
+            feature_data.raw_matrix, feature_data.scaler.n_features_in_
+        )
+        scaler_identity = file_identity(feature_data.scaler_file)
+        keys = [
+            PredictionCache.make_key(row, self.model_identity, scaler_identity)
+            for row in rows
+        ]
+        cached = [self.cache.get(key) for key in keys]  # type: ignore
+        missing = [idx for idx, value in enumerate(cached) if value is None]
+        logging.debug(f"Prediction cache: {len(rows) - len(missing)} hits, "
+                      f"{len(missing)} misses")
+
+        if missing:
+            x = feature_data.scale(rows[missing])
+            with metrics.stage("predict", rows=len(x)):
+                predicted = self.model.predict(x)
+            for idx, value in zip(missing, predicted):
+                cached[idx] = value
+                self.cache.put(keys[idx], value, self.model_identity)  # type: ignore
+        return np.asarray(cached)
+
+
+class PretrainedEnsemble:
+    def __init__(self) -> None:
+        self.models: dict[str, BaseEstimator] = {}
+
+    def load_models(self, model_files: list[Path]) -> None:
+        """
+        Load several trained models.
+        Args:
+            model_files: Paths to the model files.
+
+        Returns:
+            None
+        """
+        for model_file in model_files:
+            logging.debug(f"Loading model from {model_file}")
+            artifact_writer.wait(model_file)
+            with metrics.stage("load_model"):
+                self.models[Path(model_file).stem] = load_model_file(
+                    model_file, file_identity(model_file)
+                )
+
+    def predict_death_event(
+            self, feature_data: FeatureData, max_workers: Optional[int] = None
+    ) -> EnsemblePrediction:
+        """
+        Predict the death event with every loaded model.
+        The input is scaled once and the same read-only feature matrix
+        is shared by all models, which run concurrently.
+        Args:
+            feature_data: FeatureData instance.
+            max_workers: Maximum number of concurrently predicting models.
+
+        Returns:
+            EnsemblePrediction with per-model predictions and ensemble votes.
+        """
+        if not self.models:
+            raise ValueError("No models loaded for ensemble prediction")
+
+        x = np.ascontiguousarray(feature_data.feature_matrix)
+        x.setflags(write=False)
+
+        with metrics.stage("predict_ensemble", rows=len(x)), \
+                ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(
+                lambda model: PretrainedEnsemble._predict_with(model, x),
+                self.models.values()
+            ))
+
+        predictions = np.column_stack([pred for pred, _ in results])
+        probabilities = np.column_stack([prob for _, prob in results])
+        soft_vote = probabilities.mean(axis=1)
+
+        # Ties between the hard votes are broken by the soft vote.
+        votes = 2 * predictions.sum(axis=1)
+        n_models = predictions.shape[1]
+        majority_vote = np.where(
+            votes == n_models, soft_vote >= 0.5, votes > n_models
+        ).astype(int)
+
+        for idx, (soft, majority) in enumerate(zip(soft_vote, majority_vote)):
+            logging.info(f"x{idx}: soft vote {soft:.3f}, majority vote {majority}")
+        return EnsemblePrediction(
+            list(self.models.keys()),
+            predictions,
+            probabilities,
+            soft_vote,
+            majority_vote
+        )
+
+    @staticmethod
+    def _predict_with(
+            model: BaseEstimator, x: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predict labels and death event probabilities with a single model.
+        Args:
+            model: Trained model.
+            x: Scaled feature matrix.
+
+        Returns:
+            Predicted labels and probabilities of a death event.
+        """
+        prediction = np.asarray(model.predict(x)).astype(int)  # type: ignore
+        if hasattr(model, "predict_proba"):
+            death_idx = list(model.classes_).index(1)  # type: ignore
+            probability = model.predict_proba(x)[:, death_idx]  # type: ignore
+        else:
+            probability = prediction.astype(float)
+        return prediction, probability
+
 
 @lru_cache(typed=True)
 def get_ml_backend(ml_data: MLData) -> MLBackend:
@@ -0,0 +1,219 @@
+"""Bitmap indexes and compound row filters without intermediate copies"""
+import logging
+import operator
+import re
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+from heartpredict.enums import BoolColumn, DiscreteColumn
+
+OPERATORS: dict[str, Callable[[np.ndarray, float], np.ndarray]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+_PREDICATE = re.compile(r"^\s*(\w+)\s*(==|!=|<=|>=|<|>)\s*(-?[\d.]+(?:e-?\d+)?)\s*$")
+# Number of set bits of every byte value
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.int64)
+
+
+@dataclass(frozen=True)
+class Predicate:
+    column: str
+    op: str
+    value: float
+
+    def evaluate(self, values: np.ndarray) -> np.ndarray:
+        return OPERATORS[self.op](values, self.value)
+
+
+def parse_query(query: str) -> list[list[Predicate]]:
+    """
+    Parse predicates like "age > 60 and smoking == 1 or sex == 0".
+    "and" binds stronger than "or", parentheses are not supported.
+    Args:
+        query: Query string.
+
+    Returns:
+        Disjunction of conjunctions of predicates.
+    """
+    disjunction = []
+    for clause in re.split(r"\s+or\s+", query.strip(), flags=re.IGNORECASE):
+        conjunction = []
+        for term in re.split(r"\s+and\s+", clause, flags=re.IGNORECASE):
+            match = _PREDICATE.match(term)
+            if match is None:
+                raise ValueError(f"Cannot parse predicate '{term}'")
+            column, op, value = match.groups()
+            conjunction.append(Predicate(column, op, float(value)))
+        disjunction.append(conjunction)
+    return disjunction
+
+
+class BitmapIndex:
+    def __init__(self, df: pd.DataFrame, bins: int = 16) -> None:
+        """
+        Packed bitmaps (one bit per row) of the value 0 and 1 of every
+        BoolColumn, and of equal-depth bins of every DiscreteColumn.
+        Predicates on discrete columns take the union of the bins that lie
+        entirely inside the range and compare actual values only for rows
+        of the boundary bins.
+        Args:
+            df: Data to index.
+            bins: Maximum number of bins per discrete column.
+        """
+        self.df = df
+        self.n_rows = len(df)
+        self.all_rows = np.packbits(np.ones(self.n_rows, dtype=bool))
+        self.bool_bitmaps: dict[str, dict[float, np.ndarray]] = {}
+        for column in BoolColumn:
+            if column.value in df:
+                values = df[column.value].to_numpy()
+                self.bool_bitmaps[column.value] = {
+                    flag: np.packbits(values == flag) for flag in (0.0, 1.0)
+                }
+        self.bin_bitmaps: dict[str, np.ndarray] = {}
+        self.bin_ranges: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for column in DiscreteColumn:
+            if column.value in df:
+                self._index_discrete(column.value, bins)
+        logging.debug(f"Bitmap index built over {self.n_rows} rows")
+
+    def mask(self, predicate: Predicate) -> np.ndarray:
+        """
+        Packed bitmap of the rows satisfying a predicate.
+        Args:
+            predicate: Comparison of one column with a number.
+
+        Returns:
+            Packed bitmap.
+        """
+        if predicate.op == "!=":
+            # The complement of ==, so missing values match like in pandas
+            equal = Predicate(predicate.column, "==", predicate.value)
+            return self.all_rows & ~self.mask(equal)
+        flags = self.bool_bitmaps.get(predicate.column)
+        if flags is not None and predicate.value in flags and predicate.op == "==":
+            return flags[predicate.value]
+        if predicate.column in self.bin_bitmaps:
+            return self._binned_mask(predicate)
+        if predicate.column not in self.df:
+            raise KeyError(f"Unknown column '{predicate.column}'")
+        # Not indexed, e.g. a range over a flag: evaluate on the column
+        values = self.df[predicate.column].to_numpy(dtype=np.float64)
+        return np.packbits(predicate.evaluate(values))
+
+    def query(self, query: str) -> "QueryResult":
+        """
+        Rows matching a compound query, see parse_query.
+        Args:
+            query: Query string.
+
+        Returns:
+            Lazy QueryResult over the indexed data.
+        """
+        bitmap = np.zeros_like(self.all_rows)
+        for conjunction in parse_query(query):
+            clause = self.all_rows
+            for predicate in conjunction:
+                clause = clause & self.mask(predicate)
+            bitmap = bitmap | clause
+        return QueryResult(self, bitmap)
+
+    def _index_discrete(self, column: str, bins: int) -> None:
+        values = self.df[column].to_numpy(dtype=np.float64)
+        present = values[~np.isnan(values)]
+        edges = np.unique(np.quantile(present, np.linspace(0, 1, bins + 1)))
+        ids = np.searchsorted(edges[1:-1], values, side="right")
+        ids[np.isnan(values)] = len(edges)  # outside every bin
+        n_bins = max(len(edges) - 1, 1)
+        self.bin_bitmaps[column] = np.stack(
+            [np.packbits(ids == b) for b in range(n_bins)]
+        )
+        present_ids = ids[~np.isnan(values)]
+        lower = np.full(n_bins, np.inf)
+        upper = np.full(n_bins, -np.inf)
+        np.minimum.at(lower, present_ids, present)
+        np.maximum.at(upper, present_ids, present)
+        self.bin_ranges[column] = (lower, upper)
+
+    def _binned_mask(self, predicate: Predicate) -> np.ndarray:
+        lower, upper = self.bin_ranges[predicate.column]
+        at_lower = predicate.evaluate(lower)
+        at_upper = predicate.evaluate(upper)
+        if predicate.op == "==":
+            full = at_lower & at_upper
+            partial = (lower <= predicate.value) & (predicate.value <= upper) & ~full
+        else:
+            # Monotone comparisons hold for a whole bin iff they hold at both ends
+            full = at_lower & at_upper
+            partial = at_lower ^ at_upper
+        bitmaps = self.bin_bitmaps[predicate.column]
+        mask = np.bitwise_or.reduce(bitmaps[full], axis=0) if full.any() else (
+            np.zeros_like(self.all_rows)
+        )
+        if partial.any():
+            candidates = _unpack(np.bitwise_or.reduce(bitmaps[partial], axis=0),
+                                 self.n_rows)
+            values = self.df[predicate.column].to_numpy(dtype=np.float64)
+            hits = np.zeros(self.n_rows, dtype=bool)
+            hits[candidates] = predicate.evaluate(values[candidates])
+            mask = mask | np.packbits(hits)
+        return mask
+
+
+class QueryResult:
+    def __init__(self, index: BitmapIndex, bitmap: np.ndarray) -> None:
+        """
+        Lazy selection of rows. Nothing is copied until materialize is called;
+        results combine with &, | and ~ and can be refined with filter.
+        Args:
+            index: Index the bitmap belongs to.
+            bitmap: Packed bitmap of the selected rows.
+        """
+        self.index = index
+        self.bitmap = bitmap
+
+    def __len__(self) -> int:
+        return int(_POPCOUNT[self.bitmap].sum())
+
+    def __and__(self, other: "QueryResult") -> "QueryResult":
+        return QueryResult(self.index, self.bitmap & other.bitmap)
+
+    def __or__(self, other: "QueryResult") -> "QueryResult":
+        return QueryResult(self.index, self.bitmap | other.bitmap)
+
+    def __invert__(self) -> "QueryResult":
+        return QueryResult(self.index, ~self.bitmap & self.index.all_rows)
+
+    def filter(self, query: str) -> "QueryResult":
+        return self & self.index.query(query)
+
+    def indices(self) -> np.ndarray:
+        """
+        Positions of the selected rows.
+        Returns:
+            Sorted integer array.
+        """
+        return _unpack(self.bitmap, self.index.n_rows)
+
+    def materialize(self, columns: Optional[list[str]] = None) -> pd.DataFrame:
+        """
+        Copy the selected rows into a new DataFrame.
+        Args:
+            columns: Columns to copy, default all.
+
+        Returns:
+            DataFrame of the selected rows.
+        """
+        df = self.index.df if columns is None else self.index.df[columns]
+        return df.iloc[self.indices()]
+
+
+def _unpack(bitmap: np.ndarray, n_rows: int) -> np.ndarray:
+    return np.flatnonzero(np.unpackbits(bitmap, count=n_rows))
@@ -0,0 +1,188 @@
+"""Permutation and bootstrap significance of correlation matrices"""
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from heartpredict.enums import CorrelationMethod
+from heartpredict.parallel import run_tasks, spawn_seeds, split_batches
+from scipy.stats import rankdata
+
+# Data shared with every worker process, set once by the initializer.
+_VALUES: Optional[np.ndarray] = None
+_STANDARDISED: Optional[np.ndarray] = None
+_OBSERVED: Optional[np.ndarray] = None
+_RANKED = False
+
+# Memory a block of permutations or resamples may use in one worker
+BLOCK_MEMORY_BUDGET = 256 * 2 ** 20
+# Largest block, bounds the number of seeds and tasks on small data
+MAX_BLOCK_SIZE = 50
+
+
+@dataclass
+class CorrelationSignificance:
+    correlation: pd.DataFrame
+    p_values: pd.DataFrame
+    ci_lower: pd.DataFrame
+    ci_upper: pd.DataFrame
+
+
+def _standardise(x: np.ndarray, axis: int = 0) -> np.ndarray:
+    """
+    Centre and scale columns so that z.T @ z / n is the correlation matrix.
+    Args:
+        x: Values, rows are observations along `axis`.
+        axis: Axis of the observations.
+
+    Returns:
+        Standardised values, constant columns become NaN.
+    """
+    centred = x - x.mean(axis=axis, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return centred / np.sqrt((centred ** 2).mean(axis=axis, keepdims=True))
+
+
+def _init_worker(values: np.ndarray, ranked: bool) -> None:
+    global _VALUES, _STANDARDISED, _OBSERVED, _RANKED
+    _VALUES = values
+    _RANKED = ranked
+    _STANDARDISED = _standardise(rankdata(values, axis=0) if ranked else values)
+    _OBSERVED = _STANDARDISED.T @ _STANDARDISED / len(values)
+
+
+def _block_size(n: int, p: int, memory_budget: int) -> int:
+    """
+    Permutations or resamples per block that fit into a memory budget.
+    A permutation holds an index array and the permuted values, a
+    resample the resampled, ranked and standardised values; both come
+    to at most four n x p arrays of 8 bytes.
+    Args:
+        n: Number of rows.
+        p: Number of columns.
+        memory_budget: Bytes a block may use.
+
+    Returns:
+        Block size between 1 and MAX_BLOCK_SIZE.
+    """
+    per_item = 4 * 8 * n * p
+    return int(min(MAX_BLOCK_SIZE, max(1, memory_budget // max(per_item, 1))))
+
+
+def _permutation_block(size: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """
+    Count permutations at least as extreme as the observed correlations.
+    Every column but the first is permuted independently, which breaks
+    all pairwise associations at once, so a single permutation tests
+    the whole matrix.
+    Args:
+        size: Number of permutations in the block.
+        seed: Seed of the block.
+
+    Returns:
+        Count of extreme permutations per matrix entry.
+    """
+    z, observed = _STANDARDISED, _OBSERVED
+    n, p = z.shape  # type: ignore
+    rng = np.random.default_rng(seed)
+    order = np.tile(np.arange(n), (size, p, 1))
+    order[:, 1:] = rng.permuted(order[:, 1:], axis=2)
+    permuted = z[order, np.arange(p)[None, :, None]]  # type: ignore
+    correlations = permuted @ permuted.transpose(0, 2, 1) / n
+    return (np.abs(correlations) >= np.abs(observed) - 1e-12).sum(axis=0)
+
+
+def _bootstrap_block(size: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """
+    Correlation matrices of a block of bootstrap resamples.
+    Args:
+        size: Number of resamples in the block.
+        seed: Seed of the block.
+
+    Returns:
+        Array of shape (size, p, p).
+    """
+    values = _VALUES
+    n = len(values)  # type: ignore
+    rng = np.random.default_rng(seed)
+    resampled = values[rng.integers(0, n, size=(size, n))]  # type: ignore
+    if _RANKED:
+        resampled = rankdata(resampled, axis=1)
+    z = _standardise(resampled, axis=1)
+    return z.transpose(0, 2, 1) @ z / n
+
+
+def correlation_significance(
+        df: pd.DataFrame,
+        method: CorrelationMethod,
+        n_permutations: int = 1000,
+        n_bootstrap: int = 1000,
+        alpha: float = 0.05,
+        seed: int = 42,
+        block_size: Optional[int] = None,
+        n_jobs: Optional[int] = None,
+        memory_budget: int = BLOCK_MEMORY_BUDGET,
+) -> CorrelationSignificance:
+    """
+    Permutation-test p-values and percentile bootstrap confidence intervals
+    for every entry of a Pearson or Spearman correlation matrix.
+    Permutations and resamples are generated in vectorised blocks whose
+    size is derived from the data size so that a block stays within the
+    memory budget of a worker. Blocks run in a process pool and are seeded
+    from the root seed independently of the worker count.
+    Args:
+        df: Data, one column per variable.
+        method: Pearson or Spearman.
+        n_permutations: Number of permutations, 0 to skip.
+        n_bootstrap: Number of bootstrap resamples, 0 to skip.
+        alpha: Significance level of the confidence intervals.
+        seed: Root random seed.
+        block_size: Permutations or resamples per block, default as many
+            as fit into memory_budget.
+        n_jobs: Number of worker processes, None for all cores.
+        memory_budget: Bytes a block may use in one worker.
+
+    Returns:
+        CorrelationSignificance with correlation, p-values and CI matrices.
+    """
+    if method == CorrelationMethod.KENDALL:
+        raise ValueError("Significance is only available for Pearson and Spearman")
+    values = df.to_numpy(dtype=np.float64)
+    ranked = method == CorrelationMethod.SPEARMAN
+    _init_worker(values, ranked)
+    n, p = values.shape
+    if block_size is None:
+        block_size = _block_size(n, p, memory_budget)
+        logging.debug(f"Blocks of {block_size} permutations or resamples")
+
+    def as_frame(matrix: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(matrix, index=df.columns, columns=df.columns)
+
+    p_values = np.full((p, p), np.nan)
+    if n_permutations > 0:
+        logging.debug(f"Running {n_permutations} permutations")
+        blocks = split_batches(n_permutations, block_size)
+        tasks = list(zip(blocks, spawn_seeds(seed, len(blocks))))
+        counts = run_tasks(
+            _permutation_block, tasks, n_jobs, _init_worker, (values, ranked)
+        )
+        p_values = (np.sum(counts, axis=0) + 1) / (n_permutations + 1)
+        np.fill_diagonal(p_values, 0.0)
+
+    lower = upper = np.full((p, p), np.nan)
+    if n_bootstrap > 0:
+        logging.debug(f"Drawing {n_bootstrap} bootstrap resamples")
+        blocks = split_batches(n_bootstrap, block_size)
+        tasks = list(zip(blocks, spawn_seeds(seed + 1, len(blocks))))
+        resamples = np.concatenate(run_tasks(
+            _bootstrap_block, tasks, n_jobs, _init_worker, (values, ranked)
+        ))
+        lower, upper = np.nanquantile(resamples, [alpha / 2, 1 - alpha / 2], axis=0)
+
+    return CorrelationSignificance(
+        correlation=as_frame(_OBSERVED),  # type: ignore
+        p_values=as_frame(p_values),
+        ci_lower=as_frame(lower),
+        ci_upper=as_frame(upper),
+    )
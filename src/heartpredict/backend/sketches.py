@@ -0,0 +1,389 @@
+"""Mergeable summaries of data that does not fit in memory"""
+from typing import Optional
+
+import numpy as np
+
+# Observed worst normalised rank error of KLLSketch is below about 3 / k.
+KLL_ERROR_CONSTANT = 3.0
+
+
+def kll_k_for_error(error_bound: float) -> int:
+    """
+    Smallest KLL accuracy parameter for a normalised rank error bound.
+    Args:
+        error_bound: Tolerated error of ranks divided by the number of values.
+
+    Returns:
+        Accuracy parameter k, at least 8.
+    """
+    if not 0 < error_bound < 1:
+        raise ValueError("error_bound must be between 0 and 1")
+    return max(8, int(np.ceil(KLL_ERROR_CONSTANT / error_bound)))
+
+
+class KLLSketch:
+    def __init__(self, k: int = 200, seed: int = 0) -> None:
+        """
+        KLL quantile sketch: a hierarchy of compactors in which an item
+        on level h stands for 2^h original values. Memory stays in
+        O(k) regardless of the number of values seen.
+        Args:
+            k: Accuracy parameter, the top compactor holds k items.
+            seed: Seed for the random compaction offsets.
+        """
+        if k < 8:
+            raise ValueError("k must be at least 8")
+        self.k = k
+        self.n = 0
+        self.levels: list[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+        self._view: Optional[tuple[np.ndarray, np.ndarray]] = None
+
+    def update(self, values: np.ndarray) -> None:
+        """
+        Add values to the sketch, ignoring missing values.
+        Args:
+            values: New values.
+
+        Returns:
+            None
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        """
+        Merge another sketch into this one.
+        Args:
+            other: Sketch built with the same k.
+
+        Returns:
+            None
+        """
+        if other.k != self.k:
+            raise ValueError("Only sketches with the same k can be merged")
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.n += other.n
+        self._compress()
+
+    def rank(self, values: np.ndarray, inclusive: bool = True) -> np.ndarray:
+        """
+        Approximate number of values below (or at most) each query.
+        Args:
+            values: Query values.
+            inclusive: Count values equal to the query as well.
+
+        Returns:
+            Approximate rank of every query value.
+        """
+        items, cumulative = self._sorted_view()
+        side = "right" if inclusive else "left"
+        idx = np.searchsorted(items, np.asarray(values, dtype=np.float64), side)
+        return np.concatenate(([0.0], cumulative))[idx]
+
+    def cdf(self, values: np.ndarray) -> np.ndarray:
+        return self.rank(values) / max(self.n, 1)
+
+    def quantile(self, q: float) -> float:
+        """
+        Approximate q-quantile of all values seen.
+        Args:
+            q: Quantile between 0 and 1.
+
+        Returns:
+            Approximate quantile, NaN for an empty sketch.
+        """
+        items, cumulative = self._sorted_view()
+        if len(items) == 0:
+            return float("nan")
+        idx = np.searchsorted(cumulative, q * self.n, side="left")
+        return float(items[min(idx, len(items) - 1)])
+
+    def to_dict(self) -> dict:
+        return {
+            "k": self.k,
+            "n": self.n,
+            "levels": [items.tolist() for items in self.levels],
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "KLLSketch":
+        sketch = cls(state["k"])
+        sketch.n = state["n"]
+        sketch.levels = [np.asarray(items, dtype=np.float64)
+                         for items in state["levels"]]
+        return sketch
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self) -> None:
+        """
+        Compact the lowest overfull level until every level fits.
+        Compacting sorts a level and promotes every other item,
+        starting at a random offset, to the next level.
+        """
+        self._view = None
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            keep = items[len(items) - len(items) % 2:]
+            items = items[:len(items) - len(items) % 2]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+            self.levels[level] = keep
+            # Capacities shrink when a level is added, so start over.
+            level = 0
+
+    def _sorted_view(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._view is None:
+            items = np.concatenate(self.levels)
+            weights = np.concatenate([
+                np.full(len(level_items), 2.0 ** level)
+                for level, level_items in enumerate(self.levels)
+            ])
+            order = np.argsort(items, kind="stable")
+            self._view = (items[order], np.cumsum(weights[order]))
+        return self._view
+
+
+def _mix(values: np.ndarray, seed: int) -> np.ndarray:
+    """
+    SplitMix64 finaliser over the bit patterns of float values.
+    """
+    # Adding 0.0 folds -0.0 into 0.0 so both hash alike
+    z = (np.asarray(values, dtype=np.float64) + 0.0).view(np.uint64)
+    z = z ^ np.uint64(seed)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class CountMinSketch:
+    def __init__(self, width: int, depth: int, seed: int = 0) -> None:
+        """
+        Count-min sketch of value frequencies. Estimates never undercount
+        and overcount by at most e / width of all values with probability
+        1 - exp(-depth).
+        Args:
+            width: Counters per row.
+            depth: Number of rows, each with its own hash function.
+            seed: Seed of the hash functions.
+        """
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        self.n = 0
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self._seeds = np.random.default_rng(seed).integers(
+            0, 2 ** 63, size=depth, dtype=np.uint64
+        )
+
+    @classmethod
+    def from_error(
+            cls, error_bound: float, delta: float = 0.01, seed: int = 0
+    ) -> "CountMinSketch":
+        """
+        Sketch whose overcount stays below error_bound times the number of
+        values with probability 1 - delta.
+        Args:
+            error_bound: Tolerated error of frequencies relative to all values.
+            delta: Probability of exceeding the bound.
+            seed: Seed of the hash functions.
+
+        Returns:
+            Empty CountMinSketch.
+        """
+        width = int(np.ceil(np.e / error_bound))
+        depth = max(1, int(np.ceil(np.log(1 / delta))))
+        return cls(width, depth, seed)
+
+    def update(self, values: np.ndarray, counts: Optional[np.ndarray] = None) -> None:
+        """
+        Add values, optionally with their multiplicities.
+        Args:
+            values: New values.
+            counts: Number of occurrences of each value, default one each.
+
+        Returns:
+            None
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if counts is None:
+            values, counts = np.unique(values, return_counts=True)
+        counts = np.asarray(counts, dtype=np.int64)
+        self.n += int(counts.sum())
+        for row, row_seed in enumerate(self._seeds):
+            np.add.at(self.table[row], self._buckets(values, row_seed), counts)
+
+    def estimate(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64).ravel()
+        estimates = [
+            self.table[row, self._buckets(values, row_seed)]
+            for row, row_seed in enumerate(self._seeds)
+        ]
+        return np.min(estimates, axis=0)
+
+    def merge(self, other: "CountMinSketch") -> None:
+        shape = (self.width, self.depth, self.seed)
+        if (other.width, other.depth, other.seed) != shape:
+            raise ValueError("Only sketches with the same shape and seed can be merged")
+        self.table += other.table
+        self.n += other.n
+
+    def to_dict(self) -> dict:
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "seed": self.seed,
+            "n": self.n,
+            "table": self.table.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "CountMinSketch":
+        sketch = cls(state["width"], state["depth"], state["seed"])
+        sketch.n = state["n"]
+        sketch.table = np.asarray(state["table"], dtype=np.int64)
+        return sketch
+
+    def _buckets(self, values: np.ndarray, row_seed: np.uint64) -> np.ndarray:
+        return (_mix(values, int(row_seed)) % np.uint64(self.width)).astype(np.intp)
+
+
+class FrequencySketch:
+    def __init__(
+            self,
+            max_distinct: int = 1000,
+            error_bound: float = 0.001,
+            delta: float = 0.01,
+            seed: int = 0,
+    ) -> None:
+        """
+        Value counts in bounded memory. Counts are exact as long as the
+        column has at most max_distinct values. Beyond that all values go
+        into a count-min sketch and only the max_distinct most frequent
+        candidates are tracked, with approximate counts.
+        Args:
+            max_distinct: Number of values tracked.
+            error_bound: Error bound of the count-min sketch.
+            delta: Failure probability of the count-min sketch.
+            seed: Seed of the count-min hash functions.
+        """
+        self.max_distinct = max_distinct
+        self.error_bound = error_bound
+        self.delta = delta
+        self.seed = seed
+        self.n = 0
+        self.counts: dict[float, int] = {}
+        self.count_min: Optional[CountMinSketch] = None
+
+    @property
+    def exact(self) -> bool:
+        return self.count_min is None
+
+    def update(self, values: np.ndarray) -> None:
+        """
+        Add values to the sketch, ignoring missing values.
+        Args:
+            values: New values.
+
+        Returns:
+            None
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values, counts = np.unique(values[~np.isnan(values)], return_counts=True)
+        self.n += int(counts.sum())
+        self._add(values, counts)
+
+    def merge(self, other: "FrequencySketch") -> None:
+        """
+        Merge another sketch into this one.
+        Args:
+            other: Sketch with the same settings.
+
+        Returns:
+            None
+        """
+        if other.count_min is not None:
+            if self.count_min is None:
+                self._switch_to_count_min()
+            self.count_min.merge(other.count_min)  # type: ignore
+            self.n += other.n
+            self._track(np.fromiter(other.counts, dtype=np.float64))
+            return
+        self.n += other.n
+        values = np.fromiter(other.counts, dtype=np.float64)
+        self._add(values, np.fromiter(other.counts.values(), dtype=np.int64))
+
+    def distribution(self) -> dict[float, int]:
+        """
+        Tracked values and their (estimated) counts, most frequent first.
+        Returns:
+            Dictionary mapping value to count.
+        """
+        return dict(sorted(self.counts.items(), key=lambda item: -item[1]))
+
+    def to_dict(self) -> dict:
+        return {
+            "max_distinct": self.max_distinct,
+            "error_bound": self.error_bound,
+            "delta": self.delta,
+            "seed": self.seed,
+            "n": self.n,
+            "counts": [[value, count] for value, count in self.counts.items()],
+            "count_min": None if self.count_min is None else self.count_min.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "FrequencySketch":
+        sketch = cls(
+            state["max_distinct"], state["error_bound"], state["delta"], state["seed"]
+        )
+        sketch.n = state["n"]
+        sketch.counts = {float(value): int(count) for value, count in state["counts"]}
+        if state["count_min"] is not None:
+            sketch.count_min = CountMinSketch.from_dict(state["count_min"])
+        return sketch
+
+    def _add(self, values: np.ndarray, counts: np.ndarray) -> None:
+        if self.count_min is not None:
+            self.count_min.update(values, counts)
+            self._track(values)
+            return
+        for value, count in zip(values.tolist(), counts.tolist()):
+            self.counts[value] = self.counts.get(value, 0) + count
+        if len(self.counts) > self.max_distinct:
+            self._switch_to_count_min()
+
+    def _switch_to_count_min(self) -> None:
+        self.count_min = CountMinSketch.from_error(
+            self.error_bound, self.delta, self.seed
+        )
+        self.count_min.update(
+            np.fromiter(self.counts, dtype=np.float64),
+            np.fromiter(self.counts.values(), dtype=np.int64),
+        )
+        self._track(np.empty(0))
+
+    def _track(self, values: np.ndarray) -> None:
+        """
+        Keep the max_distinct candidates with the highest estimates.
+        """
+        candidates = np.union1d(np.fromiter(self.counts, dtype=np.float64), values)
+        estimates = self.count_min.estimate(candidates)  # type: ignore
+        top = np.argsort(-estimates, kind="stable")[:self.max_distinct]
+        self.counts = dict(zip(candidates[top].tolist(), estimates[top].tolist()))
@@ -0,0 +1,329 @@
+"""Mergeable correlation accumulators for chunked and sharded data"""
+import json
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+import pandas as pd
+from heartpredict.backend.sketches import FrequencySketch, KLLSketch, kll_k_for_error
+
+
+class PearsonAccumulator:
+    def __init__(self, columns: list[str]) -> None:
+        """
+        Running means and co-moments (Welford / Chan et al.) of a set of
+        columns. Rows with a missing value are skipped.
+        Args:
+            columns: Names of the accumulated columns.
+        """
+        self.columns = list(columns)
+        self.n = 0
+        self.mean = np.zeros(len(self.columns))
+        self.comoment = np.zeros((len(self.columns), len(self.columns)))
+
+    def update(self, chunk: Union[pd.DataFrame, np.ndarray]) -> None:
+        """
+        Add a chunk of rows.
+        Args:
+            chunk: DataFrame containing the columns, or a matching matrix.
+
+        Returns:
+            None
+        """
+        if isinstance(chunk, pd.DataFrame):
+            chunk = chunk[self.columns].to_numpy(dtype=np.float64)
+        x = np.asarray(chunk, dtype=np.float64)
+        x = x[~np.isnan(x).any(axis=1)]
+        if len(x) == 0:
+            return
+        mean = x.mean(axis=0)
+        centred = x - mean
+        self._combine(len(x), mean, centred.T @ centred)
+
+    def merge(self, other: "PearsonAccumulator") -> None:
+        """
+        Merge the accumulator of another chunk or shard into this one.
+        Args:
+            other: Accumulator over the same columns.
+
+        Returns:
+            None
+        """
+        if other.columns != self.columns:
+            raise ValueError("Only accumulators over the same columns can be merged")
+        if other.n:
+            self._combine(other.n, other.mean, other.comoment)
+
+    def correlation(self) -> pd.DataFrame:
+        """
+        Pearson correlation matrix of all rows seen.
+        Returns:
+            Correlation matrix as DataFrame.
+        """
+        scale = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = self.comoment / np.outer(scale, scale)
+        return pd.DataFrame(matrix, index=self.columns, columns=self.columns)
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": "pearson",
+            "columns": self.columns,
+            "n": self.n,
+            "mean": self.mean.tolist(),
+            "comoment": self.comoment.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "PearsonAccumulator":
+        accumulator = cls(state["columns"])
+        accumulator.n = state["n"]
+        accumulator.mean = np.asarray(state["mean"], dtype=np.float64)
+        accumulator.comoment = np.asarray(state["comoment"], dtype=np.float64)
+        return accumulator
+
+    def _combine(self, n: int, mean: np.ndarray, comoment: np.ndarray) -> None:
+        total = self.n + n
+        delta = mean - self.mean
+        self.comoment += comoment + np.outer(delta, delta) * (self.n * n / total)
+        self.mean += delta * (n / total)
+        self.n = total
+
+
+class SpearmanAccumulator:
+    def __init__(self, sketches: dict[str, KLLSketch]) -> None:
+        """
+        Approximate Spearman correlation over data seen in chunks.
+        Needs one KLL sketch per column that was built over all data
+        beforehand (first pass, see build_sketches). Values are then mapped
+        to approximate mid-ranks and fed into a PearsonAccumulator
+        (second pass). For sharded data every worker sketches its shard,
+        the unranked accumulators are merged into sketches over all shards,
+        and every worker ranks its shard with those before the ranked
+        accumulators are merged.
+        Args:
+            sketches: Quantile sketch per column over the whole dataset.
+        """
+        self.sketches = sketches
+        self.pearson = PearsonAccumulator(list(sketches))
+        # Set once a chunk was ranked, the sketches are fixed from then on
+        self.ranked = False
+
+    @staticmethod
+    def build_sketches(columns: list[str], k: int = 200) -> dict[str, KLLSketch]:
+        return {column: KLLSketch(k) for column in columns}
+
+    @staticmethod
+    def update_sketches(sketches: dict[str, KLLSketch], chunk: pd.DataFrame) -> None:
+        for column, sketch in sketches.items():
+            sketch.update(chunk[column].to_numpy())
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """
+        Add a chunk of rows, ranked with the sketches.
+        Args:
+            chunk: DataFrame containing the sketched columns.
+
+        Returns:
+            None
+        """
+        ranks = np.column_stack([
+            self._mid_ranks(sketch, chunk[column].to_numpy(dtype=np.float64))
+            for column, sketch in self.sketches.items()
+        ])
+        self.pearson.update(ranks)
+        self.ranked = True
+
+    def merge(self, other: "SpearmanAccumulator") -> None:
+        """
+        Merge the accumulator of another shard into this one. Unranked
+        accumulators (first pass) merge their sketches; ranked ones merge
+        their rank statistics and must have been ranked with the same
+        sketches.
+        Args:
+            other: Accumulator over the same columns.
+
+        Returns:
+            None
+        """
+        if list(other.sketches) != list(self.sketches):
+            raise ValueError("Only accumulators over the same columns can be merged")
+        if not self.ranked and not other.ranked:
+            for column, sketch in self.sketches.items():
+                sketch.merge(other.sketches[column])
+            return
+        if not (self.ranked and other.ranked) or (
+                self._sketch_state() != other._sketch_state()
+        ):
+            raise ValueError(
+                "Only accumulators ranked with the same sketches can be merged, "
+                "merge the unranked accumulators of all shards first and rank "
+                "every shard with the merged sketches"
+            )
+        self.pearson.merge(other.pearson)
+
+    def correlation(self) -> pd.DataFrame:
+        return self.pearson.correlation()
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": "spearman",
+            "ranked": self.ranked,
+            "sketches": self._sketch_state(),
+            "pearson": self.pearson.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "SpearmanAccumulator":
+        accumulator = cls({
+            column: KLLSketch.from_dict(sketch)
+            for column, sketch in state["sketches"].items()
+        })
+        accumulator.pearson = PearsonAccumulator.from_dict(state["pearson"])
+        accumulator.ranked = state.get("ranked", True)
+        return accumulator
+
+    def _sketch_state(self) -> dict:
+        return {column: sketch.to_dict() for column, sketch in self.sketches.items()}
+
+    @staticmethod
+    def _mid_ranks(sketch: KLLSketch, values: np.ndarray) -> np.ndarray:
+        ranks = (sketch.rank(values, False) + sketch.rank(values, True)) / 2
+        return np.where(np.isnan(values), np.nan, ranks)
+
+
+class ColumnSummary:
+    def __init__(
+            self, name: str, error_bound: float = 0.01, max_distinct: int = 1000
+    ) -> None:
+        """
+        Constant-memory summary of one column: exact count, extremes and
+        moments, a KLL sketch for quantiles and a frequency sketch for the
+        value distribution. Summaries of chunks or shards can be merged.
+        Args:
+            name: Column name.
+            error_bound: Normalised rank error of quantiles and relative
+                error of counts once the distribution is no longer exact.
+            max_distinct: Distinct values counted exactly.
+        """
+        self.name = name
+        self.error_bound = error_bound
+        self.rows = 0
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.integral = True
+        self.quantiles = KLLSketch(kll_k_for_error(error_bound))
+        self.frequencies = FrequencySketch(max_distinct, error_bound)
+
+    def update(self, values: Union[pd.Series, np.ndarray]) -> None:
+        """
+        Add a chunk of values.
+        Args:
+            values: Values of the column in the chunk.
+
+        Returns:
+            None
+        """
+        values = np.asarray(values)
+        self.integral = self.integral and np.issubdtype(values.dtype, np.integer)
+        values = values.astype(np.float64)
+        self.rows += len(values)
+        present = values[~np.isnan(values)]
+        if len(present):
+            self.minimum = min(self.minimum, float(present.min()))
+            self.maximum = max(self.maximum, float(present.max()))
+            mean = float(present.mean())
+            self._combine(len(present), mean, float(((present - mean) ** 2).sum()))
+        self.quantiles.update(present)
+        self.frequencies.update(present)
+
+    def merge(self, other: "ColumnSummary") -> None:
+        self.rows += other.rows
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.integral = self.integral and other.integral
+        if other.n:
+            self._combine(other.n, other.mean, other.m2)
+        self.quantiles.merge(other.quantiles)
+        self.frequencies.merge(other.frequencies)
+
+    @property
+    def standard_dev(self) -> float:
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else float("nan")
+
+    def distribution(self) -> dict:
+        """
+        Value counts, exact while the column has few distinct values.
+        Returns:
+            Dictionary mapping value to count, most frequent first.
+        """
+        cast = int if self.integral else float
+        return {
+            cast(value): count
+            for value, count in self.frequencies.distribution().items()
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "error_bound": self.error_bound,
+            "rows": self.rows,
+            "n": self.n,
+            "mean": self.mean,
+            "m2": self.m2,
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "integral": self.integral,
+            "quantiles": self.quantiles.to_dict(),
+            "frequencies": self.frequencies.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "ColumnSummary":
+        summary = cls(state["name"], state["error_bound"])
+        for key in ("rows", "n", "mean", "m2", "minimum", "maximum", "integral"):
+            setattr(summary, key, state[key])
+        summary.quantiles = KLLSketch.from_dict(state["quantiles"])
+        summary.frequencies = FrequencySketch.from_dict(state["frequencies"])
+        return summary
+
+    def _combine(self, n: int, mean: float, m2: float) -> None:
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * (self.n * n / total)
+        self.mean += delta * (n / total)
+        self.n = total
+
+
+Accumulator = Union[PearsonAccumulator, SpearmanAccumulator]
+
+
+def save_accumulator(accumulator: Accumulator, output_file: Path) -> None:
+    """
+    Serialise a partial aggregate to JSON so it can be combined later.
+    Args:
+        accumulator: Pearson or Spearman accumulator.
+        output_file: JSON file to write.
+
+    Returns:
+        None
+    """
+    Path(output_file).write_text(json.dumps(accumulator.to_dict()))
+
+
+def load_accumulator(input_file: Path) -> Accumulator:
+    """
+    Read a partial aggregate written by save_accumulator.
+    Args:
+        input_file: JSON file to read.
+
+    Returns:
+        Pearson or Spearman accumulator.
+    """
+    state = json.loads(Path(input_file).read_text())
+    if state["kind"] == "spearman":
+        return SpearmanAccumulator.from_dict(state)
+    return PearsonAccumulator.from_dict(state)
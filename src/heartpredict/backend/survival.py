@@ -1,24 +1,284 @@
+from heartpredict.cache import file_identity
 from heartpredict.data import MLData
+from heartpredict.backend.kaplan_meier import (
+    LogRankResult,
+    SurvivalBand,
+    SurvivalTable,
+    bootstrap_survival_bands,
+    factorize_groups,
+    kaplan_meier_by_group,
+    logrank_test,
+    pairwise_logrank_tests,
+)
+from heartpredict.backend.descriptive import MEANING_BINARY_COLUMNS
 from heartpredict.backend.ml import PretrainedModel
+from heartpredict.enums import BoolColumn, Column
+from heartpredict.metrics import metrics
 
+import hashlib
+import json
 import logging
+import os
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from dataclasses import dataclass
 from functools import lru_cache
 from pathlib import Path
-from lifelines import KaplanMeierFitter
+from typing import Any, Optional
+
+
+RISK_LABELS = ["Low Risk", "Medium Risk", "High Risk"]
+
+
+@dataclass(frozen=True)
+class Stratification:
+    quantiles: Optional[int] = None
+    covariates: tuple[BoolColumn, ...] = ()
+
+    @property
+    def name(self) -> str:
+        parts = [f"risk_q{self.quantiles}"] if self.quantiles else []
+        parts += [BoolColumn(c).value for c in self.covariates]
+        return "_x_".join(parts) if parts else "all"
+
+    @classmethod
+    def from_name(cls, name: str) -> "Stratification":
+        """
+        Parse the name of a stratification, e.g. from the stratification
+        column of saved survival tables.
+        Args:
+            name: Stratification.name, e.g. "risk_q3_x_sex".
+
+        Returns:
+            Stratification with that name.
+        """
+        quantiles, covariates = None, []
+        for part in name.split("_x_") if name != "all" else []:
+            if part.startswith("risk_q"):
+                quantiles = int(part.removeprefix("risk_q"))
+            else:
+                covariates.append(BoolColumn(part))
+        return cls(quantiles, tuple(covariates))
+
+    def risk_labels(self) -> list[str]:
+        if self.quantiles == 3:
+            return RISK_LABELS
+        return [f"Risk Q{i + 1}" for i in range(self.quantiles or 0)]
 
 
 class SurvivalBackend:
 
-    def __init__(self, ml_data: MLData) -> None:
+    def __init__(self,
+                 ml_data: MLData,
+                 time_column: str = Column.TIME.value,
+                 event_column: str = Column.DEATH_EVENT.value
+                 ) -> None:
         self.df = pd.DataFrame(ml_data.project_data.df)
         self.feature_matrix = ml_data.scaled_feature_matrix
         self.model = PretrainedModel()
+        self.days_column = time_column
+        self.death_event_column = event_column
+        self.dataset_hash = ml_data.project_data.dataset_hash
+        self.scores_dir = Path("results/survival/scores")
+
+    def assign_risk_groups(self, path_to_regressor: Path, quantiles: int = 3) -> None:
+        """
+        Predict the death event probability with a regressor and
+        stratify the patients into risk quantiles
+        (Low, Medium and High risk for three quantiles).
+        Args:
+            path_to_regressor: Path to the saved regressor model.
+            quantiles: Number of risk quantiles.
+
+        Returns:
+            None
+        """
+        self.df['death_event_prob'] = self.predict_death_event_prob(
+            path_to_regressor)
+
+        # Stratify data based on predicted probabilities.
+        self.df['risk_group'] = pd.qcut(
+            self.df['death_event_prob'],
+            q=quantiles,
+            labels=Stratification(quantiles).risk_labels(),
+        )
+
+    def predict_death_event_prob(self, path_to_regressor: Path) -> np.ndarray:
+        """
+        Predict probabilities of a death event. Scores are cached on disk
+        per dataset and regressor version, so stratifying again does not
+        need the regressor.
+        Args:
+            path_to_regressor: Path to the saved regressor model.
+
+        Returns:
+            Death event probability per patient.
+        """
+        key = hashlib.sha256(
+            f"{self.dataset_hash}:{file_identity(path_to_regressor)}".encode()
+        ).hexdigest()[:32]
+        score_file = self.scores_dir / f"{key}.npy"
+        if score_file.exists():
+            logging.debug(f"Reusing cached death event scores {score_file}")
+            return np.load(score_file)
+
+        self.model.load_model(path_to_regressor)
+        scores = self.model.model.predict_proba(self.feature_matrix)[:, 1]
+
+        self.scores_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = score_file.with_name(f".{score_file.name}.tmp")
+        with open(tmp_file, "wb") as f:
+            np.save(f, scores)
+        os.replace(tmp_file, score_file)
+        return scores
+
+    def stratify(self, stratification: Stratification) -> tuple[np.ndarray, list]:
+        """
+        Assign every patient to a stratum, combining risk quantiles of the
+        predicted death event probability with boolean covariates.
+        Risk quantiles need assign_risk_groups or
+        calculate_stratified_survival_tables to have predicted the scores.
+        Args:
+            stratification: Stratification to apply.
+
+        Returns:
+            Integer stratum code per patient and the label of every code.
+        """
+        codes = np.zeros(len(self.df), dtype=np.int64)
+        labels = [""]
+        if stratification.quantiles:
+            if 'death_event_prob' not in self.df.columns:
+                raise ValueError("Risk quantiles need predicted death event "
+                                 "probabilities, call assign_risk_groups first")
+            codes = pd.qcut(
+                self.df['death_event_prob'], q=stratification.quantiles, labels=False
+            ).to_numpy().astype(np.int64)
+            labels = stratification.risk_labels()
+
+        for covariate in stratification.covariates:
+            covariate = BoolColumn(covariate)
+            codes = 2 * codes + self.df[covariate.value].to_numpy().astype(np.int64)
+            meaning = MEANING_BINARY_COLUMNS[covariate]
+            labels = [
+                ", ".join(p for p in (label, meaning[value]) if p)
+                for label in labels
+                for value in (0, 1)
+            ]
+
+        # Drop strata without any patient and renumber the rest.
+        present, codes = np.unique(codes, return_inverse=True)
+        return codes, [labels[i] for i in present]
+
+    def compare_risk_groups(
+            self, stratification: Optional[Stratification] = None
+    ) -> list[LogRankResult]:
+        """
+        Log-rank tests between strata: first over all groups, then pairwise.
+        Args:
+            stratification: Strata to compare, by default the risk groups
+                assigned by assign_risk_groups.
+
+        Returns:
+            Multi-group LogRankResult followed by the pairwise results.
+        """
+        if stratification is None:
+            codes, labels = factorize_groups(self.df['risk_group'])
+        else:
+            codes, labels = self.stratify(stratification)
+        durations = self.df[self.days_column].to_numpy()
+        events = self.df[self.death_event_column].to_numpy()
+        return (
+            [logrank_test(durations, events, codes, labels)]
+            + pairwise_logrank_tests(durations, events, codes, labels)
+        )
+
+    def calculate_stratified_survival_tables(
+            self,
+            stratifications: list[Stratification],
+            path_to_regressor: Optional[Path] = None,
+            bootstrap_resamples: int = 0,
+            n_jobs: Optional[int] = None,
+            seed: int = 42
+    ) -> pd.DataFrame:
+        """
+        Calculate Kaplan-Meier survival tables for several stratifications.
+        Patients are sorted by time once and that order is reused for every
+        stratification, instead of refitting per group.
+        Args:
+            stratifications: Stratifications to calculate.
+            path_to_regressor: Regressor for risk quantiles, only needed if
+                a stratification uses quantiles.
+            bootstrap_resamples: If positive, add bootstrap confidence bands.
+            n_jobs: Worker processes for the bootstrap, None for all cores.
+            seed: Random seed of the bootstrap.
+
+        Returns:
+            Long-format DataFrame with one row per stratification,
+            stratum and time.
+        """
+        if any(s.quantiles for s in stratifications):
+            if path_to_regressor is None:
+                raise ValueError("Risk quantiles need a regressor")
+            self.df['death_event_prob'] = self.predict_death_event_prob(
+                path_to_regressor)
+
+        durations = self.df[self.days_column].to_numpy()
+        events = self.df[self.death_event_column].to_numpy()
+        time_order = np.argsort(durations, kind="stable")
+
+        frames = []
+        for stratification in stratifications:
+            logging.debug(f"Fitting Kaplan-Meier models for {stratification.name}")
+            codes, labels = self.stratify(stratification)
+            tables = kaplan_meier_by_group(
+                durations, events, codes, labels, time_order=time_order
+            )
+            bands = {}
+            if bootstrap_resamples > 0:
+                logging.debug(f"Drawing {bootstrap_resamples} bootstrap resamples")
+                bands = bootstrap_survival_bands(
+                    durations, events, codes, labels,
+                    n_resamples=bootstrap_resamples, seed=seed, n_jobs=n_jobs,
+                    time_order=time_order
+                )
+            frame = survival_tables_to_frame(tables, bands)
+            frame.insert(0, "stratification", stratification.name)
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+    def calculate_survival_tables(self,
+                                  path_to_regressor: Path,
+                                  bootstrap_resamples: int = 0,
+                                  n_jobs: Optional[int] = None,
+                                  seed: int = 42
+                                  ) -> pd.DataFrame:
+        """
+        Calculate the Kaplan-Meier survival tables for specific regressor,
+        stratified by predicted risk groups. Nothing is plotted.
+        Args:
+            path_to_regressor: Path to the saved regressor model.
+            bootstrap_resamples: If positive, add bootstrap confidence bands.
+            n_jobs: Worker processes for the bootstrap, None for all cores.
+            seed: Random seed of the bootstrap.
+
+        Returns:
+            Long-format DataFrame with one row per risk group and time.
+        """
+        self.assign_risk_groups(path_to_regressor)
+        return self.calculate_stratified_survival_tables(
+            [Stratification(quantiles=3)],
+            path_to_regressor,
+            bootstrap_resamples,
+            n_jobs,
+            seed
+        )
 
     def create_kaplan_meier_plot_for(self,
                                      path_to_regressor: Path,
-                                     show_plot: bool = False
+                                     show_plot: bool = False,
+                                     bootstrap_resamples: int = 0,
+                                     n_jobs: Optional[int] = None,
+                                     seed: int = 42
                                      ) -> None:
         """
         Create a Kaplan-Meier plot for specific regressor,
@@ -26,55 +286,191 @@ class SurvivalBackend:
         Args:
             path_to_regressor: Path to the saved regressor model.
             show_plot: If True, display the plot.
+            bootstrap_resamples: If positive, shade bootstrap confidence
+                bands instead of the Greenwood confidence intervals.
+            n_jobs: Worker processes for the bootstrap, None for all cores.
+            seed: Random seed of the bootstrap.
 
         Returns:
             None
         """
-        self.model.load_model(path_to_regressor)
+        survival_tables = self.calculate_survival_tables(
+            path_to_regressor, bootstrap_resamples, n_jobs, seed
+        )
+        render_kaplan_meier_plot(survival_tables, show_plot=show_plot)
 
-        days_column = self.df.columns[-2]
-        death_event_column = self.df.columns[-1]
 
-        # Predict probabilities of a death event.
-        self.df['death_event_prob'] = self.model.model.predict_proba(
-            self.feature_matrix)[:, 1]
+def survival_tables_to_frame(
+        tables: dict[Any, SurvivalTable], bands: dict[Any, SurvivalBand]
+) -> pd.DataFrame:
+    """
+    Combine survival tables and optional bootstrap bands of all groups.
+    Args:
+        tables: Survival table per group.
+        bands: Bootstrap band per group, may be empty.
 
-        # Stratify data based on predicted probabilities.
-        self.df['risk_group'] = pd.qcut(
-            self.df['death_event_prob'],
-            q=3,
-            labels=["Low Risk", "Medium Risk", "High Risk"],
-        )
+    Returns:
+        Long-format DataFrame with a 'group' column.
+    """
+    frames = []
+    for group, table in tables.items():
+        frame = table.to_frame().reset_index()
+        if group in bands:
+            frame["band_lower"] = bands[group].lower
+            frame["band_upper"] = bands[group].upper
+        frame.insert(0, "group", table.label)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
 
-        # Plot Kaplan-Meier curves for each risk group
-        plt.figure(figsize=(10, 6))
-        kmf = KaplanMeierFitter()
 
-        for group, subset in self.df.groupby('risk_group', observed=True):
-            time = subset[days_column]
-            event_observed = subset[death_event_column].astype(bool)
+def save_survival_tables(survival_tables: pd.DataFrame, output_file: Path) -> None:
+    """
+    Write survival tables to a compact JSON or, by suffix, Parquet artifact.
+    Parquet needs the optional pyarrow dependency.
+    Args:
+        survival_tables: Long-format survival tables.
+        output_file: Path ending in .json or .parquet.
 
-            logging.debug(f"Fitting Kaplan-Meier model for group: {group}")
+    Returns:
+        None
+    """
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    if output_file.suffix == ".parquet":
+        survival_tables.to_parquet(output_file, index=False)
+    elif output_file.suffix == ".json":
+        with open(output_file, "w") as f:
+            json.dump(survival_tables.to_dict(orient="list"), f,
+                      separators=(",", ":"))
+    else:
+        raise ValueError(f"Unsupported survival table format: {output_file}")
+    logging.info(f"Survival tables saved to {output_file}")
 
-            kmf.fit(durations=time, event_observed=event_observed, label=group)
-            kmf.plot_survival_function()
 
-        plt.xlabel("Days")
-        plt.ylabel("Survival Probability")
-        plt.title("Kaplan-Meier Survival Curves Stratified by Predicted Risk")
-        plt.legend(title="Risk Group")
-        plt.grid(True)
+def load_survival_tables(input_file: Path) -> pd.DataFrame:
+    """
+    Read survival tables written by save_survival_tables.
+    Args:
+        input_file: Path ending in .json or .parquet.
 
-        if show_plot:
-            plt.show()
-        else:
-            output_dir = Path("results/survival")
-            output_dir.mkdir(parents=True, exist_ok=True)
-            plt.savefig(output_dir / "kaplan_meier_plot.png")
-            plt.close()
-            logging.info(
-                f"Kaplan-Meier plot saved to "
-                f"{output_dir / 'kaplan_meier_plot.png'}")
+    Returns:
+        Long-format survival tables.
+    """
+    input_file = Path(input_file)
+    if input_file.suffix == ".parquet":
+        return pd.read_parquet(input_file)
+    if input_file.suffix == ".json":
+        with open(input_file) as f:
+            return pd.DataFrame(json.load(f))
+    raise ValueError(f"Unsupported survival table format: {input_file}")
+
+
+def render_kaplan_meier_plot(
+        survival_tables: pd.DataFrame,
+        output_file: Path = Path("results/survival/kaplan_meier_plot.png"),
+        show_plot: bool = False,
+        legend_title: str = "Risk Group",
+        title: str = "Kaplan-Meier Survival Curves Stratified by Predicted Risk"
+) -> None:
+    """
+    Plot survival tables. matplotlib is only imported here, and saving
+    uses a standalone Figure so no interactive backend is needed.
+    Args:
+        survival_tables: Long-format survival tables.
+        output_file: Where to save the plot if it is not shown.
+        show_plot: If True, display the plot.
+        legend_title: Title of the legend.
+        title: Title of the plot.
+
+    Returns:
+        None
+    """
+    if show_plot:
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=(10, 6))
+    else:
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+
+    # Bootstrap bands replace the Greenwood confidence intervals if present
+    lower, upper = "ci_lower", "ci_upper"
+    if "band_lower" in survival_tables.columns:
+        lower, upper = "band_lower", "band_upper"
+
+    # Plot Kaplan-Meier curves for each risk group
+    for group, table in survival_tables.groupby("group", sort=False):
+        line, = ax.step(
+            table["timeline"], table["survival"], where="post", label=group
+        )
+        ax.fill_between(
+            table["timeline"],
+            table[lower],
+            table[upper],
+            step="post",
+            alpha=0.3,
+            color=line.get_color(),
+        )
+
+    ax.set_xlabel("Days")
+    ax.set_ylabel("Survival Probability")
+    ax.set_title(title)
+    ax.legend(title=legend_title)
+    ax.grid(True)
+
+    if show_plot:
+        plt.show()
+    else:
+        output_file = Path(output_file)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        with metrics.stage("plot"):
+            fig.savefig(output_file)
+        logging.info(f"Kaplan-Meier plot saved to {output_file}")
+
+
+def render_stratified_kaplan_meier_plots(
+        survival_tables: pd.DataFrame,
+        stratifications: Optional[list[Stratification]] = None,
+        output_file: Path = Path("results/survival/kaplan_meier_plot.png")
+) -> None:
+    """
+    Render one plot per stratification of calculate_stratified_survival_tables.
+    A single stratification is saved as output_file, several ones get their
+    name appended to its stem.
+    Args:
+        survival_tables: Long-format survival tables of all stratifications.
+        stratifications: Stratifications to render, default all in the
+            stratification column of the tables.
+        output_file: Path of the plot.
+
+    Returns:
+        None
+    """
+    if stratifications is None:
+        stratifications = [
+            Stratification.from_name(name)
+            for name in survival_tables["stratification"].unique()
+        ]
+    output_file = Path(output_file)
+    for stratification in stratifications:
+        subset = survival_tables[
+            survival_tables["stratification"] == stratification.name
+        ]
+        plot_file = output_file
+        if len(stratifications) > 1:
+            plot_file = output_file.with_name(
+                f"{output_file.stem}_{stratification.name}{output_file.suffix}"
+            )
+        if stratification == Stratification(quantiles=3):
+            render_kaplan_meier_plot(subset, plot_file)
+            continue
+        legend_title = stratification.name.replace("_x_", " x ")
+        render_kaplan_meier_plot(
+            subset,
+            plot_file,
+            legend_title=legend_title,
+            title=f"Kaplan-Meier Survival Curves Stratified by {legend_title}"
+        )
 
 
 @lru_cache(typed=True)
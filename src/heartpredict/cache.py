@@ -0,0 +1,191 @@
+"""Bounded prediction cache for repeatedly scored patient records"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+
+def file_identity(path: Path) -> str:
+    """
+    Identify a version of a file on disk.
+    Args:
+        path: Path to the file.
+
+    Returns:
+        Identity made of the resolved path, modification time and size.
+    """
+    stat = os.stat(path)
+    return f"{Path(path).resolve()}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _identity_path(identity: str) -> str:
+    return identity.rsplit(":", 2)[0]
+
+
+def normalise_rows(x: np.ndarray, n_features: int) -> np.ndarray:
+    """
+    Validate and normalise raw feature rows before hashing.
+    Args:
+        x: Raw feature rows.
+        n_features: Number of features the scaler and model expect.
+
+    Returns:
+        Contiguous float64 rows with negative zeros folded into zeros.
+    """
+    rows = np.ascontiguousarray(x, dtype=np.float64)
+    if rows.ndim != 2 or rows.shape[1] != n_features:
+        raise ValueError(
+            f"Expected feature rows with {n_features} columns, got {rows.shape}"
+        )
+    if not np.isfinite(rows).all():
+        raise ValueError("Feature rows must not contain NaN or infinite values")
+    return rows + 0.0
+
+
+@dataclass
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+
+class PredictionCache:
+    def __init__(
+            self,
+            max_size: int = 10_000,
+            ttl: Optional[float] = None,
+            clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """
+        LRU cache of predictions keyed by feature row, model and scaler.
+        Args:
+            max_size: Maximum number of cached predictions.
+            ttl: Seconds after which an entry expires, None to keep entries.
+            clock: Monotonic clock used for expiry.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._models: dict[str, str] = {}
+        self._entries: OrderedDict[
+            str, tuple[float, Optional[str], Any]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bind_model(self, model_identity: str) -> None:
+        """
+        Register a loaded model.
+        Entries of older versions of the same model file are dropped, entries
+        of other models stay cached, since keys contain the model identity.
+        Args:
+            model_identity: Identity of the loaded model file.
+
+        Returns:
+            None
+        """
+        path = _identity_path(model_identity)
+        with self._lock:
+            previous = self._models.get(path)
+            self._models[path] = model_identity
+            if previous is None or previous == model_identity:
+                return
+            stale = [key for key, (_, identity, _) in self._entries.items()
+                     if identity == previous]
+            for key in stale:
+                del self._entries[key]
+            self.evictions += len(stale)
+
+    @staticmethod
+    def make_key(row: np.ndarray, model_identity: str, scaler_identity: str) -> str:
+        """
+        Hash a normalised feature row together with model and scaler identity.
+        Args:
+            row: Normalised feature row.
+            model_identity: Identity of the model file.
+            scaler_identity: Identity of the scaler file.
+
+        Returns:
+            Hex digest used as cache key.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(model_identity.encode())
+        digest.update(b"\0")
+        digest.update(scaler_identity.encode())
+        digest.update(b"\0")
+        digest.update(row.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a cached prediction and mark it as recently used.
+        Args:
+            key: Cache key.
+
+        Returns:
+            Cached prediction or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(
+            self, key: str, value: Any, model_identity: Optional[str] = None
+    ) -> None:
+        """
+        Store a prediction, evicting the least recently used entry if full.
+        Args:
+            key: Cache key.
+            value: Prediction to store.
+            model_identity: Identity of the model that made the prediction,
+                so the entry is dropped once a newer version is bound.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries[key] = (self.clock(), model_identity, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._models.clear()
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                self.hits, self.misses, self.evictions, len(self._entries)
+            )
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and self.clock() - stored_at > self.ttl
+
+
+# Shared by the predict commands of a process, so the daemon and the REPL
+# serve rows scored by an earlier command from memory
+prediction_cache = PredictionCache()
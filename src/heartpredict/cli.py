@@ -1,17 +1,56 @@
 import importlib.metadata
+import json
 import logging
 from dataclasses import dataclass, field
 from logging import Logger, getLogger
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 import typer
-from heartpredict.backend.correlation import CorrelationBackend, CorrelationMethod
-from heartpredict.backend.descriptive import DescriptiveBackend
-from heartpredict.backend.ml import MLBackend, PretrainedModel
-from heartpredict.backend.survival import SurvivalBackend
+from heartpredict.artifacts import artifact_writer
+from heartpredict.backend.correlation import (
+    CorrelationBackend,
+    CorrelationMethod,
+    StreamingCorrelationBackend,
+    combine_accumulators,
+)
+from heartpredict.backend.descriptive import (
+    DescriptiveBackend,
+    StreamingDescriptiveBackend,
+    render_distribution_plots,
+)
+from heartpredict.backend.experiments import run_seed_experiment
+from heartpredict.backend.importance import (
+    infer_model_type,
+    permutation_importance,
+)
+from heartpredict.backend.ml import MLBackend, PretrainedEnsemble, PretrainedModel
+from heartpredict.backend.streaming import load_accumulator, save_accumulator
+from heartpredict.backend.survival import (
+    Stratification,
+    SurvivalBackend,
+    load_survival_tables,
+    render_kaplan_meier_plot,
+    render_stratified_kaplan_meier_plots,
+    save_survival_tables,
+)
+from heartpredict.cache import prediction_cache
+from heartpredict.daemon import run_repl, serve
 from heartpredict.data import FeatureData, MLData, ProjectData
-from heartpredict.enums import BoolColumn, Column, DiscreteColumn, LogLevel
+from heartpredict.enums import (
+    BoolColumn,
+    Column,
+    DataFrameEngine,
+    DiscreteColumn,
+    ImageFormat,
+    LogLevel,
+    ModelType,
+    ProfileMode,
+    ReportFormat,
+)
+from heartpredict.metrics import Instrumentation, metrics
+from heartpredict.pipeline import ArtifactCache, load_pipeline, run_pipeline
+from heartpredict.profiling import Profiler, compare_profiles
 from rich import print
 from typing_extensions import Annotated
 
@@ -19,6 +58,7 @@ from typing_extensions import Annotated
 @dataclass
 class State:
     csv: str = "data/heart_failure_clinical_records.csv"
+    engine: DataFrameEngine = DataFrameEngine.PANDAS
     # use root logger so we can simply use the modified one in other modules
     logger: Logger = field(default_factory=lambda: getLogger())
 
@@ -29,10 +69,47 @@ state = State()
 
 @app.callback()
 def set_path(
+        ctx: typer.Context,
         csv: str = "data/heart_failure_clinical_records.csv",
-        loglevel: LogLevel = LogLevel.INFO
+        loglevel: LogLevel = LogLevel.INFO,
+        metrics_file: Annotated[
+            Optional[str],
+            typer.Option(help="Write per-stage timings in Prometheus text format.")
+        ] = None,
+        profile: Annotated[
+            Optional[ProfileMode],
+            typer.Option(help="Profile the command and write a report "
+                              "to results/profiles.")
+        ] = None,
+        compress_artifacts: Annotated[
+            bool,
+            typer.Option(help="Compress saved models and scalers.")
+        ] = False,
+        engine: Annotated[
+            DataFrameEngine,
+            typer.Option(help="Dataframe engine that loads the CSV and computes "
+                              "correlations (cc, cm, ccall), statistics (bstat, "
+                              "dstat, profile), plot distributions and the "
+                              "feature matrix for training and prediction. "
+                              "cmsig, query, cube and kmplot use a pandas copy.")
+        ] = DataFrameEngine.PANDAS,
 ) -> None:
     state.csv = csv
+    state.engine = engine
+    artifact_writer.compress = compress_artifacts
+    # Models and scalers are saved in the background, the command only
+    # ends once they are on disk
+    ctx.call_on_close(artifact_writer.wait)
+    # A long-running process serves many commands, the summary only
+    # covers the stages of this one
+    command_metrics = ctx.with_resource(metrics.collect())
+    ctx.call_on_close(lambda: export_metrics(metrics_file, command_metrics))
+    if profile is not None:
+        profiler = Profiler(profile, ctx.invoked_subcommand or "hp")
+        # Close callbacks run last in first out, so the profiler stops
+        # before the metrics are exported
+        ctx.call_on_close(profiler.stop)
+        profiler.start()
 
     if loglevel == LogLevel.DEBUG:
         state.logger.setLevel(logging.DEBUG)
@@ -46,6 +123,17 @@ def set_path(
         state.logger.setLevel(logging.CRITICAL)
 
 
+def export_metrics(
+        metrics_file: Optional[str], command_metrics: Instrumentation
+) -> None:
+    summary = command_metrics.summary()
+    if summary:
+        logging.info(f"Stage timings: {summary}")
+    logging.debug(metrics.to_json())
+    if metrics_file is not None:
+        metrics.write_prometheus(Path(metrics_file))
+
+
 @app.command()
 def version() -> None:
     print(importlib.metadata.version("heartpredict"))
@@ -60,7 +148,7 @@ def test() -> None:
 def train_model_for_classification(
         seed: Annotated[int, typer.Option(help="Random seed for reproducibility.")] = 42
 ) -> None:
-    project_data = ProjectData.build(Path(state.csv))
+    project_data = ProjectData.build(Path(state.csv), state.engine)
     data = MLData.build(project_data, 0.2, seed)
     backend = MLBackend(data)
     backend.classification_for_different_classifiers()
@@ -70,12 +158,72 @@ def train_model_for_classification(
 def train_model_for_regression(
         seed: Annotated[int, typer.Option(help="Random seed for reproducibility.")] = 42
 ) -> None:
-    project_data = ProjectData.build(Path(state.csv))
+    project_data = ProjectData.build(Path(state.csv), state.engine)
     data = MLData.build(project_data, 0.2, seed)
     backend = MLBackend(data)
     backend.regression_for_different_regressors()
 
 
+@app.command(name="experiments")
+def run_seed_experiments(
+        first_seed: Annotated[int, typer.Option(help="First random seed.")] = 0,
+        n_seeds: Annotated[int, typer.Option(help="Number of seeds.")] = 20,
+        model_type: Annotated[ModelType, typer.Option(
+            help="Select among the classifiers or the regressors."
+        )] = ModelType.CLASSIFIER,
+        test_size: Annotated[float, typer.Option(
+            help="Share of the validation split."
+        )] = 0.2,
+        jobs: Annotated[Optional[int], typer.Option(
+            help="Worker processes, default all cores."
+        )] = None,
+        output: Annotated[Optional[str], typer.Option(
+            help="Write the score of every model and seed to this CSV."
+        )] = None,
+) -> None:
+    project_data = ProjectData.build(Path(state.csv), state.engine)
+    seeds = list(range(first_seed, first_seed + n_seeds))
+    result = run_seed_experiment(project_data, seeds, model_type, test_size, jobs)
+    print(f"{result.score_name} over {n_seeds} seeds")
+    print(result.summary().to_string())
+    if output is not None:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        result.scores.assign(selected=result.selected).to_csv(output)
+
+
+@app.command(name="importance")
+def feature_importance(
+        model: Annotated[
+            str, typer.Option(help="Path to a trained model.")
+        ],
+        model_type: Annotated[Optional[ModelType], typer.Option(
+            help="Score by accuracy (classifier) or RMSE (regressor), "
+                 "default inferred from the model."
+        )] = None,
+        seed: Annotated[int, typer.Option(
+            help="Seed of the validation split the model was trained with."
+        )] = 42,
+        repeats: Annotated[int, typer.Option(
+            help="Permutations per feature."
+        )] = 10,
+        jobs: Annotated[Optional[int], typer.Option(
+            help="Worker processes, default all cores."
+        )] = None,
+) -> None:
+    project_data = ProjectData.build(Path(state.csv), state.engine)
+    data = MLData.build(project_data, 0.2, seed, False)
+    pretrained_model = PretrainedModel()
+    pretrained_model.load_model(Path(model))
+    if model_type is None:
+        model_type = infer_model_type(Path(model), pretrained_model.model)
+    importance = permutation_importance(
+        pretrained_model.model, data.valid.x, data.valid.y,
+        model_type, repeats, seed, jobs,
+    )
+    print(f"Baseline {importance.score_name}: {importance.baseline_score:.4f}")
+    print(importance.to_frame().to_string())
+
+
 @app.command(name="predict_death_event")
 def predict_death_event(
         model: Annotated[
@@ -84,16 +232,47 @@ def predict_death_event(
         scaler: Annotated[
             str, typer.Option(help="Path to scaler model.")
         ] = "results/scalers/used_scaler.joblib",
+        cache: Annotated[
+            bool, typer.Option(help="Serve rows scored before by this process, "
+                                    "e.g. the daemon, from the prediction cache.")
+        ] = True,
 ) -> None:
-    project_data = ProjectData.build(Path(state.csv))
+    project_data = ProjectData.build(Path(state.csv), state.engine)
     if "DEATH_EVENT" in project_data.df.columns:
         raise ValueError("DEATH_EVENT column should not be present in the dataset")
     feature_data = FeatureData.build(project_data, Path(scaler))
-    pretrained_model = PretrainedModel()
+    pretrained_model = PretrainedModel(prediction_cache if cache else None)
     pretrained_model.load_model(Path(model))
     pretrained_model.predict_death_event(feature_data)
 
 
+@app.command(name="predict_ensemble")
+def predict_death_event_with_ensemble(
+        model: Annotated[
+            Optional[List[str]],
+            typer.Option(help="Path to a pretrained classifier model. "
+                              "Can be given multiple times.")
+        ] = None,
+        model_dir: Annotated[
+            str, typer.Option(help="Directory of pretrained classifiers, "
+                                   "used when no model is given.")
+        ] = "results/trained_models/classifier",
+        scaler: Annotated[
+            str, typer.Option(help="Path to scaler model.")
+        ] = "results/scalers/used_scaler.joblib",
+) -> None:
+    project_data = ProjectData.build(Path(state.csv), state.engine)
+    if "DEATH_EVENT" in project_data.df.columns:
+        raise ValueError("DEATH_EVENT column should not be present in the dataset")
+    feature_data = FeatureData.build(project_data, Path(scaler))
+    model_files = (
+        [Path(m) for m in model] if model
+        else sorted(Path(model_dir).glob("*.joblib"))
+    )
+    ensemble = PretrainedEnsemble()
+    ensemble.load_models(model_files)
+    print(ensemble.predict_death_event(feature_data).to_frame())
+
 
 @app.command(name="kmplot")
 def create_kaplan_meier_plot(
@@ -103,40 +282,234 @@ def create_kaplan_meier_plot(
         regressor: Annotated[
             Optional[str], typer.Option(help="Path to regressor model.")
         ] = None,
+        quantiles: Annotated[
+            Optional[List[int]],
+            typer.Option(help="Number of predicted risk quantiles. Can be given "
+                              "multiple times, default 3 without --stratify-by.")
+        ] = None,
+        stratify_by: Annotated[
+            Optional[List[BoolColumn]],
+            typer.Option(help="Boolean covariate to stratify by. "
+                              "Can be given multiple times to cross covariates.")
+        ] = None,
+        cross: Annotated[
+            bool, typer.Option(help="Cross the risk quantiles with the "
+                                    "--stratify-by covariates instead of "
+                                    "stratifying by each separately.")
+        ] = False,
+        time_column: Annotated[
+            str, typer.Option(help="Column with the follow-up time.")
+        ] = Column.TIME.value,
+        event_column: Annotated[
+            str, typer.Option(help="Column with the observed event.")
+        ] = Column.DEATH_EVENT.value,
+        bootstrap: Annotated[
+            int, typer.Option(help="Number of bootstrap resamples for "
+                                   "confidence bands, 0 to disable.")
+        ] = 0,
+        jobs: Annotated[
+            Optional[int], typer.Option(help="Worker processes, default all cores.")
+        ] = None,
+        logrank: Annotated[
+            bool, typer.Option(help="Print log-rank tests between strata.")
+        ] = False,
+        plot: Annotated[
+            bool, typer.Option(help="Render the plot. Without it only the "
+                                    "survival tables are written.")
+        ] = True,
+        tables: Annotated[
+            Optional[str], typer.Option(help="Write survival tables to this "
+                                             ".json or .parquet file.")
+        ] = None,
 ) -> None:
-    project_data = ProjectData.build(Path(state.csv))
+    project_data = ProjectData.build(Path(state.csv), state.engine)
     ml_data = MLData.build(project_data, 0.2, seed)
-    survival_backend = SurvivalBackend(ml_data)
-    if regressor is None:
-        ml_backend = MLBackend(ml_data)
-        regressor = str(ml_backend.regression_for_different_regressors().model_file)
-    survival_backend.create_kaplan_meier_plot_for(Path(regressor))
+    survival_backend = SurvivalBackend(ml_data, time_column, event_column)
+
+    if quantiles is None:
+        quantiles = [] if stratify_by and not cross else [3]
+    covariates = tuple(stratify_by or ())
+    if cross:
+        stratifications = [Stratification(q, covariates) for q in quantiles]
+    else:
+        stratifications = [Stratification(quantiles=q) for q in quantiles]
+        if covariates:
+            stratifications.append(Stratification(covariates=covariates))
+
+    if quantiles and regressor is None:
+        regressor = str(MLBackend(ml_data).find_or_train_regressor())
+    survival_tables = survival_backend.calculate_stratified_survival_tables(
+        stratifications,
+        Path(regressor) if regressor else None,
+        bootstrap_resamples=bootstrap,
+        n_jobs=jobs,
+        seed=seed
+    )
+    if tables is None and not plot:
+        tables = "results/survival/kaplan_meier_tables.json"
+    if tables is not None:
+        save_survival_tables(survival_tables, Path(tables))
+
+    if plot:
+        render_stratified_kaplan_meier_plots(survival_tables, stratifications)
+    if logrank:
+        for stratification in stratifications:
+            for result in survival_backend.compare_risk_groups(stratification):
+                print(result)
+
+
+@app.command(name="kmrender")
+def render_kaplan_meier_plot_from_tables(
+        tables: Annotated[
+            str, typer.Option(help="Survival tables written by kmplot.")
+        ] = "results/survival/kaplan_meier_tables.json",
+        output: Annotated[
+            str, typer.Option(help="Path of the rendered plot.")
+        ] = "results/survival/kaplan_meier_plot.png",
+) -> None:
+    survival_tables = load_survival_tables(Path(tables))
+    if "stratification" in survival_tables.columns:
+        render_stratified_kaplan_meier_plots(survival_tables, None, Path(output))
+    else:
+        render_kaplan_meier_plot(survival_tables, Path(output))
 
 
 @app.command(name="cc")
 def single_correlation(
         column: Annotated[Column, typer.Option()],
-        method: Annotated[CorrelationMethod, typer.Option()] = CorrelationMethod.PEARSON
+        method: Annotated[
+            CorrelationMethod, typer.Option()
+        ] = CorrelationMethod.PEARSON,
+        chunksize: Annotated[
+            Optional[int], typer.Option(help="Stream the CSV in chunks of this size.")
+        ] = None
 ) -> None:
-    data = ProjectData.build(Path(state.csv))
+    if chunksize is not None:
+        streaming = StreamingCorrelationBackend(Path(state.csv), chunksize)
+        print(streaming.get_column_correlation_to_death_event(column, method))
+        return
+    data = ProjectData.build(Path(state.csv), state.engine)
     backend = CorrelationBackend.build(data)
     print(backend.get_column_correlation_to_death_event(column, method))
 
 
 @app.command(name="cm")
 def multiple_correlation(
-        method: Annotated[CorrelationMethod, typer.Option()] = CorrelationMethod.PEARSON
+        method: Annotated[
+            CorrelationMethod, typer.Option()
+        ] = CorrelationMethod.PEARSON,
+        jobs: Annotated[
+            Optional[int], typer.Option(help="Worker processes, default all cores.")
+        ] = None,
+        chunksize: Annotated[
+            Optional[int], typer.Option(help="Stream the CSV in chunks of this size.")
+        ] = None,
+        save_state: Annotated[
+            Optional[str], typer.Option(help="Write the partial aggregate of a "
+                                             "streamed run to this JSON file.")
+        ] = None,
+        sketches: Annotated[
+            Optional[str], typer.Option(help="Streamed Spearman: rank with the "
+                                             "sketches of this state, e.g. merged "
+                                             "over all shards by cm_merge.")
+        ] = None,
+        rank: Annotated[
+            bool, typer.Option(help="Streamed Spearman: --no-rank only sketches "
+                                    "the shard, to be merged before ranking.")
+        ] = True
 ) -> None:
-    data = ProjectData.build(Path(state.csv))
+    if chunksize is not None:
+        streaming = StreamingCorrelationBackend(Path(state.csv), chunksize)
+        sketch_state = load_accumulator(Path(sketches)) if sketches else None
+        accumulator = streaming.accumulate(
+            method, getattr(sketch_state, "sketches", None), rank
+        )
+        if save_state is not None:
+            save_accumulator(accumulator, Path(save_state))
+        if rank:
+            print(accumulator.correlation().round(2))
+        return
+    data = ProjectData.build(Path(state.csv), state.engine)
     backend = CorrelationBackend.build(data)
-    print(backend.get_correlation_matrix(method))
+    print(backend.get_correlation_matrix(method, jobs))
+
+
+@app.command(name="cm_merge")
+def merge_correlation_states(
+        state_file: Annotated[
+            List[str], typer.Option(help="Partial aggregate written by "
+                                         "cm --save-state. Give it multiple times.")
+        ],
+        output: Annotated[
+            Optional[str], typer.Option(help="Write the merged aggregate to "
+                                             "this JSON file.")
+        ] = None
+) -> None:
+    accumulators = [load_accumulator(Path(f)) for f in state_file]
+    combined = combine_accumulators(accumulators)
+    if output is not None:
+        save_accumulator(combined, Path(output))
+    if getattr(combined, "ranked", True):
+        print(combined.correlation().round(2))
+
+
+@app.command(name="ccall")
+def all_correlations(
+        method: Annotated[
+            CorrelationMethod, typer.Option()
+        ] = CorrelationMethod.PEARSON,
+        target: Annotated[Column, typer.Option()] = Column.DEATH_EVENT
+) -> None:
+    data = ProjectData.build(Path(state.csv), state.engine)
+    backend = CorrelationBackend.build(data)
+    print(backend.get_correlations_to(method, target))
+
+
+@app.command(name="cmsig")
+def correlation_significance(
+        method: Annotated[
+            CorrelationMethod, typer.Option()
+        ] = CorrelationMethod.PEARSON,
+        permutations: Annotated[int, typer.Option(
+            help="Number of permutations for the p-values, 0 to skip."
+        )] = 1000,
+        bootstrap: Annotated[int, typer.Option(
+            help="Number of bootstrap resamples for the confidence intervals, "
+                 "0 to skip."
+        )] = 1000,
+        jobs: Annotated[Optional[int], typer.Option(
+            help="Worker processes, default all cores."
+        )] = None,
+        seed: Annotated[int, typer.Option()] = 42
+) -> None:
+    data = ProjectData.build(Path(state.csv), state.engine)
+    backend = CorrelationBackend.build(data)
+    result = backend.get_correlation_significance(
+        method, permutations, bootstrap, jobs, seed
+    )
+    print("Correlation:", result.correlation.round(2))
+    print("Permutation p-values:", result.p_values.round(4))
+    print("Lower bound of the confidence interval:", result.ci_lower.round(2))
+    print("Upper bound of the confidence interval:", result.ci_upper.round(2))
 
 
 @app.command(name="bstat")
 def boolean_statistic(
-        bool_col: Annotated[BoolColumn, typer.Option()]
+        bool_col: Annotated[BoolColumn, typer.Option()],
+        chunksize: Annotated[
+            Optional[int], typer.Option(help="Stream the CSV in chunks of this size.")
+        ] = None,
+        error_bound: Annotated[float, typer.Option(
+            help="Relative error of streamed counts."
+        )] = 0.01
 ) -> None:
-    data = ProjectData.build(state.csv)
+    if chunksize is not None:
+        streaming = StreamingDescriptiveBackend(
+            Path(state.csv), chunksize, error_bound
+        )
+        print(streaming.calculate_boolean_statistics(bool_col))
+        return
+    data = ProjectData.build(Path(state.csv), state.engine)
     descriptive = DescriptiveBackend(data)
     stats = descriptive.calculate_boolean_statistics(bool_col)
     print(stats)
@@ -144,9 +517,157 @@ def boolean_statistic(
 
 @app.command(name="dstat")
 def discrete_statistic(
-        disc_col: Annotated[DiscreteColumn, typer.Option()]
+        disc_col: Annotated[DiscreteColumn, typer.Option()],
+        chunksize: Annotated[
+            Optional[int], typer.Option(help="Stream the CSV in chunks of this size.")
+        ] = None,
+        error_bound: Annotated[float, typer.Option(
+            help="Normalised rank error of the streamed median."
+        )] = 0.01
 ) -> None:
-    data = ProjectData.build(state.csv)
+    if chunksize is not None:
+        streaming = StreamingDescriptiveBackend(
+            Path(state.csv), chunksize, error_bound
+        )
+        print(streaming.calculate_discrete_statistics(disc_col))
+        return
+    data = ProjectData.build(Path(state.csv), state.engine)
     descriptive = DescriptiveBackend(data)
     stats = descriptive.calculate_discrete_statistics(disc_col)
     print(stats)
+
+
+@app.command(name="profile")
+def profile_dataset(
+        output_format: Annotated[ReportFormat, typer.Option(
+            "--format", help="Print the report as JSON or as tables."
+        )] = ReportFormat.TABLE
+) -> None:
+    data = ProjectData.build(Path(state.csv), state.engine)
+    descriptive = DescriptiveBackend(data)
+    profile = descriptive.profile()
+    if output_format == ReportFormat.JSON:
+        print(json.dumps(profile.to_dict(), indent=2))
+        return
+    discrete, boolean = profile.to_frames()
+    print(discrete.to_string())
+    print(boolean.to_string())
+
+
+@app.command(name="query")
+def query_dataset(
+        where: Annotated[str, typer.Option(
+            help="Predicates joined with 'and' / 'or', e.g. "
+                 "'age > 60 and smoking == 1'."
+        )],
+        output: Annotated[Optional[str], typer.Option(
+            help="Write the matching rows to this CSV file."
+        )] = None,
+        head: Annotated[int, typer.Option(
+            help="Number of matching rows to print."
+        )] = 10
+) -> None:
+    data = ProjectData.build(Path(state.csv), state.engine)
+    descriptive = DescriptiveBackend(data)
+    result = descriptive.query(where)
+    print(f"{len(result)} of {len(data.df)} rows match")
+    if output is not None:
+        result.materialize().to_csv(output, index=False)
+    elif head > 0:
+        print(data.df.iloc[result.indices()[:head]].to_string())
+
+
+@app.command(name="cube")
+def subgroup_statistics(
+        flag: Annotated[List[BoolColumn], typer.Option(
+            help="Boolean column defining the subgroups, can be repeated."
+        )],
+        column: Annotated[Optional[List[DiscreteColumn]], typer.Option(
+            help="Discrete column to aggregate, can be repeated. Default all."
+        )] = None,
+        output: Annotated[Optional[str], typer.Option(
+            help="Write the cube to this CSV file."
+        )] = None
+) -> None:
+    data = ProjectData.build(Path(state.csv), state.engine)
+    descriptive = DescriptiveBackend(data)
+    cube = descriptive.subgroup_cube(flag, column or None)
+    if output is not None:
+        cube.frame.to_csv(output, index=False)
+        return
+    print(cube.frame.to_string(index=False))
+
+
+@app.command(name="plots")
+def distribution_plots(
+        column: Annotated[Optional[List[Column]], typer.Option(
+            help="Column to plot, can be repeated. Default all."
+        )] = None,
+        by: Annotated[Optional[List[BoolColumn]], typer.Option(
+            help="Plot every subgroup of these boolean columns, can be repeated."
+        )] = None,
+        output_dir: Annotated[str, typer.Option()] = "results/plots",
+        image_format: Annotated[
+            ImageFormat, typer.Option("--format")
+        ] = ImageFormat.PNG,
+        jobs: Annotated[Optional[int], typer.Option(
+            help="Worker processes, default all cores."
+        )] = None
+) -> None:
+    data = ProjectData.build(Path(state.csv), state.engine)
+    descriptive = DescriptiveBackend(data)
+    plot_jobs = descriptive.distribution_plot_jobs(
+        column or None, by or None, Path(output_dir), image_format
+    )
+    written = render_distribution_plots(plot_jobs, jobs)
+    print(f"Wrote {len(written)} plots to {output_dir}")
+
+
+@app.command(name="profdiff")
+def compare_profile_reports(
+        old: Annotated[str, typer.Option(help="Earlier profile report.")],
+        new: Annotated[str, typer.Option(help="Later profile report.")],
+) -> None:
+    print(compare_profiles(Path(old), Path(new)))
+
+
+@app.command(name="daemon")
+def start_daemon(
+        socket: Annotated[Optional[str], typer.Option(
+            help="Unix socket to listen on, default $HEARTPREDICT_SOCKET or "
+                 "/tmp/heartpredict-<uid>.sock."
+        )] = None
+) -> None:
+    serve(app, Path(socket) if socket else None)
+
+
+@app.command(name="repl")
+def start_repl() -> None:
+    run_repl(app)
+
+
+@app.command(name="pipeline")
+def run_pipeline_spec(
+        spec: Annotated[str, typer.Option(
+            help="TOML or YAML file describing the pipeline steps."
+        )],
+        jobs: Annotated[Optional[int], typer.Option(
+            help="Steps run concurrently, default all cores."
+        )] = None,
+        force: Annotated[bool, typer.Option(
+            help="Run every step, even if its inputs are unchanged."
+        )] = False,
+        cache_dir: Annotated[str, typer.Option(
+            help="Directory of the artifact cache."
+        )] = "results/pipeline"
+) -> None:
+    pipeline = load_pipeline(Path(spec))
+    report = run_pipeline(pipeline, ArtifactCache(Path(cache_dir)), jobs, force)
+    for step in report.steps:
+        print(f"{step.name}: {step.status} in {step.seconds:.2f}s")
+        if step.stdout:
+            print(step.stdout.rstrip())
+        if step.status == "failed":
+            print(step.stderr.rstrip())
+    if not report.succeeded:
+        raise typer.Exit(code=1)
@@ -0,0 +1,64 @@
+"""Thin client that forwards CLI commands to a running heartpredict daemon.
+
+Only the standard library is imported here, so forwarding a command does
+not pay for importing the scientific stack.
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+
+def default_socket_path() -> Path:
+    """
+    Socket of the daemon, HEARTPREDICT_SOCKET or one per user in /tmp.
+    Returns:
+        Path of the Unix socket.
+    """
+    configured = os.environ.get("HEARTPREDICT_SOCKET")
+    if configured:
+        return Path(configured)
+    return Path(tempfile.gettempdir()) / f"heartpredict-{os.getuid()}.sock"
+
+
+def send_command(
+        argv: list[str], socket_path: Optional[Path] = None
+) -> tuple[int, str, str]:
+    """
+    Run a CLI command in the daemon.
+    Args:
+        argv: Command line arguments, e.g. ["cc", "--column", "age"].
+        socket_path: Socket of the daemon, default default_socket_path().
+
+    Returns:
+        Tuple of (exit code, stdout, stderr) of the command.
+    """
+    request = json.dumps({"argv": argv, "cwd": os.getcwd()}) + "\n"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(str(socket_path or default_socket_path()))
+        connection.sendall(request.encode())
+        connection.shutdown(socket.SHUT_WR)
+        response = b"".join(iter(lambda: connection.recv(65536), b""))
+    result = json.loads(response)
+    return result["exit_code"], result["stdout"], result["stderr"]
+
+
+def main() -> None:
+    try:
+        exit_code, stdout, stderr = send_command(sys.argv[1:])
+    except (FileNotFoundError, ConnectionRefusedError):
+        sys.stderr.write(
+            f"No heartpredict daemon listening on {default_socket_path()}, "
+            "start one with 'hp daemon'\n"
+        )
+        sys.exit(2)
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
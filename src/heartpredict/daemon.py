@@ -0,0 +1,211 @@
+"""Long-running process that keeps data, scalers and models in memory"""
+import io
+import json
+import logging
+import os
+import shlex
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import typer
+from heartpredict.backend.correlation import CorrelationBackend
+from heartpredict.backend.ml import get_ml_backend
+from heartpredict.backend.survival import get_survival_backend
+from heartpredict.cache import file_identity
+from heartpredict.client import default_socket_path
+from heartpredict.data import FeatureData, MLData, ProjectData, loaded_files
+
+
+@dataclass
+class CommandResult:
+    exit_code: int
+    stdout: str
+    stderr: str
+
+
+def clear_build_caches() -> None:
+    """
+    Drop every cached ProjectData, FeatureData, MLData and backend.
+    Returns:
+        None
+    """
+    for cached in (
+            ProjectData.build, FeatureData.build, MLData._build,
+            CorrelationBackend.build, get_ml_backend, get_survival_backend,
+    ):
+        cached.cache_clear()
+    loaded_files.clear()
+
+
+def _input_identities() -> dict[str, str]:
+    identities = {}
+    for path in list(loaded_files):
+        try:
+            identities[str(path)] = file_identity(path)
+        except FileNotFoundError:
+            identities[str(path)] = "missing"
+    return identities
+
+
+class CommandRunner:
+    def __init__(self, app: typer.Typer) -> None:
+        """
+        Run CLI commands in this process, so the build caches of the data
+        classes and the loaded models are reused between commands.
+        Commands run one at a time since the working directory, the CLI
+        state and stdout/stderr are process-wide. When a file the cached
+        data was loaded from (CSV or scaler) changes on disk, or a command
+        comes from another working directory, all cached data is rebuilt.
+        Args:
+            app: Typer application to run.
+        """
+        self.app = app
+        self.lock = threading.Lock()
+        self.identities: dict[str, str] = {}
+        self.cwd: Optional[str] = None
+
+    def run(self, argv: list[str], cwd: Optional[str] = None) -> CommandResult:
+        """
+        Run one command and capture its output and log.
+        Args:
+            argv: Command line arguments, e.g. ["cc", "--column", "age"].
+            cwd: Working directory of the caller.
+
+        Returns:
+            CommandResult with exit code, stdout and stderr.
+        """
+        stdout, stderr = io.StringIO(), io.StringIO()
+        handler = logging.StreamHandler(stderr)
+        root = logging.getLogger()
+        with self.lock:
+            previous = os.getcwd()
+            root.addHandler(handler)
+            try:
+                os.chdir(cwd or previous)
+                self._invalidate_changed_inputs()
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    exit_code = self._invoke(argv)
+                # Remember the inputs the command loaded, after its writes
+                self.identities = _input_identities()
+            finally:
+                root.removeHandler(handler)
+                os.chdir(previous)
+        return CommandResult(exit_code, stdout.getvalue(), stderr.getvalue())
+
+    def _invoke(self, argv: list[str]) -> int:
+        # In standalone mode usage errors are reported like on the command
+        # line and every run ends in SystemExit with the exit code
+        try:
+            self.app(args=argv, prog_name="hp")
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            return 1
+        return 0
+
+    def _invalidate_changed_inputs(self) -> None:
+        # Cached builds are keyed by the paths given on the command line,
+        # which are relative to the working directory of the caller
+        cwd = os.getcwd()
+        if self.cwd is not None and cwd != self.cwd:
+            logging.debug("Working directory changed, rebuilding cached data")
+            clear_build_caches()
+        elif self.identities and _input_identities() != self.identities:
+            logging.debug("Input files changed, rebuilding cached data")
+            clear_build_caches()
+        self.cwd = cwd
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        request = json.loads(self.rfile.readline())
+        result = self.server.runner.run(  # type: ignore
+            request["argv"], request.get("cwd")
+        )
+        self.wfile.write(json.dumps(asdict(result)).encode())
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, runner: CommandRunner) -> None:
+        self.runner = runner
+        super().__init__(str(socket_path), _CommandHandler)
+
+    def server_bind(self) -> None:
+        # Create the socket accessible to its owner only, so there is no
+        # window in which another user could connect
+        previous = os.umask(0o077)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(previous)
+
+
+def serve(app: typer.Typer, socket_path: Optional[Path] = None) -> None:
+    """
+    Serve CLI commands on a Unix socket until interrupted.
+    Args:
+        app: Typer application to run.
+        socket_path: Socket to listen on, default default_socket_path().
+
+    Returns:
+        None
+    """
+    socket_path = Path(socket_path or default_socket_path())
+    if socket_path.exists():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            if probe.connect_ex(str(socket_path)) == 0:
+                raise RuntimeError(f"A daemon is already listening on {socket_path}")
+        socket_path.unlink()
+    with DaemonServer(socket_path, CommandRunner(app)) as server:
+        logging.info(f"heartpredict daemon listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("heartpredict daemon stopped")
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+def run_repl(
+        app: typer.Typer,
+        prompt: str = "hp> ",
+        read_line: Callable[[str], str] = input,
+) -> None:
+    """
+    Read commands interactively and run them in this process.
+    Args:
+        app: Typer application to run.
+        prompt: Prompt shown before each command.
+        read_line: Function reading one line, input by default.
+
+    Returns:
+        None
+    """
+    runner = CommandRunner(app)
+    while True:
+        try:
+            line = read_line(prompt)
+        except (EOFError, KeyboardInterrupt):
+            break
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            sys.stderr.write(f"{e}\n")
+            continue
+        if not argv:
+            continue
+        if argv[0] in ("exit", "quit"):
+            break
+        result = runner.run(argv)
+        sys.stdout.write(result.stdout)
+        sys.stderr.write(result.stderr)
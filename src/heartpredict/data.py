@@ -1,14 +1,24 @@
+import hashlib
 from dataclasses import dataclass
-from functools import lru_cache
+from functools import cached_property, lru_cache
 from pathlib import Path
 
-import joblib
 import numpy as np
 import pandas as pd
+from heartpredict.artifacts import artifact_writer, load_artifact
+from heartpredict.engine import get_engine
+from heartpredict.enums import Column, DataFrameEngine
+from heartpredict.metrics import metrics
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from typing_extensions import Self
 
+# Input files the data classes were built from, so a long-lived process
+# can tell when its cached builds are stale, see heartpredict.daemon
+loaded_files: set[Path] = set()
+# Scaler saved by MLData and loaded by the predict commands
+SCALER_FILE = Path("results/scalers/used_scaler.joblib")
+
 
 @dataclass
 class NumpyMatrix:
@@ -17,13 +27,50 @@ class NumpyMatrix:
 
 
 class ProjectData:
-    def __init__(self, csv: Path) -> None:
-        self.df = pd.read_csv(csv)
+    def __init__(
+            self, csv: Path, engine: DataFrameEngine = DataFrameEngine.PANDAS
+    ) -> None:
+        """
+        Args:
+            csv: Path to the CSV file.
+            engine: Dataframe engine that loads and queries the data,
+                see heartpredict.engine.
+        """
+        self.engine = get_engine(engine)
+        if isinstance(csv, (str, Path)):
+            loaded_files.add(Path(csv).absolute())
+        with metrics.stage("load_csv") as record:
+            # Native frame of the engine, a pandas DataFrame by default
+            self.frame = self.engine.read_csv(csv)
+            record.rows = self.engine.num_rows(self.frame)
 
     @classmethod
     @lru_cache
-    def build(cls, csv: Path) -> Self:
-        return cls(csv)
+    def build(
+            cls, csv: Path, engine: DataFrameEngine = DataFrameEngine.PANDAS
+    ) -> Self:
+        return cls(csv, engine)
+
+    @cached_property
+    def df(self) -> pd.DataFrame:
+        """
+        The data as a pandas DataFrame, converted once for other engines.
+        Returns:
+            DataFrame with one row per patient.
+        """
+        return self.engine.to_pandas(self.frame)
+
+    @cached_property
+    def dataset_hash(self) -> str:
+        """
+        Content hash of the dataset, independent of the file's location.
+        Returns:
+            Hex digest over column names and row values.
+        """
+        digest = hashlib.sha256()
+        digest.update(",".join(map(str, self.df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(self.df, index=False).values.tobytes())
+        return digest.hexdigest()
 
 
 class FeatureData:
@@ -32,9 +79,10 @@ class FeatureData:
             scaler: Path
     ) -> None:
         self.project_data = project_data
-        self.scaler = joblib.load(scaler)
-
-        self.feature_matrix = self._get_feature_matrix()
+        self.scaler_file = Path(scaler)
+        loaded_files.add(self.scaler_file.absolute())
+        with metrics.stage("load_scaler"):
+            self.scaler = load_artifact(self.scaler_file)
 
     @classmethod
     @lru_cache
@@ -43,33 +91,91 @@ class FeatureData:
     ) -> Self:
         return cls(project_data, scaler)
 
-    def _get_feature_matrix(self) -> np.ndarray:
+    @property
+    def raw_matrix(self) -> np.ndarray:
+        """
+        Unscaled feature matrix as read from the CSV.
+        Returns:
+            Raw feature matrix.
+        """
+        engine, frame = self.project_data.engine, self.project_data.frame
+        return engine.to_numpy(frame, engine.column_names(frame))
+
+    @cached_property
+    def feature_matrix(self) -> np.ndarray:
+        """
+        Prepare the feature matrix. Scaling happens on first access,
+        so callers that serve rows from a cache never pay for it.
+        Returns:
+            Scaled feature matrix.
+        """
+        return self.scale(self.raw_matrix)
+
+    def scale(self, x: np.ndarray) -> np.ndarray:
         """
-        Prepare the feature matrix.
+        Scale raw feature rows with the loaded scaler.
+        Args:
+            x: Raw feature rows.
+
         Returns:
-            Feature matrix as NumpyMatrix.
+            Scaled feature rows.
         """
-        x = self.project_data.df.values
-        return self.scaler.transform(x)
+        with metrics.stage("scale", rows=len(x)):
+            return self.scaler.transform(x)
 
 
 class MLData:
     def __init__(
-            self, project_data: ProjectData, test_size: float, random_seed: int
+            self,
+            project_data: ProjectData,
+            test_size: float,
+            random_seed: int,
+            save_scaler: bool = True,
     ) -> None:
         self.project_data = project_data
         self.test_size = test_size
         self.random_seed = random_seed
+        self.save_scaler = save_scaler
         self.dataset = self._get_whole_dataset()
-        self.scaled_feature_matrix = MLData._scale_input_features(self.dataset.x)[0]
+        self.scaled_feature_matrix = MLData._scale_input_features(
+            self.dataset.x, save_scaler
+        )[0]
         self.train, self.valid = self._get_prepared_matrices()
 
     @classmethod
-    @lru_cache
     def build(
+            cls,
+            project_data: ProjectData,
+            test_size: float,
+            random_seed: int,
+            save_scaler: bool = True,
+    ) -> Self:
+        """
+        Cached MLData of a split. The split does not depend on save_scaler,
+        so builds that only differ in it share one instance; the scaler is
+        saved the first time a build asks for it.
+        """
+        data = cls._build(project_data, test_size, random_seed)
+        if save_scaler and not data.save_scaler:
+            data.save_scaler = True
+            data.write_scaler()
+        return data
+
+    @classmethod
+    @lru_cache
+    def _build(
             cls, project_data: ProjectData, test_size: float, random_seed: int
     ) -> Self:
-        return cls(project_data, test_size, random_seed)
+        return cls(project_data, test_size, random_seed, save_scaler=False)
+
+    def write_scaler(self) -> None:
+        """
+        Save the scaler fitted on the training split for prediction of new
+        data, in the background.
+        Returns:
+            None
+        """
+        artifact_writer.save(self.scaler, SCALER_FILE)
 
     def _get_whole_dataset(self) -> NumpyMatrix:
         """
@@ -77,8 +183,12 @@ class MLData:
         Returns:
             Whole dataset as NumpyMatrix.
         """
-        x = self.project_data.df.drop(columns=["DEATH_EVENT"]).values
-        y = self.project_data.df["DEATH_EVENT"].values
+        # Straight from the engine's columns, without a pandas round trip
+        engine, frame = self.project_data.engine, self.project_data.frame
+        target = Column.DEATH_EVENT.value
+        features = [name for name in engine.column_names(frame) if name != target]
+        x = engine.to_numpy(frame, features)
+        y = engine.column(frame, target)
 
         return NumpyMatrix(x, y)  # type: ignore
 
@@ -94,44 +204,51 @@ class MLData:
             test_size=self.test_size,
             random_state=self.random_seed,
         )
-        x_train, x_valid = MLData._scale_train_valid_input_features(unscaled_x_train,
-                                                                    unscaled_x_valid)
+        x_train, x_valid, self.scaler = MLData._scale_train_valid_input_features(
+            unscaled_x_train, unscaled_x_valid, self.save_scaler
+        )
         return NumpyMatrix(x_train, y_train), NumpyMatrix(x_valid, y_valid)
 
     @staticmethod
-    def _scale_input_features(x: np.ndarray) -> tuple[np.ndarray, StandardScaler]:
+    def _scale_input_features(
+            x: np.ndarray, save: bool = True
+    ) -> tuple[np.ndarray, StandardScaler]:
         """
         Scale input features.
         Args:
             x: Input features.
+            save: Save the fitted scaler to results/scalers.
 
         Returns:
             Scaled input features and the scaler used for scaling.
         """
         scaler = StandardScaler()
-        x = scaler.fit_transform(x)
+        with metrics.stage("scale", rows=len(x)):
+            x = scaler.fit_transform(x)
+
+        if not save:
+            return x, scaler
 
         # Save the fitted scaler needed for prediction of new data.
-        output_dir = Path("results/scalers")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        scaler_file = output_dir / "used_scaler.joblib"
-        joblib.dump(scaler, scaler_file, compress=False)
+        artifact_writer.save(scaler, SCALER_FILE)
 
         return x, scaler
 
     @staticmethod
     def _scale_train_valid_input_features(
-            x_train: np.ndarray, x_valid: np.ndarray
-    ) -> tuple[np.ndarray, np.ndarray]:
+            x_train: np.ndarray, x_valid: np.ndarray, save: bool = True
+    ) -> tuple[np.ndarray, np.ndarray, StandardScaler]:
         """
         Scale input features.
         Args:
             x_train:
             x_valid:
+            save: Save the scaler fitted on the training features.
 
         Returns:
-            Scaled training and validation input features.
+            Scaled training and validation input features and the scaler
+            fitted on the training features.
         """
-        x_train, scaler = MLData._scale_input_features(x_train)
+        x_train, scaler = MLData._scale_input_features(x_train, save)
         x_valid = scaler.transform(x_valid)  # type: ignore
-        return x_train, x_valid
+        return x_train, x_valid, scaler
@@ -0,0 +1,274 @@
+"""Dataframe engines behind ProjectData and the analytics backends
+
+The backends keep handing pandas DataFrames, dicts and NumPy arrays to
+their callers; an engine only decides how the data is loaded and how
+filtering, grouping, value counts and correlations are computed. Rows
+are filtered with a boolean mask, which callers build from a column with
+heartpredict.backend.query.OPERATORS, so every engine compares the same.
+Missing values are skipped the way pandas skips them. The bitmap index,
+the subgroup cube, significance tests and survival analysis still work
+on ProjectData.df, a pandas copy converted once per dataset.
+pandas is the default. pyarrow and polars are optional dependencies and
+are only imported when their engine is selected:
+
+    pip install heartpredict[arrow]
+    pip install heartpredict[polars]
+"""
+import importlib
+from itertools import combinations
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from heartpredict.backend.kendall import kendall_matrix
+from heartpredict.enums import CorrelationMethod, DataFrameEngine
+from scipy.stats import rankdata
+
+
+def _optional_module(name: str, engine: DataFrameEngine) -> Any:
+    """
+    Import the optional dependency of an engine. Engines import it on use
+    instead of holding the module, so they stay picklable for workers
+    started with spawn or forkserver.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        package = name.split(".")[0]
+        raise ImportError(f"The {engine.value} engine needs {package}, "
+                          f"pip install heartpredict[{engine.value}]") from e
+
+
+def pair_correlation(x: np.ndarray, y: np.ndarray, method: CorrelationMethod) -> float:
+    """
+    Pearson or Spearman correlation over the rows where both values are
+    present, like pandas. Spearman ranks only those rows.
+    """
+    present = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[present], y[present]
+    if CorrelationMethod(method) == CorrelationMethod.SPEARMAN:
+        x, y = rankdata(x), rankdata(y)
+    x_centred, y_centred = x - x.mean(), y - y.mean()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return float(
+            (x_centred @ y_centred)
+            / np.sqrt((x_centred @ x_centred) * (y_centred @ y_centred))
+        )
+
+
+def _correlation_frame(
+        x: np.ndarray, columns: list[str], method: CorrelationMethod
+) -> pd.DataFrame:
+    """
+    Correlation of the columns of x. Without missing values the caller
+    rank transformed x for Spearman. With missing values x holds the raw
+    values and every pair of columns is correlated over its complete rows,
+    like pandas DataFrame.corr. Kendall skips missing values by itself.
+    """
+    if CorrelationMethod(method) == CorrelationMethod.KENDALL:
+        matrix = kendall_matrix(x)
+    elif np.isnan(x).any():
+        matrix = np.eye(len(columns))
+        for i, j in combinations(range(len(columns)), 2):
+            matrix[i, j] = matrix[j, i] = pair_correlation(x[:, i], x[:, j], method)
+    else:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = np.corrcoef(x, rowvar=False)
+    return pd.DataFrame(matrix, index=columns, columns=columns)
+
+
+class PandasEngine:
+    name = DataFrameEngine.PANDAS
+
+    def read_csv(self, csv: Any) -> pd.DataFrame:
+        return pd.read_csv(csv)
+
+    def num_rows(self, frame: pd.DataFrame) -> int:
+        return len(frame)
+
+    def column_names(self, frame: pd.DataFrame) -> list[str]:
+        return list(frame.columns)
+
+    def to_pandas(self, frame: pd.DataFrame) -> pd.DataFrame:
+        return frame
+
+    def column(self, frame: pd.DataFrame, name: str) -> np.ndarray:
+        return frame[name].to_numpy()
+
+    def to_numpy(self, frame: pd.DataFrame, columns: list[str]) -> np.ndarray:
+        return frame[columns].to_numpy(dtype=np.float64)
+
+    def filter(self, frame: pd.DataFrame, mask: np.ndarray) -> pd.DataFrame:
+        return frame[mask].copy()
+
+    def value_counts(self, frame: pd.DataFrame, column: str) -> dict:
+        return frame[column].value_counts().to_dict()
+
+    def group_sizes(self, frame: pd.DataFrame, by: list[str]) -> dict[tuple, int]:
+        return {
+            key: int(size) for key, size in frame.groupby(by).size().items()
+        }
+
+    def correlation_matrix(
+            self, frame: pd.DataFrame, method: CorrelationMethod
+    ) -> pd.DataFrame:
+        if CorrelationMethod(method) == CorrelationMethod.KENDALL:
+            # O(n log n) instead of the O(n^2) pairs of DataFrame.corr
+            columns = self.column_names(frame)
+            return _correlation_frame(self.to_numpy(frame, columns), columns, method)
+        return frame.corr(method=CorrelationMethod(method).value)
+
+
+class ArrowEngine:
+    name = DataFrameEngine.ARROW
+
+    def __init__(self) -> None:
+        """
+        Multi-threaded CSV reader and compute kernels of pyarrow.
+        Columns are handed to NumPy without a copy where Arrow allows it.
+        """
+        # Fail early if pyarrow is missing
+        _optional_module("pyarrow", self.name)
+
+    @property
+    def pa(self) -> Any:
+        return _optional_module("pyarrow", self.name)
+
+    @property
+    def pc(self) -> Any:
+        return _optional_module("pyarrow.compute", self.name)
+
+    @property
+    def pv(self) -> Any:
+        return _optional_module("pyarrow.csv", self.name)
+
+    def read_csv(self, csv: Any) -> Any:
+        return self.pv.read_csv(
+            str(csv), read_options=self.pv.ReadOptions(use_threads=True)
+        )
+
+    def num_rows(self, frame: Any) -> int:
+        return frame.num_rows
+
+    def column_names(self, frame: Any) -> list[str]:
+        return frame.column_names
+
+    def to_pandas(self, frame: Any) -> pd.DataFrame:
+        return frame.to_pandas()
+
+    def column(self, frame: Any, name: str) -> np.ndarray:
+        # Zero-copy for a single chunk without nulls
+        return frame.column(name).combine_chunks().to_numpy(zero_copy_only=False)
+
+    def to_numpy(self, frame: Any, columns: list[str]) -> np.ndarray:
+        # The 2-D matrix is the only copy, filled column by column from
+        # zero-copy views, so no pandas frame is materialised
+        matrix = np.empty((frame.num_rows, len(columns)), order="F")
+        for i, name in enumerate(columns):
+            matrix[:, i] = self.column(frame, name)
+        return matrix
+
+    def filter(self, frame: Any, mask: np.ndarray) -> Any:
+        return frame.filter(self.pa.array(mask))
+
+    def value_counts(self, frame: Any, column: str) -> dict:
+        counts = self.pc.value_counts(frame.column(column)).to_pylist()
+        counts.sort(key=lambda item: -item["counts"])
+        return {item["values"]: item["counts"] for item in counts}
+
+    def group_sizes(self, frame: Any, by: list[str]) -> dict[tuple, int]:
+        sizes = frame.group_by(by).aggregate([([], "count_all")])
+        sizes = sizes.sort_by([(name, "ascending") for name in by])
+        keys = zip(*(sizes.column(name).to_pylist() for name in by))
+        return dict(zip(keys, sizes.column("count_all").to_pylist()))
+
+    def correlation_matrix(self, frame: Any, method: CorrelationMethod) -> pd.DataFrame:
+        columns = self.column_names(frame)
+        x = self.to_numpy(frame, columns)
+        if (CorrelationMethod(method) == CorrelationMethod.SPEARMAN
+                and not np.isnan(x).any()):
+            # Average ranks of ties are the mean of their min and max rank
+            x = np.column_stack([
+                (
+                    self.pc.rank(frame.column(name), tiebreaker="min").to_numpy()
+                    + self.pc.rank(frame.column(name), tiebreaker="max").to_numpy()
+                ) / 2
+                for name in columns
+            ])
+        return _correlation_frame(x, columns, method)
+
+
+class PolarsEngine:
+    name = DataFrameEngine.POLARS
+
+    def __init__(self) -> None:
+        """
+        Multi-threaded, lazily optimised queries of polars.
+        """
+        # Fail early if polars is missing
+        _optional_module("polars", self.name)
+
+    @property
+    def pl(self) -> Any:
+        return _optional_module("polars", self.name)
+
+    def read_csv(self, csv: Any) -> Any:
+        return self.pl.read_csv(csv)
+
+    def num_rows(self, frame: Any) -> int:
+        return frame.height
+
+    def column_names(self, frame: Any) -> list[str]:
+        return frame.columns
+
+    def to_pandas(self, frame: Any) -> pd.DataFrame:
+        # Built from NumPy views, so pyarrow is not needed
+        return pd.DataFrame({name: self.column(frame, name) for name in frame.columns})
+
+    def column(self, frame: Any, name: str) -> np.ndarray:
+        # Zero-copy for numeric columns without nulls
+        return frame.get_column(name).to_numpy()
+
+    def to_numpy(self, frame: Any, columns: list[str]) -> np.ndarray:
+        matrix = frame.select(self.pl.col(columns).cast(self.pl.Float64))
+        return matrix.to_numpy(order="fortran")
+
+    def filter(self, frame: Any, mask: np.ndarray) -> Any:
+        return frame.filter(self.pl.Series(mask))
+
+    def value_counts(self, frame: Any, column: str) -> dict:
+        counts = frame.get_column(column).value_counts(sort=True)
+        return dict(zip(counts.get_column(column).to_list(),
+                        counts.get_column("count").to_list()))
+
+    def group_sizes(self, frame: Any, by: list[str]) -> dict[tuple, int]:
+        sizes = frame.group_by(by).len().sort(by)
+        keys = zip(*(sizes.get_column(name).to_list() for name in by))
+        return dict(zip(keys, sizes.get_column("len").to_list()))
+
+    def correlation_matrix(self, frame: Any, method: CorrelationMethod) -> pd.DataFrame:
+        columns = self.column_names(frame)
+        x = self.to_numpy(frame, columns)
+        if (CorrelationMethod(method) == CorrelationMethod.SPEARMAN
+                and not np.isnan(x).any()):
+            x = self.to_numpy(frame.select(self.pl.all().rank("average")), columns)
+        return _correlation_frame(x, columns, method)
+
+
+ENGINES = {
+    DataFrameEngine.PANDAS: PandasEngine,
+    DataFrameEngine.ARROW: ArrowEngine,
+    DataFrameEngine.POLARS: PolarsEngine,
+}
+
+
+def get_engine(engine: DataFrameEngine = DataFrameEngine.PANDAS) -> Any:
+    """
+    Instantiate an engine, importing its optional dependency.
+    Args:
+        engine: Engine to use.
+
+    Returns:
+        PandasEngine, ArrowEngine or PolarsEngine.
+    """
+    return ENGINES[DataFrameEngine(engine)]()
@@ -15,6 +15,33 @@ class CorrelationMethod(str, Enum):
     SPEARMAN = "spearman"
 
 
+class ReportFormat(str, Enum):
+    JSON = "json"
+    TABLE = "table"
+
+
+class ImageFormat(str, Enum):
+    PNG = "png"
+    SVG = "svg"
+
+
+class ProfileMode(str, Enum):
+    CPU = "cpu"
+    MEMORY = "memory"
+    BOTH = "both"
+
+
+class DataFrameEngine(str, Enum):
+    PANDAS = "pandas"
+    ARROW = "arrow"
+    POLARS = "polars"
+
+
+class ModelType(str, Enum):
+    CLASSIFIER = "classifier"
+    REGRESSOR = "regressor"
+
+
 class BoolColumn(str, Enum):
     ANAEMIA = "anaemia"
     DIABETES = "diabetes"
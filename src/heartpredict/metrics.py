@@ -0,0 +1,212 @@
+"""Per-stage latency and throughput instrumentation"""
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger("heartpredict.metrics")
+
+
+@dataclass
+class StageMetrics:
+    stage: str
+    calls: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    last_seconds: float = 0.0
+    max_seconds: float = 0.0
+    # Only measured while tracemalloc is tracing, e.g. with hp --profile memory
+    memory_peak_bytes: int = 0
+    memory_net_bytes: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class StageRecord:
+    rows: int = 0
+
+
+class Instrumentation:
+    def __init__(self) -> None:
+        self._stages: dict[str, StageMetrics] = {}
+        self._lock = threading.Lock()
+        self._collectors: list["Instrumentation"] = []
+        # [start, peak] traced memory of every open stage, innermost last
+        self._memory_frames: list[list[int]] = []
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0) -> Iterator[StageRecord]:
+        """
+        Time a stage with a monotonic clock and count the rows it handled.
+        The row count can be set on the yielded record when it is only
+        known after the stage ran, e.g. when loading a CSV.
+        Args:
+            name: Name of the stage (e.g. 'load_csv').
+            rows: Number of rows processed by the stage.
+
+        Returns:
+            Record whose row count can be updated inside the stage.
+        """
+        record = StageRecord(rows)
+        frame = self._enter_memory_frame()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            peak, net = self._exit_memory_frame(frame)
+            with self._lock:
+                collectors = [self] + self._collectors
+            for instrumentation in collectors:
+                instrumentation._observe(name, record.rows, elapsed, peak, net)
+            logger.debug(json.dumps({
+                "event": "stage",
+                "stage": name,
+                "seconds": elapsed,
+                "rows": record.rows,
+            }))
+
+    @contextmanager
+    def collect(self) -> Iterator["Instrumentation"]:
+        """
+        Additionally record every stage that finishes inside the block
+        in a fresh Instrumentation, e.g. to report a single command of a
+        long-running process.
+        Returns:
+            Instrumentation with the stages of the block only.
+        """
+        collector = Instrumentation()
+        with self._lock:
+            self._collectors.append(collector)
+        try:
+            yield collector
+        finally:
+            with self._lock:
+                self._collectors.remove(collector)
+
+    def _observe(
+            self, name: str, rows: int, elapsed: float, peak: int, net: int
+    ) -> None:
+        with self._lock:
+            metrics = self._stages.setdefault(name, StageMetrics(name))
+            metrics.calls += 1
+            metrics.rows += rows
+            metrics.seconds += elapsed
+            metrics.last_seconds = elapsed
+            metrics.max_seconds = max(metrics.max_seconds, elapsed)
+            metrics.memory_peak_bytes = max(metrics.memory_peak_bytes, peak)
+            metrics.memory_net_bytes += net
+
+    def _enter_memory_frame(self) -> Optional[list[int]]:
+        if not tracemalloc.is_tracing():
+            return None
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak is reset for the new stage, so the enclosing
+            # stages keep what they have seen so far
+            for frame in self._memory_frames:
+                frame[1] = max(frame[1], peak)
+            tracemalloc.reset_peak()
+            frame = [current, current]
+            self._memory_frames.append(frame)
+        return frame
+
+    def _exit_memory_frame(self, frame: Optional[list[int]]) -> tuple[int, int]:
+        if frame is None or not tracemalloc.is_tracing():
+            return 0, 0
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            # Compare by identity, frames of equal value are different stages
+            self._memory_frames = [
+                f for f in self._memory_frames if f is not frame
+            ]
+            peak = max(frame[1], peak)
+            for enclosing in self._memory_frames:
+                enclosing[1] = max(enclosing[1], peak)
+        return peak - frame[0], current - frame[0]
+
+    def snapshot(self) -> list[StageMetrics]:
+        with self._lock:
+            return [StageMetrics(**asdict(m)) for m in self._stages.values()]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def to_json(self) -> str:
+        """
+        Export all stage metrics as a single JSON document.
+        Returns:
+            JSON string with one entry per stage.
+        """
+        return json.dumps({
+            "stages": [
+                {**asdict(m), "rows_per_second": m.rows_per_second}
+                for m in self.snapshot()
+            ]
+        }, sort_keys=True)
+
+    def summary(self) -> str:
+        """
+        Summarise the stage metrics on a single line for the log.
+        Returns:
+            Time and rows of every stage, empty if no stage ran.
+        """
+        return ", ".join(
+            f"{m.stage} {m.seconds:.3f}s"
+            + (f" ({m.rows} rows)" if m.rows else "")
+            for m in self.snapshot()
+        )
+
+    def to_prometheus(self) -> str:
+        """
+        Export all stage metrics in the Prometheus text exposition format.
+        Returns:
+            Prometheus text with one sample per stage and metric.
+        """
+        families = [
+            ("calls_total", "counter", "Number of times the stage ran.", "calls"),
+            ("rows_total", "counter", "Rows processed by the stage.", "rows"),
+            ("seconds_total", "counter", "Time spent in the stage.", "seconds"),
+            ("last_seconds", "gauge", "Duration of the last run.", "last_seconds"),
+            ("max_seconds", "gauge", "Longest run of the stage.", "max_seconds"),
+            ("memory_peak_bytes", "gauge", "Largest traced memory increase "
+             "during a run.", "memory_peak_bytes"),
+        ]
+        stages = self.snapshot()
+        lines = []
+        for suffix, kind, help_text, attribute in families:
+            name = f"heartpredict_stage_{suffix}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for m in stages:
+                lines.append(f'{name}{{stage="{m.stage}"}} {getattr(m, attribute)}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path) -> None:
+        """
+        Write the Prometheus text atomically, e.g. for a textfile collector.
+        Args:
+            path: Output file.
+
+        Returns:
+            None
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = path.with_name(f".{path.name}.tmp")
+        tmp_file.write_text(self.to_prometheus())
+        os.replace(tmp_file, path)
+        logging.info(f"Stage metrics written to {path}")
+
+
+metrics = Instrumentation()
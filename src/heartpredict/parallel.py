@@ -0,0 +1,80 @@
+"""Helpers for deterministic, batched work in a process pool"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, Sequence
+
+import numpy as np
+
+
+def resolve_n_jobs(n_jobs: Optional[int]) -> int:
+    """
+    Resolve the number of worker processes.
+    Args:
+        n_jobs: Requested number of workers, None or -1 for all cores.
+
+    Returns:
+        Number of workers, at least 1.
+    """
+    if n_jobs is None or n_jobs < 1:
+        return os.cpu_count() or 1
+    return n_jobs
+
+
+def split_batches(total: int, batch_size: int) -> list[int]:
+    """
+    Split a number of repetitions into batches.
+    Args:
+        total: Total number of repetitions (e.g. resamples).
+        batch_size: Maximum repetitions per batch.
+
+    Returns:
+        Size of every batch.
+    """
+    full, rest = divmod(total, batch_size)
+    return [batch_size] * full + ([rest] if rest else [])
+
+
+def spawn_seeds(seed: int, n: int) -> list[np.random.SeedSequence]:
+    """
+    Derive independent seeds for n batches from a single seed.
+    Seeds belong to batches, not to workers, so results do not depend
+    on the number of processes used.
+    Args:
+        seed: Root random seed.
+        n: Number of batches.
+
+    Returns:
+        One SeedSequence per batch.
+    """
+    return np.random.SeedSequence(seed).spawn(n)
+
+
+def run_tasks(
+        func: Callable[..., Any],
+        tasks: Sequence[tuple],
+        n_jobs: Optional[int] = None,
+        initializer: Optional[Callable[..., None]] = None,
+        initargs: tuple = (),
+) -> list[Any]:
+    """
+    Run func over argument tuples, in a process pool if more than one
+    worker is requested. Results keep the order of the tasks.
+    Args:
+        func: Top-level function to call with each argument tuple.
+        tasks: Argument tuples.
+        n_jobs: Number of worker processes, None for all cores.
+        initializer: Optional per-worker initializer.
+        initargs: Arguments of the initializer.
+
+    Returns:
+        Result of every task.
+    """
+    workers = min(resolve_n_jobs(n_jobs), len(tasks))
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(*task) for task in tasks]
+    with ProcessPoolExecutor(
+            max_workers=workers, initializer=initializer, initargs=initargs
+    ) as executor:
+        return list(executor.map(func, *zip(*tasks)))
@@ -0,0 +1,408 @@
+"""Declarative pipelines of CLI commands with cached artifacts
+
+A pipeline spec (TOML, or YAML if PyYAML is installed) lists the steps:
+
+    csv = "data/heart_failure_clinical_records.csv"
+
+    [steps.train_regression]
+    command = "train_regression --seed 42"
+    outputs = ["results/trained_models/regressor"]
+
+    [steps.kmplot]
+    command = "kmplot --no-plot --tables results/survival/tables.json"
+    needs = ["train_regression"]
+    outputs = ["results/survival/tables.json"]
+"""
+import hashlib
+import importlib.metadata
+import json
+import logging
+import shlex
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from heartpredict.daemon import CommandResult, CommandRunner
+from heartpredict.parallel import resolve_n_jobs
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+# Runner of a worker process, it keeps the build caches between steps
+_RUNNER: Optional[CommandRunner] = None
+
+SCALER_FILE = "results/scalers/used_scaler.joblib"
+# Commands that build the MLData split or use the shared scaler and models,
+# mapped to the shared files they write. Steps running them share a single
+# worker, so the split, scaler and regressor are built once and two steps
+# never write the scaler at the same time. The files count as implicit
+# outputs of the step, so they are cached and restored with it.
+SHARED_ML_COMMANDS: dict[str, tuple[str, ...]] = {
+    "train_classification": (SCALER_FILE, "results/trained_models/classifier"),
+    "train_regression": (SCALER_FILE, "results/trained_models/regressor"),
+    "kmplot": (SCALER_FILE,),
+    "importance": (),
+    "predict_death_event": (),
+    "predict_ensemble": (),
+}
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    command: tuple[str, ...]
+    needs: tuple[str, ...] = ()
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+    # Runs in the worker of the SHARED_ML_COMMANDS
+    shared: bool = False
+
+
+@dataclass
+class Pipeline:
+    steps: dict[str, Step]
+    csv: Optional[str] = None
+
+    def order(self) -> list[str]:
+        """
+        Steps in dependency order.
+        Returns:
+            Step names, every step after the steps it needs.
+        """
+        remaining = {name: set(step.needs) for name, step in self.steps.items()}
+        ordered: list[str] = []
+        while remaining:
+            ready = sorted(name for name, needs in remaining.items() if not needs)
+            if not ready:
+                raise ValueError(f"Steps form a cycle: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+                for needs in remaining.values():
+                    needs.discard(name)
+            ordered.extend(ready)
+        return ordered
+
+
+@dataclass
+class StepReport:
+    name: str
+    status: str
+    seconds: float = 0.0
+    stdout: str = ""
+    stderr: str = ""
+
+
+@dataclass
+class PipelineReport:
+    steps: list[StepReport] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> bool:
+        return all(step.status in ("ran", "cached", "restored") for step in self.steps)
+
+
+def load_pipeline(spec_file: Path) -> Pipeline:
+    """
+    Read a pipeline spec from a TOML or YAML file.
+    Args:
+        spec_file: Path to the spec.
+
+    Returns:
+        Validated Pipeline.
+    """
+    spec_file = Path(spec_file)
+    if spec_file.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as e:
+            raise ImportError("YAML specs need PyYAML, use a TOML spec or "
+                              "pip install pyyaml") from e
+        spec = yaml.safe_load(spec_file.read_text())
+    else:
+        spec = tomllib.loads(spec_file.read_text())
+
+    steps = {}
+    for name, options in spec.get("steps", {}).items():
+        command = options["command"]
+        if isinstance(command, str):
+            command = shlex.split(command)
+        shared = [SHARED_ML_COMMANDS[arg] for arg in command
+                  if arg in SHARED_ML_COMMANDS]
+        outputs = [*options.get("outputs", ()), *(p for ps in shared for p in ps)]
+        steps[name] = Step(
+            name=name,
+            command=tuple(command),
+            needs=tuple(options.get("needs", ())),
+            inputs=tuple(options.get("inputs", ())),
+            outputs=tuple(dict.fromkeys(outputs)),
+            shared=bool(shared),
+        )
+    for step in steps.values():
+        unknown = set(step.needs) - set(steps)
+        if unknown:
+            raise ValueError(
+                f"Step '{step.name}' needs unknown steps {sorted(unknown)}"
+            )
+    pipeline = Pipeline(steps=steps, csv=spec.get("csv"))
+    pipeline.order()
+    return pipeline
+
+
+def digest_paths(patterns: tuple[str, ...]) -> dict[str, str]:
+    """
+    Content hash of every file matched by paths, directories or globs.
+    Args:
+        patterns: File paths, directories or glob patterns.
+
+    Returns:
+        Dictionary mapping each file to the sha256 of its content,
+        or to "missing" if it does not exist.
+    """
+    digests = {}
+    for pattern in patterns:
+        if any(c in pattern for c in "*?["):
+            matches = sorted(Path().glob(pattern))
+        else:
+            matches = [Path(pattern)]
+        for match in matches:
+            if not match.exists():
+                digests[match.as_posix()] = "missing"
+                continue
+            files = [match]
+            if match.is_dir():
+                files = sorted(p for p in match.rglob("*") if p.is_file())
+            for path in files:
+                content = path.read_bytes()
+                digests[path.as_posix()] = hashlib.sha256(content).hexdigest()
+    return digests
+
+
+class ArtifactCache:
+    def __init__(self, root: Path = Path("results/pipeline")) -> None:
+        """
+        Outputs and captured stdout of every step run, stored under the
+        hash of the step's inputs, plus the key and output digests of the
+        last run of each step.
+        Args:
+            root: Directory of the cache.
+        """
+        self.root = Path(root)
+        self.state_file = self.root / "state.json"
+        self.state: dict[str, dict] = {}
+        if self.state_file.exists():
+            self.state = json.loads(self.state_file.read_text())
+
+    def step_key(
+            self, step: Step, csv: Optional[str], upstream: dict[str, str]
+    ) -> str:
+        """
+        Hash of everything a step's result depends on.
+        Args:
+            step: Pipeline step.
+            csv: Dataset passed to every step.
+            upstream: Output digests of the steps it needs.
+
+        Returns:
+            Hex digest.
+        """
+        inputs = step.inputs + ((csv,) if csv else ())
+        payload = {
+            # Another release may compute different results
+            "version": importlib.metadata.version("heartpredict"),
+            "command": step.command,
+            "csv": csv,
+            "inputs": digest_paths(inputs),
+            "upstream": upstream,
+        }
+        return hashlib.sha256(
+            json.dumps(payload, sort_keys=True).encode()
+        ).hexdigest()
+
+    def is_current(self, step: Step, key: str) -> bool:
+        """
+        Whether the last run used the same key and its outputs are untouched.
+        """
+        last = self.state.get(step.name)
+        return bool(last) and last["key"] == key and (  # type: ignore
+            digest_paths(step.outputs) == last["outputs"]  # type: ignore
+        )
+
+    def restore(self, step: Step, key: str) -> Optional[str]:
+        """
+        Copy the cached outputs of an earlier run with the same key back.
+        Returns:
+            Captured stdout of that run, None if nothing is cached.
+        """
+        entry = self.root / "artifacts" / key
+        if not (entry / "stdout.txt").exists():
+            return None
+        for output in step.outputs:
+            cached = self._artifact(entry, output)
+            target = Path(output)
+            if target.is_dir():
+                shutil.rmtree(target)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if cached.is_dir():
+                shutil.copytree(cached, target)
+            elif cached.exists():
+                shutil.copy2(cached, target)
+        self._record(step, key)
+        return (entry / "stdout.txt").read_text()
+
+    def cached_stdout(self, key: str) -> str:
+        stdout = self.root / "artifacts" / key / "stdout.txt"
+        return stdout.read_text() if stdout.exists() else ""
+
+    def store(self, step: Step, key: str, stdout: str) -> None:
+        """
+        Keep the outputs and stdout of a successful run under its key.
+        """
+        entry = self.root / "artifacts" / key
+        if entry.exists():
+            shutil.rmtree(entry)
+        for output in step.outputs:
+            source = Path(output)
+            target = self._artifact(entry, output)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if source.is_dir():
+                shutil.copytree(source, target)
+            elif source.exists():
+                shutil.copy2(source, target)
+        entry.mkdir(parents=True, exist_ok=True)
+        (entry / "stdout.txt").write_text(stdout)
+        self._record(step, key)
+
+    @staticmethod
+    def _artifact(entry: Path, output: str) -> Path:
+        # Absolute outputs are stored relative to the root of the file system
+        return entry / "files" / Path(output).as_posix().lstrip("/")
+
+    def _record(self, step: Step, key: str) -> None:
+        self.state[step.name] = {"key": key, "outputs": digest_paths(step.outputs)}
+        self.root.mkdir(parents=True, exist_ok=True)
+        temporary = self.state_file.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.state, indent=2))
+        temporary.replace(self.state_file)
+
+
+def _init_worker() -> None:
+    global _RUNNER
+    from heartpredict.cli import app
+
+    _RUNNER = CommandRunner(app)
+
+
+def _run_command(argv: list[str]) -> CommandResult:
+    return _RUNNER.run(argv)  # type: ignore
+
+
+def run_pipeline(
+        pipeline: Pipeline,
+        cache: Optional[ArtifactCache] = None,
+        n_jobs: Optional[int] = 1,
+        force: bool = False,
+) -> PipelineReport:
+    """
+    Run the steps of a pipeline as a dependency graph.
+    A step starts once every step it needs has finished, so independent
+    steps run concurrently in worker processes. Each worker runs its steps
+    in-process and keeps ProjectData cached between them. Steps of the
+    SHARED_ML_COMMANDS run one at a time in one dedicated worker, which
+    also keeps MLData, the scaler and the models cached; with one job all
+    steps share the caches of this process.
+    Steps whose inputs, command and upstream outputs are unchanged are
+    skipped, or restored from the artifact cache if their outputs changed.
+    Args:
+        pipeline: Pipeline to run.
+        cache: Artifact cache, default results/pipeline.
+        n_jobs: Number of worker processes, None for all cores.
+        force: Run every step even if it is cached.
+
+    Returns:
+        PipelineReport with the status of every step.
+    """
+    cache = cache or ArtifactCache()
+    workers = min(resolve_n_jobs(n_jobs), max(len(pipeline.steps), 1))
+    prefix = ["--csv", pipeline.csv] if pipeline.csv else []
+    reports: dict[str, StepReport] = {}
+    running: dict[Future, tuple[Step, str, float]] = {}
+
+    executor = shared_executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(workers - 1, initializer=_init_worker)
+        # A single process queues the shared steps and keeps their caches
+        shared_executor = ProcessPoolExecutor(1, initializer=_init_worker)
+    else:
+        _init_worker()
+
+    def finished(name: str) -> bool:
+        return name in reports
+
+    def ready_steps() -> list[Step]:
+        started = {step.name for step, _, _ in running.values()}
+        return [
+            pipeline.steps[name] for name in pipeline.order()
+            if not finished(name) and name not in started
+            and all(finished(need) for need in pipeline.steps[name].needs)
+        ]
+
+    def complete(step: Step, key: str, result: CommandResult, start: float) -> None:
+        seconds = time.perf_counter() - start
+        if result.exit_code == 0:
+            cache.store(step, key, result.stdout)  # type: ignore
+        status = "ran" if result.exit_code == 0 else "failed"
+        reports[step.name] = StepReport(
+            step.name, status, seconds, result.stdout, result.stderr
+        )
+        logging.info(f"Step {step.name} {status} in {seconds:.2f}s")
+
+    try:
+        while len(reports) < len(pipeline.steps):
+            for step in ready_steps():
+                if any(reports[need].status in ("failed", "skipped")
+                       for need in step.needs):
+                    reports[step.name] = StepReport(step.name, "skipped")
+                    continue
+                upstream = {
+                    need: json.dumps(cache.state[need]["outputs"], sort_keys=True)
+                    for need in step.needs
+                }
+                key = cache.step_key(step, pipeline.csv, upstream)
+                if not force and cache.is_current(step, key):
+                    reports[step.name] = StepReport(
+                        step.name, "cached", stdout=cache.cached_stdout(key)
+                    )
+                    continue
+                restored = None if force else cache.restore(step, key)
+                if restored is not None:
+                    reports[step.name] = StepReport(
+                        step.name, "restored", stdout=restored
+                    )
+                    continue
+                argv = prefix + list(step.command)
+                logging.info(f"Running step {step.name}: {shlex.join(argv)}")
+                start = time.perf_counter()
+                if executor is None:
+                    complete(step, key, _run_command(argv), start)
+                else:
+                    pool = shared_executor if step.shared else executor
+                    running[pool.submit(_run_command, argv)] = (  # type: ignore
+                        step, key, start
+                    )
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step, key, start = running.pop(future)
+                    complete(step, key, future.result(), start)
+    finally:
+        for pool in (executor, shared_executor):
+            if pool is not None:
+                pool.shutdown()
+
+    return PipelineReport([reports[name] for name in pipeline.order()])
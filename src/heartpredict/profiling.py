@@ -0,0 +1,195 @@
+"""CPU and memory profiles of single CLI commands
+
+Reports are JSON with sorted keys and without absolute paths, so two runs
+of the same command can be compared with a plain diff or with
+compare_profiles.
+"""
+import cProfile
+import json
+import logging
+import pstats
+import site
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+from heartpredict.enums import ProfileMode
+from heartpredict.metrics import Instrumentation, metrics
+
+
+def _short_path(filename: str) -> str:
+    """
+    Path of a source file relative to the working directory or the
+    installation it belongs to, so reports of different machines match.
+    """
+    path = Path(filename)
+    roots = [Path.cwd(), *map(Path, site.getsitepackages()), Path(sys.prefix)]
+    for root in roots:
+        try:
+            return path.relative_to(root).as_posix()
+        except ValueError:
+            continue
+    return filename
+
+
+class Profiler:
+    def __init__(
+            self,
+            mode: ProfileMode,
+            command: str,
+            output_dir: Path = Path("results/profiles"),
+            top: int = 25,
+    ) -> None:
+        """
+        Profile one command with cProfile and/or tracemalloc and attribute
+        time and memory to the instrumented stages (load_csv, scale,
+        cross_validate, fit, predict, plot, ...).
+        Args:
+            mode: What to profile.
+            command: Name of the command, used for the report name.
+            output_dir: Directory of the reports.
+            top: Number of functions and allocation sites in the report.
+        """
+        self.mode = ProfileMode(mode)
+        self.command = command or "hp"
+        self.output_dir = Path(output_dir)
+        self.top = top
+        self.profile: Optional[cProfile.Profile] = None
+        self.stages: Optional[Instrumentation] = None
+        self._stack = ExitStack()
+        self._started_tracing = False
+        self._start = 0.0
+
+    @property
+    def cpu(self) -> bool:
+        return self.mode in (ProfileMode.CPU, ProfileMode.BOTH)
+
+    @property
+    def memory(self) -> bool:
+        return self.mode in (ProfileMode.MEMORY, ProfileMode.BOTH)
+
+    def start(self) -> None:
+        self.stages = self._stack.enter_context(metrics.collect())
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self.memory:
+            tracemalloc.reset_peak()
+        if self.cpu:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self._start = time.perf_counter()
+
+    def stop(self) -> Path:
+        """
+        Stop profiling and write the report.
+        Returns:
+            Path of the JSON report. With CPU profiling the raw stats are
+            written next to it as .prof, e.g. for snakeviz.
+        """
+        seconds = time.perf_counter() - self._start
+        if self.profile is not None:
+            self.profile.disable()
+        report: dict = {
+            "command": self.command,
+            "mode": self.mode.value,
+            "seconds": seconds,
+        }
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ])
+            _, peak = tracemalloc.get_traced_memory()
+            report["memory_peak_bytes"] = peak
+            report["allocations"] = self._allocations(snapshot)
+            if self._started_tracing:
+                tracemalloc.stop()
+        self._stack.close()
+        report["stages"] = self._stages()
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{self.command}-{time.strftime('%Y%m%d-%H%M%S')}"
+        report_file = self.output_dir / f"{name}.json"
+        if self.profile is not None:
+            report["functions"] = self._functions(self.profile)
+            self.profile.dump_stats(self.output_dir / f"{name}.prof")
+        report_file.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        logging.info(f"Profile written to {report_file}")
+        return report_file
+
+    def _stages(self) -> dict[str, dict]:
+        stages = {}
+        for m in self.stages.snapshot():  # type: ignore
+            stage = {"calls": m.calls, "rows": m.rows, "seconds": m.seconds}
+            if self.memory:
+                stage["memory_peak_bytes"] = m.memory_peak_bytes
+                stage["memory_net_bytes"] = m.memory_net_bytes
+            stages[m.stage] = stage
+        return stages
+
+    def _functions(self, profile: cProfile.Profile) -> list[dict]:
+        stats = pstats.Stats(profile).stats  # type: ignore
+        rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                "function": f"{_short_path(filename)}:{line}({function})",
+                "calls": calls,
+                "tottime": tottime,
+                "cumtime": cumtime,
+            }
+            for (filename, line, function), (_, calls, tottime, cumtime, _)
+            in rows[:self.top]
+        ]
+
+    def _allocations(self, snapshot: tracemalloc.Snapshot) -> list[dict]:
+        return [
+            {
+                "location": f"{_short_path(frame.filename)}:{frame.lineno}",
+                "size_bytes": statistic.size,
+                "count": statistic.count,
+            }
+            for statistic in snapshot.statistics("lineno")[:self.top]
+            for frame in statistic.traceback[:1]
+        ]
+
+
+def compare_profiles(old_file: Path, new_file: Path) -> pd.DataFrame:
+    """
+    Compare the stages of two profile reports.
+    Args:
+        old_file: Earlier report.
+        new_file: Later report.
+
+    Returns:
+        DataFrame indexed by stage with old, new and change of the
+        seconds and, if both reports have them, peak memory.
+    """
+    old = json.loads(Path(old_file).read_text())
+    new = json.loads(Path(new_file).read_text())
+    stages = sorted(set(old["stages"]) | set(new["stages"])) + ["total"]
+    # The whole command is compared like a stage
+    old_stages = {**old["stages"], "total": old}
+    new_stages = {**new["stages"], "total": new}
+
+    columns = ["seconds", "memory_peak_bytes"]
+    data: dict[str, list] = {}
+    for column in columns:
+        before = [old_stages.get(s, {}).get(column) for s in stages]
+        after = [new_stages.get(s, {}).get(column) for s in stages]
+        if all(value is None for value in before + after):
+            continue
+        data[f"old_{column}"] = before
+        data[f"new_{column}"] = after
+    comparison = pd.DataFrame(data, index=pd.Index(stages, name="stage"))
+    comparison = comparison.astype(float)
+    for column in columns:
+        if f"old_{column}" in comparison:
+            comparison[f"change_{column}"] = (
+                comparison[f"new_{column}"] - comparison[f"old_{column}"]
+            )
+    return comparison
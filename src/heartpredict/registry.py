@@ -0,0 +1,100 @@
+"""Registry of the best trained model per dataset, seed and model type"""
+import json
+import logging
+import os
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from heartpredict.artifacts import sha256_digest
+
+
+@dataclass
+class RegistryEntry:
+    model_type: str
+    dataset_hash: str
+    random_seed: int
+    test_size: float
+    model_name: str
+    score_name: str
+    score: float
+    model_file: str
+    # sha256 of the model file when it was registered, model files are
+    # named by seed alone and are overwritten by later training runs
+    model_sha256: Optional[str] = None
+
+
+class ModelRegistry:
+    def __init__(
+            self, registry_file: Path = Path("results/trained_models/registry.json")
+    ) -> None:
+        self.registry_file = Path(registry_file)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(
+            model_type: str, dataset_hash: str, random_seed: int, test_size: float
+    ) -> str:
+        return f"{model_type}:{dataset_hash}:{random_seed}:{test_size}"
+
+    def register(self, entry: RegistryEntry) -> None:
+        """
+        Store the best model of a training run, replacing an older entry
+        for the same model type, dataset, seed and test size.
+        Args:
+            entry: RegistryEntry of the best model.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            entries = self._read()
+            key = self._key(entry.model_type, entry.dataset_hash,
+                            entry.random_seed, entry.test_size)
+            entries[key] = asdict(entry)
+            self.registry_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.registry_file.with_name(f".{self.registry_file.name}.tmp")
+            tmp_file.write_text(json.dumps(entries, indent=2, sort_keys=True))
+            os.replace(tmp_file, self.registry_file)
+        logging.debug(f"Registered {entry.model_name} as best {entry.model_type}")
+
+    def find_best(
+            self,
+            model_type: str,
+            dataset_hash: str,
+            random_seed: int,
+            test_size: float
+    ) -> Optional[RegistryEntry]:
+        """
+        Look up the best stored model for a dataset and seed.
+        Args:
+            model_type: 'classifier' or 'regressor'.
+            dataset_hash: ProjectData.dataset_hash of the training data.
+            random_seed: Seed of the train/validation split.
+            test_size: Share of the validation split.
+
+        Returns:
+            RegistryEntry, or None if nothing was trained for this data,
+            the model file no longer exists or was replaced since.
+        """
+        with self._lock:
+            entry = self._read().get(
+                self._key(model_type, dataset_hash, random_seed, test_size)
+            )
+        if entry is None:
+            return None
+        found = RegistryEntry(**entry)
+        model_file = Path(found.model_file)
+        if not model_file.exists():
+            return None
+        if found.model_sha256 != sha256_digest(model_file):
+            logging.warning(f"{model_file} changed since it was registered "
+                            f"as best {model_type}, ignoring the entry")
+            return None
+        return found
+
+    def _read(self) -> dict:
+        if not self.registry_file.exists():
+            return {}
+        return json.loads(self.registry_file.read_text())
@@ -0,0 +1,64 @@
+"""Synthetic cohorts with the schema of the heart failure records"""
+import numpy as np
+import pandas as pd
+from heartpredict.enums import Column
+
+
+def synthetic_cohort(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Draw a cohort with the columns, dtypes and value ranges of
+    data/heart_failure_clinical_records.csv, e.g. for benchmarks at sizes
+    the real dataset does not have. Marginals roughly follow the real
+    data and DEATH_EVENT depends on age, ejection fraction, serum
+    creatinine and follow-up time, so correlations and models are not
+    degenerate. The values carry no clinical meaning.
+    Args:
+        n_rows: Number of patients.
+        seed: Random seed.
+
+    Returns:
+        DataFrame with one column per Column, in the same order.
+    """
+    rng = np.random.default_rng(seed)
+
+    def integers(values: np.ndarray, low: float, high: float) -> np.ndarray:
+        return np.clip(np.round(values), low, high).astype(np.int64)
+
+    def flags(probability: float) -> np.ndarray:
+        return (rng.random(n_rows) < probability).astype(np.int64)
+
+    age = integers(rng.normal(60, 11.7, n_rows), 40, 95).astype(np.float64)
+    ejection_fraction = integers(rng.normal(38, 11.5, n_rows), 14, 80)
+    serum_creatinine = np.round(
+        np.clip(rng.lognormal(np.log(1.1), 0.45, n_rows), 0.5, 9.4), 1
+    )
+    time = rng.integers(4, 286, n_rows)
+    logit = (
+            -1.1
+            + 0.04 * (age - 60)
+            - 0.05 * (ejection_fraction - 38)
+            + 0.8 * (serum_creatinine - 1.1)
+            - 0.012 * (time - 130)
+    )
+    death_event = (rng.random(n_rows) < 1 / (1 + np.exp(-logit))).astype(np.int64)
+
+    columns = {
+        Column.AGE: age,
+        Column.ANAEMIA: flags(0.47),
+        Column.CREATININE_PHOSPHOKINASE: integers(
+            rng.lognormal(np.log(250), 1.0, n_rows), 23, 7861
+        ),
+        Column.DIABETES: flags(0.44),
+        Column.EJECTION_FRACTION: ejection_fraction,
+        Column.HIGH_BLOOD_PRESSURE: flags(0.36),
+        Column.PLATELETS: np.round(
+            np.clip(rng.normal(265000, 98000, n_rows), 25100, 850000), 2
+        ),
+        Column.SERUM_CREATININE: serum_creatinine,
+        Column.SERUM_SODIUM: integers(rng.normal(137, 4.5, n_rows), 113, 148),
+        Column.SEX: flags(0.65),
+        Column.SMOKING: flags(0.31),
+        Column.TIME: time,
+        Column.DEATH_EVENT: death_event,
+    }
+    return pd.DataFrame({column.value: values for column, values in columns.items()})
@@ -1,9 +1,34 @@
+import os
+import shutil
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Iterator
 
 import pytest
 from heartpredict.data import MLData, ProjectData, FeatureData
 
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def project_workdir(tmp_path_factory: pytest.TempPathFactory) -> Iterator[Path]:
+    """
+    Run the tests in a copy of data and results, so models, scalers and
+    plots written by the tests do not touch the tracked results.
+    """
+    workdir = tmp_path_factory.mktemp("project")
+    shutil.copytree(PROJECT_ROOT / "data", workdir / "data")
+    shutil.copytree(
+        PROJECT_ROOT / "results", workdir / "results",
+        ignore=shutil.ignore_patterns("pipeline", "plots", "profiles", "scores",
+                                      "registry.json", "*.sha256"),
+    )
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        yield workdir
+    finally:
+        os.chdir(previous)
+
 
 @pytest.fixture
 def project_data_func() -> Callable[..., ProjectData]:
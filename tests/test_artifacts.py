@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+from heartpredict.artifacts import (
+    ArtifactWriter,
+    checksum_file,
+    load_artifact,
+    verify_artifact,
+    write_artifact,
+)
+
+
+def test_background_writes_are_atomic_and_checksummed(tmp_path: Path) -> None:
+    writer = ArtifactWriter()
+    target = tmp_path / "models" / "model.joblib"
+    data = np.arange(100_000, dtype=np.float64)
+    writer.save(data, target)
+    writer.save(data * 2, target)
+    writer.wait(target)
+
+    assert sorted(p.name for p in target.parent.iterdir()) == [
+        "model.joblib", "model.joblib.sha256"
+    ]
+    assert checksum_file(target).read_text().endswith("  model.joblib\n")
+    np.testing.assert_array_equal(load_artifact(target), data * 2)
+
+    compressed = tmp_path / "compressed.joblib"
+    ArtifactWriter(compress=True).save(np.zeros(100_000), compressed).result()
+    assert compressed.stat().st_size < target.stat().st_size / 10
+
+    with open(target, "r+b") as f:
+        f.seek(-8, 2)
+        f.write(b"corrupt!")
+    with pytest.raises(ValueError, match="checksum"):
+        verify_artifact(target)
+
+
+def test_failed_write_is_raised_once(tmp_path: Path) -> None:
+    writer = ArtifactWriter()
+    blocked = tmp_path / "file"
+    blocked.write_text("")
+    # The parent of the target is a file, so the write fails
+    writer.save([1, 2, 3], blocked / "model.joblib")
+    with pytest.raises(OSError):
+        writer.wait()
+    writer.wait()
+
+
+def _write_repeatedly(path: Path, value: int) -> None:
+    for i in range(20):
+        write_artifact(np.full(50_000, value * 100 + i), path)
+        load_artifact(path)
+
+
+def test_concurrent_writers_keep_file_and_checksum_consistent(
+        tmp_path: Path
+) -> None:
+    target = tmp_path / "scaler.joblib"
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_write_repeatedly, args=(target, value))
+        for value in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    verify_artifact(target)
+    assert load_artifact(target)[0] % 100 == 19
+    assert len(checksum_file(target).read_text().splitlines()) == 1
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_crash_after_rename_keeps_artifact_valid(
+        tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    target = tmp_path / "model.joblib"
+    write_artifact([1, 2, 3], target)
+    replace = os.replace
+    renamed = []
+
+    def crash_after_artifact(src: Path, dst: Path) -> None:
+        # Die between renaming the artifact and its final checksum
+        if renamed and Path(dst) == checksum_file(target):
+            raise KeyboardInterrupt
+        replace(src, dst)
+        if Path(dst) == target:
+            renamed.append(dst)
+
+    monkeypatch.setattr(os, "replace", crash_after_artifact)
+    with pytest.raises(KeyboardInterrupt):
+        write_artifact([4, 5, 6], target)
+    monkeypatch.undo()
+
+    assert load_artifact(target) == [4, 5, 6]
+    write_artifact([7, 8, 9], target)
+    assert load_artifact(target) == [7, 8, 9]
+    assert len(checksum_file(target).read_text().splitlines()) == 1
@@ -0,0 +1,50 @@
+import importlib.util
+from pathlib import Path
+
+spec = importlib.util.spec_from_file_location(
+    "run_benchmarks", Path("benchmarks/run_benchmarks.py")
+)
+run_benchmarks = importlib.util.module_from_spec(spec)  # type: ignore
+spec.loader.exec_module(run_benchmarks)  # type: ignore
+
+
+def result(seconds: float, peak_memory_bytes: int = 1000) -> dict:
+    return {"seconds": seconds, "peak_memory_bytes": peak_memory_bytes}
+
+
+def test_find_regressions() -> None:
+    baseline = {
+        "load_csv@5000": result(0.1),
+        "query@5000": result(0.001),
+        "profile@5000": result(0.2, 1000),
+    }
+    results = {
+        # within the threshold
+        "load_csv@5000": result(0.12),
+        # slower, but too fast to compare
+        "query@5000": result(0.004),
+        "profile@5000": result(0.2, 2000),
+        # not in the baseline
+        "query@50000": result(10.0),
+    }
+    assert run_benchmarks.find_regressions(results, baseline) == [
+        "profile@5000 peak_memory_bytes: 1000 -> 2000 (+100%)"
+    ]
+
+    results["load_csv@5000"] = result(0.2)
+    regressions = run_benchmarks.find_regressions(results, baseline, threshold=1.5)
+    assert regressions == []
+    assert run_benchmarks.find_regressions(results, baseline)[0].startswith(
+        "load_csv@5000 seconds: 0.1 -> 0.2"
+    )
+
+
+def test_measure_warms_up_before_timing() -> None:
+    calls = []
+    case = run_benchmarks.Case("case", lambda cohort: calls.append(cohort))
+    cohort = run_benchmarks.Cohort(10, Path("x.csv"), None, None, Path("m"))
+
+    measurement = run_benchmarks.measure(case, cohort, repeats=2)
+    # warm-up, two timed runs and the memory run
+    assert len(calls) == 4
+    assert measurement.rows == 10
@@ -0,0 +1,74 @@
+from typing import Callable
+
+import numpy as np
+import pytest
+from heartpredict.backend.ml import PretrainedModel
+from heartpredict.cache import PredictionCache, normalise_rows
+from heartpredict.data import FeatureData
+
+
+def test_prediction_cache_skips_repeated_rows(
+        feature_data_func: Callable[..., FeatureData],
+) -> None:
+    data = feature_data_func()
+    cache = PredictionCache(max_size=10)
+    pretrained_model = PretrainedModel(cache=cache)
+    pretrained_model.load_model(
+        "results/trained_models/classifier/RandomForestClassifier_model_42.joblib"
+    )
+
+    first = pretrained_model.predict_death_event(data)
+    second = pretrained_model.predict_death_event(data)
+    assert list(first) == list(second) == [0, 1, 0]
+    assert cache.stats.misses == 3
+    assert cache.stats.hits == 3
+
+    pretrained_model.load_model(
+        "results/trained_models/regressor/LogisticRegression_model_42.joblib"
+    )
+    assert cache.stats.size == 3
+    assert list(pretrained_model.predict_death_event(data)) == [0, 1, 0]
+    assert cache.stats.misses == 6
+
+    # Switching back to the first model keeps its entries
+    pretrained_model.load_model(
+        "results/trained_models/classifier/RandomForestClassifier_model_42.joblib"
+    )
+    assert list(pretrained_model.predict_death_event(data)) == [0, 1, 0]
+    assert cache.stats.hits == 6
+    assert cache.stats.size == 6
+
+
+def test_prediction_cache_drops_older_versions_of_a_model() -> None:
+    cache = PredictionCache()
+    cache.bind_model("/models/a.joblib:1:10")
+    cache.bind_model("/models/b.joblib:1:10")
+    cache.put("a1", 0, "/models/a.joblib:1:10")
+    cache.put("b1", 1, "/models/b.joblib:1:10")
+    cache.bind_model("/models/a.joblib:2:10")
+    assert cache.get("a1") is None
+    assert cache.get("b1") == 1
+    assert cache.stats.evictions == 1
+
+
+def test_prediction_cache_eviction() -> None:
+    now = [0.0]
+    cache = PredictionCache(max_size=2, ttl=10.0, clock=lambda: now[0])
+    cache.put("a", 0)
+    cache.put("b", 1)
+    assert cache.get("a") == 0
+    cache.put("c", 1)
+    assert cache.get("b") is None
+    assert cache.stats.evictions == 1
+
+    now[0] = 11.0
+    assert cache.get("a") is None
+    assert cache.stats.evictions == 2
+
+
+def test_normalise_rows_rejects_invalid_rows() -> None:
+    with pytest.raises(ValueError):
+        normalise_rows(np.zeros((2, 3)), 12)
+    with pytest.raises(ValueError):
+        normalise_rows(np.full((1, 12), np.nan), 12)
+    assert str(normalise_rows(np.array([[-0.0] * 12]), 12)[0, 0]) == "0.0"
@@ -1,6 +1,11 @@
 from typing import Callable
 
 from heartpredict.backend.correlation import CorrelationBackend, CorrelationMethod
+from heartpredict.backend.significance import (
+    BLOCK_MEMORY_BUDGET,
+    MAX_BLOCK_SIZE,
+    _block_size,
+)
 from heartpredict.data import ProjectData
 from heartpredict.enums import Column
 
@@ -42,4 +47,59 @@ def test_correlation_matrix(project_data_func: Callable[..., ProjectData]) -> No
     spearman_matrix = backend.get_correlation_matrix(CorrelationMethod.SPEARMAN)
     assert spearman_matrix.shape == (13, 13)
     assert spearman_matrix["DEATH_EVENT"].loc["DEATH_EVENT"] == 1.0 
-    assert spearman_matrix["DEATH_EVENT"].loc["serum_creatinine"] == 0.39
\ No newline at end of file
+    assert spearman_matrix["DEATH_EVENT"].loc["serum_creatinine"] == 0.39
+
+def test_correlations_to_death_event(
+        project_data_func: Callable[..., ProjectData]
+) -> None:
+    project_data = project_data_func()
+    backend = CorrelationBackend.build(project_data)
+
+    for method in CorrelationMethod:
+        result = backend.get_correlations_to(method)
+        assert len(result) == 12
+        assert "DEATH_EVENT" not in result.index
+        assert abs(result.iloc[0]) >= abs(result.iloc[-1])
+        for column in Column:
+            if column == Column.DEATH_EVENT:
+                continue
+            expected = project_data.df[column.value].corr(
+                project_data.df[Column.DEATH_EVENT.value], method=method.value
+            )
+            assert abs(result[column.value] - expected) < 1e-10
+
+    by_age = backend.get_correlations_to(
+        CorrelationMethod.SPEARMAN, Column.AGE, [Column.TIME, Column.SMOKING]
+    )
+    assert list(sorted(by_age.index)) == ["smoking", "time"]
+
+
+def test_correlation_significance(
+        project_data_func: Callable[..., ProjectData]
+) -> None:
+    project_data = project_data_func()
+    backend = CorrelationBackend.build(project_data)
+
+    serial = backend.get_correlation_significance(
+        CorrelationMethod.SPEARMAN, 99, 100, n_jobs=1
+    )
+    parallel = backend.get_correlation_significance(
+        CorrelationMethod.SPEARMAN, 99, 100, n_jobs=2
+    )
+    assert serial.p_values.equals(parallel.p_values)
+    assert serial.ci_lower.equals(parallel.ci_lower)
+
+    expected = backend.df.corr(method="spearman")
+    assert (serial.correlation - expected).abs().max().max() < 1e-12
+    assert serial.p_values["DEATH_EVENT"].loc["serum_creatinine"] == 0.01
+    assert serial.p_values.min().min() >= 0.0
+    assert (serial.ci_lower <= serial.correlation + 1e-12).all().all()
+    assert (serial.ci_upper >= serial.correlation - 1e-12).all().all()
+
+
+def test_significance_block_size_fits_memory_budget() -> None:
+    assert _block_size(5000, 13, BLOCK_MEMORY_BUDGET) == MAX_BLOCK_SIZE
+    assert _block_size(1_000_000, 13, BLOCK_MEMORY_BUDGET) == 1
+    size = _block_size(100_000, 13, BLOCK_MEMORY_BUDGET)
+    assert 1 < size < MAX_BLOCK_SIZE
+    assert size * 4 * 8 * 100_000 * 13 <= BLOCK_MEMORY_BUDGET
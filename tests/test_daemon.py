@@ -0,0 +1,80 @@
+import stat
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from heartpredict.cache import prediction_cache
+from heartpredict.cli import app
+from heartpredict.client import send_command
+from heartpredict.daemon import CommandRunner, DaemonServer, run_repl
+
+
+def test_command_runner_captures_output() -> None:
+    runner = CommandRunner(app)
+
+    result = runner.run(["cc", "--column", "serum_creatinine"])
+    assert result.exit_code == 0
+    assert result.stdout.strip().startswith("0.311")
+
+    result = runner.run(["cc", "--column", "nope"])
+    assert result.exit_code == 2
+    assert "nope" in result.stderr
+
+
+def test_daemon_serves_commands(tmp_path: Path) -> None:
+    socket_path = tmp_path / "hp.sock"
+    with DaemonServer(socket_path, CommandRunner(app)) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            for _ in range(2):
+                exit_code, stdout, _ = send_command(
+                    ["bstat", "--bool-col", "smoking"], socket_path
+                )
+                assert exit_code == 0
+                assert "zero=0.6882" in stdout
+        finally:
+            server.shutdown()
+            thread.join()
+
+
+def test_repl(capsys: pytest.CaptureFixture) -> None:
+    lines = iter(["", "cc --column age", "quit", "cc --column time"])
+    run_repl(app, read_line=lambda prompt: next(lines))
+    assert float(capsys.readouterr().out) == pytest.approx(0.24944185728854285)
+
+
+def test_daemon_socket_is_private(tmp_path: Path) -> None:
+    socket_path = tmp_path / "hp.sock"
+    with DaemonServer(socket_path, CommandRunner(app)):
+        assert stat.S_IMODE(socket_path.stat().st_mode) & 0o077 == 0
+
+
+def test_changed_csv_outside_data_is_reloaded(tmp_path: Path) -> None:
+    csv = tmp_path / "records.csv"
+    records = pd.read_csv("data/heart_failure_clinical_records.csv")
+    records.to_csv(csv, index=False)
+    runner = CommandRunner(app)
+    argv = ["--csv", str(csv), "bstat", "--bool-col", "smoking"]
+
+    assert "zero=0.6882" in runner.run(argv).stdout
+    records.assign(smoking=records.index % 2).to_csv(csv, index=False)
+    assert "zero=0.5" in runner.run(argv).stdout
+
+
+def test_predictions_are_cached_between_commands() -> None:
+    runner = CommandRunner(app)
+    argv = [
+        "--csv", "data/example_data_points.csv", "predict_death_event", "--model",
+        "results/trained_models/classifier/RandomForestClassifier_model_42.joblib",
+    ]
+    first = runner.run(argv)
+    hits = prediction_cache.stats.hits
+    second = runner.run(argv)
+    assert first.exit_code == second.exit_code == 0
+    assert "x0: 0\nx1: 1\nx2: 0\nStage timings: " in first.stderr
+    assert "x0: 0\nx1: 1\nx2: 0\nStage timings: " in second.stderr
+    assert prediction_cache.stats.hits == hits + 3
+    # The summary covers only the stages of the command, which were cached
+    assert "predict" not in second.stderr.splitlines()[-1]
@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import Callable
 
 import pandas as pd
@@ -5,9 +6,10 @@ from heartpredict.backend.descriptive import (
     BooleanStatistics,
     DescriptiveBackend,
     DiscreteStatistics,
+    render_distribution_plots,
 )
 from heartpredict.data import ProjectData
-from heartpredict.enums import Column
+from heartpredict.enums import BoolColumn, Column, ImageFormat
 
 
 def test_calculate_boolean_statistics(
@@ -104,3 +106,97 @@ def test_save_variable_distribution(
 
     assert expected_bool["Is smoking"] == actual_bool["Is smoking"]
     assert expected_bool["Not smoking"] == actual_bool["Not smoking"]
+
+
+def test_profile(
+    project_data_func: Callable[..., ProjectData]
+    ) -> None:
+    """
+    Test that the profile matches the per-column statistics
+    """
+
+    project_data = project_data_func()
+    actual_object = DescriptiveBackend(project_data)
+    profile = actual_object.profile()
+
+    assert len(profile.discrete) == 7
+    assert len(profile.boolean) == 6
+    for stats in profile.discrete:
+        expected = actual_object.calculate_discrete_statistics(stats.name)
+        assert stats.minimum == expected.minimum
+        assert stats.maximum == expected.maximum
+        assert stats.median == expected.median
+        assert round(stats.mean, 8) == round(expected.mean, 8)
+        assert round(stats.standard_dev, 8) == round(expected.standard_dev, 8)
+    for stats in profile.boolean:
+        expected_bool = actual_object.calculate_boolean_statistics(stats.name)
+        assert stats.zero == expected_bool.zero
+        assert stats.one == expected_bool.one
+
+    discrete, boolean = profile.to_frames()
+    assert discrete.loc["age", "maximum"] == 95.0
+    assert boolean.loc["smoking", "one"] == 1559 / 5000
+
+
+def test_subgroup_cube(
+    project_data_func: Callable[..., ProjectData]
+    ) -> None:
+    """
+    Test cells and rollups of the subgroup cube against filtered data
+    """
+
+    project_data = project_data_func()
+    actual_object = DescriptiveBackend(project_data)
+    df = actual_object.df
+    cube = actual_object.subgroup_cube(
+        [BoolColumn.DIABETES, BoolColumn.SEX, BoolColumn.SMOKING]
+    )
+
+    # 3^3 subgroups including rollups, 7 discrete columns each
+    assert len(cube.frame) == 27 * 7
+
+    for flags in [{"diabetes": 1, "sex": 0, "smoking": 1}, {"sex": 1}, {}]:
+        subset = df
+        for flag, value in flags.items():
+            subset = subset[subset[flag] == value]
+        cell = cube.cell(**flags)
+        for column in ["ejection_fraction", "platelets"]:
+            values = subset[column]
+            assert cell.loc[column, "count"] == len(values)
+            assert round(cell.loc[column, "mean"], 6) == round(values.mean(), 6)
+            assert round(cell.loc[column, "std"], 6) == round(values.std(), 6)
+            assert cell.loc[column, "min"] == values.min()
+            assert cell.loc[column, "max"] == values.max()
+            bin_width = (df[column].max() - df[column].min()) / 1024
+            assert abs(cell.loc[column, "median"] - values.median()) <= bin_width
+            assert cell.loc[column, "death_rate"] == subset["DEATH_EVENT"].mean()
+
+
+def test_render_distribution_plots(
+    project_data_func: Callable[..., ProjectData], tmp_path: Path
+    ) -> None:
+    """
+    Test batch rendering of subgroup distribution plots
+    """
+
+    project_data = project_data_func()
+    actual_object = DescriptiveBackend(project_data)
+    distributions = actual_object.subgroup_distributions(
+        Column.SMOKING, [BoolColumn.SEX]
+    )
+    assert distributions[(0,)] == {"Not smoking": 1701, "Is smoking": 71}
+
+    jobs = actual_object.distribution_plot_jobs(
+        [Column.SMOKING, Column.AGE], [BoolColumn.SEX], tmp_path, ImageFormat.SVG
+    )
+    written = render_distribution_plots(jobs, n_jobs=2)
+    assert len(written) == 4
+    assert (tmp_path / "age__sex=1.svg").exists()
+    assert all(path.stat().st_size > 0 for path in written)
+
+    jobs = actual_object.distribution_plot_jobs(
+        [Column.AGE], [BoolColumn.HIGH_BLOOD_PRESSURE, BoolColumn.SEX], tmp_path
+    )
+    _, title, output_file = jobs[-1]
+    assert title == "age (high_blood_pressure=1, sex=1)"
+    assert output_file.name == "age__high_blood_pressure=1__sex=1.png"
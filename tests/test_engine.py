@@ -0,0 +1,126 @@
+import importlib.util
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from heartpredict.backend.correlation import CorrelationBackend
+from heartpredict.backend.descriptive import DescriptiveBackend
+from heartpredict.data import MLData, ProjectData
+from heartpredict.engine import get_engine
+from heartpredict.enums import BoolColumn, Column, CorrelationMethod, DataFrameEngine
+
+CSV = Path("data/heart_failure_clinical_records.csv")
+OPTIONAL = {DataFrameEngine.ARROW: "pyarrow", DataFrameEngine.POLARS: "polars"}
+
+
+@pytest.fixture(params=list(DataFrameEngine))
+def engine(request: pytest.FixtureRequest) -> DataFrameEngine:
+    if request.param in OPTIONAL:
+        pytest.importorskip(OPTIONAL[request.param])
+    return request.param
+
+
+def test_engine_results_match_pandas(engine: DataFrameEngine) -> None:
+    expected = ProjectData(CSV)
+    data = ProjectData(CSV, engine)
+    pd.testing.assert_frame_equal(data.df, expected.df)
+    assert data.dataset_hash == expected.dataset_hash
+
+    descriptive = DescriptiveBackend(data)
+    reference = DescriptiveBackend(expected)
+    pd.testing.assert_frame_equal(
+        descriptive.create_conditional_dataset("age", 60, ">").reset_index(drop=True),
+        reference.create_conditional_dataset("age", 60, ">").reset_index(drop=True),
+    )
+    assert descriptive.save_variable_distribution(Column.SMOKING) == (
+        reference.save_variable_distribution(Column.SMOKING)
+    )
+    assert descriptive.calculate_boolean_statistics("diabetes") == (
+        reference.calculate_boolean_statistics("diabetes")
+    )
+    flags = [BoolColumn.SEX, BoolColumn.SMOKING]
+    assert descriptive.subgroup_distributions(Column.DIABETES, flags) == (
+        reference.subgroup_distributions(Column.DIABETES, flags)
+    )
+
+    for method in (CorrelationMethod.PEARSON, CorrelationMethod.SPEARMAN):
+        pd.testing.assert_frame_equal(
+            CorrelationBackend(data).get_correlation_matrix(method),
+            CorrelationBackend(expected).get_correlation_matrix(method),
+        )
+
+    ml_data = MLData(data, 0.2, 42, save_scaler=False)
+    np.testing.assert_array_equal(
+        ml_data.dataset.x, MLData(expected, 0.2, 42, save_scaler=False).dataset.x
+    )
+
+
+def test_feature_matrix_is_float64() -> None:
+    data = ProjectData(CSV)
+    engine = data.engine
+    x = engine.to_numpy(data.frame, ["age", "time"])
+    assert x.dtype == np.float64
+    np.testing.assert_array_equal(x[:, 1], data.df["time"])
+    # Single columns are views of the loaded data
+    assert np.shares_memory(engine.column(data.frame, "time"), data.df["time"])
+
+
+@pytest.mark.parametrize("engine", list(OPTIONAL))
+def test_missing_engine_dependency(engine: DataFrameEngine) -> None:
+    if importlib.util.find_spec(OPTIONAL[engine]) is not None:
+        pytest.skip(f"{OPTIONAL[engine]} is installed")
+    with pytest.raises(ImportError, match=f"heartpredict\\[{engine.value}\\]"):
+        get_engine(engine)
+
+
+def test_engines_pickle_and_filter_alike(engine: DataFrameEngine) -> None:
+    data = pickle.loads(pickle.dumps(ProjectData(CSV, engine)))
+    descriptive = DescriptiveBackend(data)
+    reference = DescriptiveBackend(ProjectData(CSV))
+
+    for rel in ("==", "!=", "<", "<=", ">", ">="):
+        expected = reference.create_conditional_dataset("age", 60, rel)
+        pd.testing.assert_frame_equal(
+            descriptive.create_conditional_dataset("age", 60, rel), expected
+        )
+        # Filtering a subset gives the same rows and labels
+        pd.testing.assert_frame_equal(
+            descriptive.create_conditional_dataset("age", 60, rel, reference.df),
+            expected,
+        )
+    with pytest.raises(ValueError, match="Unknown relation"):
+        descriptive.create_conditional_dataset("age", 60, "=<")
+
+
+def test_engines_skip_missing_values_like_pandas(
+        engine: DataFrameEngine, tmp_path: Path
+) -> None:
+    records = pd.read_csv(CSV).head(300)
+    records.loc[::7, "age"] = np.nan
+    records.loc[::11, "serum_sodium"] = np.nan
+    records.loc[::13, "smoking"] = np.nan
+    csv = tmp_path / "missing.csv"
+    records.to_csv(csv, index=False)
+    data = ProjectData(csv, engine)
+
+    correlation = CorrelationBackend(data)
+    for method in CorrelationMethod:
+        pd.testing.assert_frame_equal(
+            correlation.get_correlation_matrix(method),
+            records.corr(method=method.value).round(2),
+        )
+        expected = records.drop(columns="DEATH_EVENT").corrwith(
+            records["DEATH_EVENT"], method=method.value
+        )
+        result = correlation.get_correlations_to(method)
+        np.testing.assert_allclose(result[expected.index], expected, atol=1e-10)
+
+    descriptive = DescriptiveBackend(data)
+    age = descriptive.calculate_discrete_statistics("age")
+    assert age.mean == pytest.approx(records["age"].mean())
+    assert age.standard_dev == pytest.approx(records["age"].std())
+    assert age.median == records["age"].median()
+    profile = {s.name: s for s in descriptive.profile().boolean}
+    assert profile["smoking"].zero == (records["smoking"] == 0).mean()
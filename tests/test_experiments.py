@@ -0,0 +1,35 @@
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from heartpredict.backend.experiments import run_seed_experiment
+from heartpredict.data import ProjectData
+from heartpredict.enums import ModelType
+
+
+def test_seed_experiment_matches_single_runs(
+        project_data_func: Callable[..., ProjectData],
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    project_data = project_data_func()
+    monkeypatch.chdir(tmp_path)
+    result = run_seed_experiment(
+        project_data, [42, 7], ModelType.REGRESSOR, n_jobs=2
+    )
+
+    assert result.score_name == "Root Mean Squared Error"
+    assert list(result.scores.index) == [42, 7]
+    assert set(result.scores.columns) == {
+        "LogisticRegression", "LogisticRegressionCV"
+    }
+    # Same split and selection as train_regression --seed 42
+    assert round(result.scores.loc[42].min(), 3) == 0.386
+    assert result.selected.loc[42] == result.scores.loc[42].idxmin()
+
+    summary = result.summary()
+    assert summary["selected"].sum() == 2
+    assert summary["selection_frequency"].sum() == pytest.approx(1.0)
+    assert {"mean", "std", "min", "max"} <= set(summary.columns)
+    # Nothing is saved or registered
+    assert list(tmp_path.iterdir()) == []
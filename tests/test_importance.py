@@ -0,0 +1,81 @@
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from heartpredict.backend.importance import infer_model_type, permutation_importance
+from heartpredict.backend.ml import PretrainedModel
+from heartpredict.data import MLData, ProjectData
+from heartpredict.enums import Column, ModelType
+from sklearn.linear_model import LinearRegression, LogisticRegression
+
+
+class FirstFeatureModel:
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        return (x[:, 0] > 0).astype(np.int64)
+
+
+def test_permutation_importance_finds_the_used_feature() -> None:
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(500, 3))
+    y = (x[:, 0] > 0).astype(np.int64)
+    features = ["used", "unused", "noise"]
+
+    serial = permutation_importance(
+        FirstFeatureModel(), x, y, n_repeats=4, n_jobs=1, features=features
+    )
+    parallel = permutation_importance(
+        FirstFeatureModel(), x, y, n_repeats=4, n_jobs=2, features=features
+    )
+    np.testing.assert_array_equal(serial.importances, parallel.importances)
+    assert serial.importances.shape == (3, 4)
+    assert serial.baseline_score == 1.0
+
+    frame = serial.to_frame()
+    assert frame.index[0] == "used"
+    assert 0.4 < frame.loc["used", "importance_mean"] < 0.6
+    assert (frame.loc[["unused", "noise"]] == 0).all().all()
+
+    regressor = permutation_importance(
+        FirstFeatureModel(), x, y, ModelType.REGRESSOR, n_repeats=2,
+        n_jobs=1, features=features,
+    )
+    assert regressor.score_name == "Root Mean Squared Error"
+    assert regressor.to_frame().index[0] == "used"
+    assert (regressor.importances[0] > 0).all()
+
+
+def test_permutation_importance_of_trained_classifier(
+        ml_data_func: Callable[..., MLData],
+) -> None:
+    data = ml_data_func(random_seed=42)
+    pretrained_model = PretrainedModel()
+    pretrained_model.load_model(
+        "results/trained_models/classifier/RandomForestClassifier_model_42.joblib"
+    )
+    importance = permutation_importance(
+        pretrained_model.model, data.valid.x, data.valid.y, n_repeats=2, n_jobs=1
+    )
+    frame = importance.to_frame()
+    assert len(frame) == len(Column) - 1
+    assert frame.index[0] == Column.TIME.value
+
+
+def test_infer_model_type() -> None:
+    regressor = Path("results/trained_models/regressor/"
+                     "LogisticRegression_model_42.joblib")
+    # The stored regressors are sklearn classifiers
+    assert infer_model_type(regressor, LogisticRegression()) == ModelType.REGRESSOR
+    assert infer_model_type(Path("m.joblib"), LinearRegression()) == (
+        ModelType.REGRESSOR
+    )
+    assert infer_model_type(Path("m.joblib"), LogisticRegression()) == (
+        ModelType.CLASSIFIER
+    )
+
+
+def test_importance_reuses_the_cached_split(
+        project_data_func: Callable[..., ProjectData],
+) -> None:
+    project_data = project_data_func()
+    data = MLData.build(project_data, 0.2, 42)
+    assert MLData.build(project_data, 0.2, 42, False) is data
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+from heartpredict.backend.kaplan_meier import (
+    bootstrap_survival_bands,
+    factorize_groups,
+    kaplan_meier_by_group,
+    logrank_test,
+    pairwise_logrank_tests,
+)
+from lifelines import KaplanMeierFitter
+from lifelines.statistics import logrank_test as lifelines_logrank_test
+from lifelines.statistics import multivariate_logrank_test
+
+
+def assert_matches_lifelines(durations, events, groups) -> None:
+    codes, labels = factorize_groups(groups)
+    tables = kaplan_meier_by_group(durations, events, codes, labels)
+    frame = pd.DataFrame({"t": durations, "e": events, "g": groups})
+
+    for group, subset in frame.groupby("g", observed=True):
+        kmf = KaplanMeierFitter().fit(subset["t"], subset["e"].astype(bool))
+        table = tables[group]
+        np.testing.assert_allclose(table.timeline, kmf.timeline)
+        np.testing.assert_allclose(table.survival, kmf.survival_function_.iloc[:, 0])
+        np.testing.assert_allclose(table.at_risk, kmf.event_table["at_risk"])
+        np.testing.assert_allclose(table.observed, kmf.event_table["observed"])
+        np.testing.assert_allclose(table.censored, kmf.event_table["censored"])
+        np.testing.assert_allclose(
+            table.ci_lower, kmf.confidence_interval_.iloc[:, 0], atol=1e-12
+        )
+        np.testing.assert_allclose(
+            table.ci_upper, kmf.confidence_interval_.iloc[:, 1], atol=1e-12
+        )
+
+
+def test_kaplan_meier_matches_lifelines_on_dataset() -> None:
+    df = pd.read_csv("data/heart_failure_clinical_records.csv")
+    groups = pd.qcut(
+        df["serum_creatinine"].rank(method="first"),
+        q=3,
+        labels=["Low Risk", "Medium Risk", "High Risk"],
+    )
+    assert_matches_lifelines(
+        df["time"].to_numpy(), df["DEATH_EVENT"].to_numpy(), groups
+    )
+
+
+def test_kaplan_meier_matches_lifelines_with_ties_and_zero_times() -> None:
+    rng = np.random.default_rng(42)
+    durations = rng.integers(0, 20, size=400).astype(float)
+    events = rng.integers(0, 2, size=400)
+    groups = rng.choice(["a", "b", "c", "d"], size=400)
+    assert_matches_lifelines(durations, events, groups)
+
+    # A group in which every subject dies drops its survival to zero.
+    assert_matches_lifelines(
+        np.array([1.0, 2.0, 2.0, 3.0]), np.array([1, 1, 1, 0]), ["x", "x", "x", "y"]
+    )
+
+
+def test_logrank_tests_match_lifelines() -> None:
+    rng = np.random.default_rng(1)
+    durations = rng.integers(1, 50, size=500).astype(float)
+    events = rng.integers(0, 2, size=500)
+    codes = rng.integers(0, 3, size=500)
+    codes[durations > 40] = 2
+
+    result = logrank_test(durations, events, codes, ["a", "b", "c"])
+    expected = multivariate_logrank_test(durations, codes, events)
+    assert result.degrees_of_freedom == 2
+    np.testing.assert_allclose(result.test_statistic, expected.test_statistic)
+    np.testing.assert_allclose(result.p_value, expected.p_value)
+
+    pairwise = pairwise_logrank_tests(durations, events, codes, ["a", "b", "c"])
+    assert [r.groups for r in pairwise] == [("a", "b"), ("a", "c"), ("b", "c")]
+    a, b = codes == 0, codes == 1
+    expected = lifelines_logrank_test(
+        durations[a], durations[b], events[a], events[b]
+    )
+    np.testing.assert_allclose(pairwise[0].test_statistic, expected.test_statistic)
+
+
+def test_bootstrap_bands_are_deterministic_and_cover_the_estimate() -> None:
+    rng = np.random.default_rng(2)
+    durations = rng.integers(1, 30, size=300).astype(float)
+    events = rng.integers(0, 2, size=300)
+    codes = rng.integers(0, 2, size=300)
+
+    serial = bootstrap_survival_bands(
+        durations, events, codes, [0, 1], n_resamples=300, batch_size=64, n_jobs=1
+    )
+    parallel = bootstrap_survival_bands(
+        durations, events, codes, [0, 1], n_resamples=300, batch_size=64, n_jobs=2
+    )
+    tables = kaplan_meier_by_group(durations, events, codes, [0, 1])
+    for group in [0, 1]:
+        np.testing.assert_array_equal(serial[group].lower, parallel[group].lower)
+        np.testing.assert_array_equal(serial[group].timeline, tables[group].timeline)
+        assert (serial[group].lower <= tables[group].survival + 1e-12).all()
+        assert (serial[group].upper >= tables[group].survival - 1e-12).all()
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from heartpredict.backend import kendall
+from heartpredict.backend.kendall import (
+    count_inversions,
+    dense_ranks,
+    kendall_matrix,
+    kendall_tau_b,
+)
+
+
+def test_count_inversions_matches_brute_force() -> None:
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        values = rng.integers(0, 5, size=rng.integers(1, 40))
+        expected = sum(
+            1
+            for i in range(len(values))
+            for j in range(i + 1, len(values))
+            if values[i] > values[j]
+        )
+        assert count_inversions(values) == expected
+
+
+def test_kendall_matrix_matches_pandas() -> None:
+    df = pd.read_csv("data/heart_failure_clinical_records.csv")
+    expected = df.corr(method="kendall").to_numpy()
+    np.testing.assert_allclose(
+        kendall_matrix(df.to_numpy(dtype=float), n_jobs=2), expected, atol=1e-12
+    )
+
+
+def test_kendall_tau_b_with_missing_and_constant_values() -> None:
+    x = np.array([1.0, 2.0, np.nan, 4.0, 4.0, 6.0])
+    y = np.array([2.0, 1.0, 3.0, 5.0, 5.0, 4.0])
+    expected = pd.Series(x).corr(pd.Series(y), method="kendall")
+    assert abs(kendall_tau_b(dense_ranks(x), dense_ranks(y)) - expected) < 1e-12
+    assert np.isnan(kendall_tau_b(dense_ranks(np.ones(5)), dense_ranks(np.arange(5))))
+
+
+def test_kendall_matrix_is_serial_on_small_data(
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    requested = []
+
+    def run_tasks(func, tasks, n_jobs, initializer, initargs):  # type: ignore
+        requested.append(n_jobs)
+        initializer(*initargs)
+        return [func(*task) for task in tasks]
+
+    monkeypatch.setattr(kendall, "run_tasks", run_tasks)
+    monkeypatch.setattr(kendall, "PARALLEL_MIN_PAIR_ROWS", 300)
+    kendall_matrix(np.ones((100, 2)))
+    kendall_matrix(np.ones((100, 4)))
+    kendall_matrix(np.ones((10, 3)), n_jobs=2)
+    assert requested == [1, None, 2]
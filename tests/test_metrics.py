@@ -0,0 +1,65 @@
+import tracemalloc
+from typing import Callable
+
+from heartpredict.backend.ml import PretrainedModel
+from heartpredict.data import FeatureData
+from heartpredict.metrics import Instrumentation, metrics
+
+
+def test_stage_metrics_export() -> None:
+    instrumentation = Instrumentation()
+    with instrumentation.stage("predict", rows=3):
+        pass
+    with instrumentation.stage("predict") as record:
+        record.rows = 2
+
+    stage = instrumentation.snapshot()[0]
+    assert stage.calls == 2
+    assert stage.rows == 5
+    assert stage.max_seconds >= stage.last_seconds >= 0.0
+
+    prometheus = instrumentation.to_prometheus()
+    assert 'heartpredict_stage_rows_total{stage="predict"} 5' in prometheus
+    assert "# TYPE heartpredict_stage_seconds_total counter" in prometheus
+    assert '"stage": "predict"' in instrumentation.to_json()
+    assert instrumentation.summary().startswith("predict ")
+    assert instrumentation.summary().endswith("s (5 rows)")
+    assert Instrumentation().summary() == ""
+
+
+def test_prediction_path_is_instrumented(
+        feature_data_func: Callable[..., FeatureData],
+) -> None:
+    metrics.reset()
+    pretrained_model = PretrainedModel()
+    pretrained_model.load_model(
+        "results/trained_models/classifier/RandomForestClassifier_model_42.joblib"
+    )
+    pretrained_model.predict_death_event(feature_data_func())
+
+    stages = {m.stage: m for m in metrics.snapshot()}
+    assert stages["load_model"].calls == 1
+    assert stages["predict"].rows == 3
+
+
+def test_stage_memory_is_attributed_while_tracing() -> None:
+    instrumentation = Instrumentation()
+    tracemalloc.start()
+    try:
+        with instrumentation.collect() as collected:
+            with instrumentation.stage("outer"):
+                with instrumentation.stage("inner"):
+                    block = bytearray(4_000_000)
+                    del block
+                kept = bytearray(1_000_000)
+    finally:
+        tracemalloc.stop()
+    del kept
+
+    stages = {m.stage: m for m in instrumentation.snapshot()}
+    assert stages["inner"].memory_peak_bytes >= 4_000_000
+    assert abs(stages["inner"].memory_net_bytes) < 100_000
+    # The peak of a nested stage counts for the enclosing stage as well
+    assert stages["outer"].memory_peak_bytes >= 4_000_000
+    assert stages["outer"].memory_net_bytes >= 1_000_000
+    assert {m.stage for m in collected.snapshot()} == {"inner", "outer"}
@@ -1,8 +1,11 @@
+from pathlib import Path
 from typing import Callable
 
 import pytest
 from heartpredict.data import MLData, FeatureData
-from heartpredict.backend.ml import MLBackend, PretrainedModel
+from heartpredict.backend.ml import MLBackend, PretrainedEnsemble, PretrainedModel
+from heartpredict.artifacts import sha256_digest
+from heartpredict.registry import ModelRegistry, RegistryEntry
 
 from sklearn.metrics import root_mean_squared_error
 
@@ -139,3 +142,69 @@ def test_predict_death_event(
     assert result[0] == 0
     assert result[1] == 1
     assert result[2] == 0
+
+
+def test_predict_death_event_with_ensemble(
+        feature_data_func: Callable[..., FeatureData],
+) -> None:
+    data = feature_data_func()
+    ensemble = PretrainedEnsemble()
+    ensemble.load_models(
+        sorted(Path("results/trained_models/classifier").glob("*_model_42.joblib"))
+    )
+    result = ensemble.predict_death_event(data)
+
+    assert result.predictions.shape == (3, 5)
+    assert result.probabilities.shape == (3, 5)
+    assert list(result.majority_vote) == [0, 1, 0]
+    assert result.soft_vote[1] > 0.5 > result.soft_vote[0]
+    assert list(result.to_frame().columns[-2:]) == ["soft_vote", "majority_vote"]
+
+
+def test_find_or_train_regressor_reuses_registered_model(
+        ml_data_func: Callable[..., MLData], tmp_path: Path
+) -> None:
+    data = ml_data_func(random_seed=42)
+    registry = ModelRegistry(tmp_path / "registry.json")
+    backend = MLBackend(data, registry)
+    model_file = Path(
+        "results/trained_models/regressor/LogisticRegression_model_42.joblib"
+    )
+    assert registry.find_best("regressor", data.project_data.dataset_hash,
+                              42, 0.2) is None
+
+    registry.register(RegistryEntry(
+        model_type="regressor",
+        dataset_hash=data.project_data.dataset_hash,
+        random_seed=42,
+        test_size=0.2,
+        model_name="LogisticRegression",
+        score_name="Root Mean Squared Error",
+        score=0.386,
+        model_file=str(model_file),
+        model_sha256=sha256_digest(model_file),
+    ))
+    assert backend.find_or_train_regressor() == model_file
+    assert registry.find_best("regressor", "other-data", 42, 0.2) is None
+
+
+def test_registry_ignores_replaced_model_file(tmp_path: Path) -> None:
+    registry = ModelRegistry(tmp_path / "registry.json")
+    model_file = tmp_path / "LogisticRegression_model_42.joblib"
+    model_file.write_bytes(b"trained on dataset a")
+    registry.register(RegistryEntry(
+        model_type="regressor",
+        dataset_hash="a",
+        random_seed=42,
+        test_size=0.2,
+        model_name="LogisticRegression",
+        score_name="Root Mean Squared Error",
+        score=0.386,
+        model_file=str(model_file),
+        model_sha256=sha256_digest(model_file),
+    ))
+    assert registry.find_best("regressor", "a", 42, 0.2) is not None
+
+    # Training on another dataset with the same seed overwrites the file
+    model_file.write_bytes(b"trained on dataset b")
+    assert registry.find_best("regressor", "a", 42, 0.2) is None
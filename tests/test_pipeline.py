@@ -0,0 +1,90 @@
+import importlib.metadata
+from pathlib import Path
+
+import pytest
+from heartpredict.pipeline import (
+    SCALER_FILE,
+    ArtifactCache,
+    load_pipeline,
+    run_pipeline,
+)
+
+REGRESSOR = "results/trained_models/regressor/LogisticRegression_model_42.joblib"
+
+
+def write_spec(tmp_path: Path, age_command: str = "dstat --disc-col age") -> Path:
+    spec = tmp_path / "pipeline.toml"
+    spec.write_text(f"""
+csv = "data/heart_failure_clinical_records.csv"
+
+[steps.tables]
+command = "kmplot --no-plot --regressor {REGRESSOR} --tables {tmp_path}/km.json"
+inputs = ["{REGRESSOR}"]
+outputs = ["{tmp_path}/km.json"]
+
+[steps.plot]
+command = "kmrender --tables {tmp_path}/km.json --output {tmp_path}/km.png"
+needs = ["tables"]
+outputs = ["{tmp_path}/km.png"]
+
+[steps.age]
+command = "{age_command}"
+""")
+    return spec
+
+
+def test_pipeline_caches_steps(tmp_path: Path) -> None:
+    cache = ArtifactCache(tmp_path / "cache")
+
+    report = run_pipeline(load_pipeline(write_spec(tmp_path)), cache, n_jobs=2)
+    assert [(s.name, s.status) for s in report.steps] == [
+        ("age", "ran"), ("tables", "ran"), ("plot", "ran")
+    ]
+    assert "minimum=" in report.steps[0].stdout
+
+    # unchanged inputs are skipped, deleted outputs restored from the cache
+    (tmp_path / "km.png").unlink()
+    report = run_pipeline(load_pipeline(write_spec(tmp_path)), cache)
+    assert {s.name: s.status for s in report.steps} == {
+        "age": "cached", "tables": "cached", "plot": "restored"
+    }
+    assert (tmp_path / "km.png").exists()
+    assert "minimum=" in report.steps[0].stdout
+
+    spec = write_spec(tmp_path, "dstat --disc-col time")
+    report = run_pipeline(load_pipeline(spec), cache)
+    assert {s.name: s.status for s in report.steps}["age"] == "ran"
+
+
+def test_pipeline_reports_failures(tmp_path: Path) -> None:
+    spec = write_spec(tmp_path, "dstat --disc-col nope")
+    report = run_pipeline(load_pipeline(spec), ArtifactCache(tmp_path / "cache"))
+    assert {s.name: s.status for s in report.steps}["age"] == "failed"
+    assert not report.succeeded
+
+    spec.write_text("""
+[steps.a]
+command = "version"
+needs = ["b"]
+
+[steps.b]
+command = "version"
+needs = ["a"]
+""")
+    with pytest.raises(ValueError):
+        load_pipeline(spec)
+
+
+def test_shared_ml_steps_and_versioned_keys(
+        tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pipeline = load_pipeline(write_spec(tmp_path))
+    tables, age = pipeline.steps["tables"], pipeline.steps["age"]
+    assert tables.shared and not age.shared
+    # kmplot writes the shared scaler, so it is cached with the step
+    assert tables.outputs == (f"{tmp_path}/km.json", SCALER_FILE)
+
+    cache = ArtifactCache(tmp_path / "cache")
+    key = cache.step_key(age, pipeline.csv, {})
+    monkeypatch.setattr(importlib.metadata, "version", lambda name: "99.0")
+    assert cache.step_key(age, pipeline.csv, {}) != key
@@ -0,0 +1,45 @@
+import json
+from pathlib import Path
+
+import pytest
+from heartpredict.enums import ProfileMode
+from heartpredict.metrics import metrics
+from heartpredict.profiling import Profiler, compare_profiles
+
+
+def test_profile_report_attributes_stages(
+        tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Source paths are reported relative to the project
+    monkeypatch.chdir(Path(__file__).resolve().parents[1])
+    reports = []
+    for size in (1_000_000, 3_000_000):
+        profiler = Profiler(ProfileMode.BOTH, "cc", tmp_path / str(size))
+        profiler.start()
+        with metrics.stage("fit", rows=10):
+            sum(bytearray(size))
+        reports.append(profiler.stop())
+
+    report = json.loads(reports[0].read_text())
+    assert report["command"] == "cc"
+    assert report["stages"]["fit"]["rows"] == 10
+    assert report["stages"]["fit"]["memory_peak_bytes"] >= 1_000_000
+    assert report["memory_peak_bytes"] >= 1_000_000
+    functions = [f["function"] for f in report["functions"]]
+    assert any("heartpredict/metrics.py" in function for function in functions)
+    assert not any(function.startswith(str(Path.cwd())) for function in functions)
+    assert reports[0].with_suffix(".prof").exists()
+
+    comparison = compare_profiles(reports[0], reports[1])
+    assert list(comparison.index) == ["fit", "total"]
+    assert comparison.loc["fit", "change_memory_peak_bytes"] >= 1_900_000
+
+
+def test_cpu_profile_has_no_memory(tmp_path: Path) -> None:
+    profiler = Profiler(ProfileMode.CPU, "dstat", tmp_path)
+    profiler.start()
+    with metrics.stage("load_csv"):
+        pass
+    report = json.loads(profiler.stop().read_text())
+    assert "memory_peak_bytes" not in report
+    assert set(report["stages"]["load_csv"]) == {"calls", "rows", "seconds"}
@@ -0,0 +1,65 @@
+from typing import Callable
+
+import numpy as np
+import pytest
+from heartpredict.backend.descriptive import DescriptiveBackend
+from heartpredict.backend.query import BitmapIndex, Predicate, parse_query
+from heartpredict.data import ProjectData
+
+
+def test_parse_query() -> None:
+    parsed = parse_query("age > 60 and smoking == 1 or sex != 0")
+    assert parsed == [
+        [Predicate("age", ">", 60.0), Predicate("smoking", "==", 1.0)],
+        [Predicate("sex", "!=", 0.0)],
+    ]
+    with pytest.raises(ValueError):
+        parse_query("age >> 60")
+
+
+def test_query_matches_pandas(project_data_func: Callable[..., ProjectData]) -> None:
+    project_data = project_data_func()
+    backend = DescriptiveBackend(project_data)
+    df = backend.df
+
+    for query in [
+        "age > 60 and smoking == 1 and sex == 0",
+        "age >= 60.5",
+        "platelets < 263358.03 or diabetes != 0",
+        "serum_creatinine == 1.1",
+        "time != 113 and anaemia <= 0",
+        "ejection_fraction > 1000",
+    ]:
+        result = backend.query(query)
+        expected = df.query(query).index.to_numpy()
+        assert np.array_equal(result.indices(), expected)
+        assert len(result) == len(expected)
+
+    older = backend.query("age > 60")
+    refined = older.filter("smoking == 1").filter("sex == 0")
+    assert len(refined) == 34
+    assert refined.materialize().equals(
+        df[(df.age > 60) & (df.smoking == 1) & (df.sex == 0)]
+    )
+    assert len(~older) == len(df) - len(older)
+
+
+def test_missing_values_match_pandas(
+        project_data_func: Callable[..., ProjectData]
+) -> None:
+    df = project_data_func().df.head(200).copy()
+    df.loc[::7, "smoking"] = np.nan
+    df.loc[::5, "age"] = np.nan
+    index = BitmapIndex(df)
+
+    for query in [
+        "smoking != 1",
+        "smoking != 0.5",
+        "smoking == 0",
+        "age != 60",
+        "age != 60 and smoking != 0",
+        "age > 60 or smoking == 1",
+        "age <= 60",
+    ]:
+        expected = np.flatnonzero(df.eval(query).to_numpy())
+        assert np.array_equal(index.query(query).indices(), expected), query
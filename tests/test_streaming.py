@@ -0,0 +1,156 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from heartpredict.backend.correlation import (
+    StreamingCorrelationBackend,
+    combine_accumulators,
+)
+from heartpredict.backend.descriptive import (
+    DescriptiveBackend,
+    StreamingDescriptiveBackend,
+)
+from heartpredict.backend.sketches import FrequencySketch, KLLSketch
+from heartpredict.backend.streaming import (
+    ColumnSummary,
+    PearsonAccumulator,
+    SpearmanAccumulator,
+    load_accumulator,
+    save_accumulator,
+)
+from heartpredict.data import ProjectData
+from heartpredict.enums import Column, CorrelationMethod, DiscreteColumn
+
+CSV = Path("data/heart_failure_clinical_records.csv")
+
+
+def test_pearson_accumulator_merges_shards(tmp_path: Path) -> None:
+    df = pd.read_csv(CSV)
+    shards = []
+    for start in (0, 1700, 3400):
+        accumulator = PearsonAccumulator(list(df.columns))
+        for offset in range(0, 1700, 500):
+            begin = start + offset
+            accumulator.update(df.iloc[begin:min(begin + 500, start + 1700)])
+        save_accumulator(accumulator, tmp_path / f"shard{len(shards)}.json")
+        shards.append(load_accumulator(tmp_path / f"shard{len(shards)}.json"))
+
+    combined = combine_accumulators(shards)
+    assert combined.n == 5000
+    np.testing.assert_allclose(combined.correlation(), df.corr(), atol=1e-12)
+
+
+def test_streaming_spearman_is_close_to_exact() -> None:
+    df = pd.read_csv(CSV)
+    backend = StreamingCorrelationBackend(CSV, chunksize=700)
+
+    spearman = backend.accumulate(CorrelationMethod.SPEARMAN)
+    assert isinstance(spearman, SpearmanAccumulator)
+    np.testing.assert_allclose(
+        spearman.correlation(), df.corr(method="spearman"), atol=0.02
+    )
+    assert abs(
+        backend.get_column_correlation_to_death_event(
+            Column.SERUM_CREATININE, CorrelationMethod.PEARSON
+        ) - 0.3112813958
+    ) < 1e-9
+
+    restored = SpearmanAccumulator.from_dict(spearman.to_dict())
+    restored.merge(SpearmanAccumulator.from_dict(spearman.to_dict()))
+    assert restored.pearson.n == 10000
+
+
+def test_kll_sketch_quantiles_and_merge() -> None:
+    values = np.random.default_rng(0).normal(size=200_000)
+    left, right = KLLSketch(200), KLLSketch(200)
+    left.update(values[:120_000])
+    right.update(values[120_000:])
+    left.merge(KLLSketch.from_dict(right.to_dict()))
+
+    assert left.n == len(values)
+    for q in (0.1, 0.5, 0.9):
+        assert abs(np.mean(values <= left.quantile(q)) - q) < 0.02
+
+
+def test_streaming_descriptive_statistics() -> None:
+    streaming = StreamingDescriptiveBackend(CSV, chunksize=700, error_bound=0.01)
+    exact = DescriptiveBackend(ProjectData(CSV))
+
+    for column in DiscreteColumn:
+        approx = streaming.calculate_discrete_statistics(column.value)
+        expected = exact.calculate_discrete_statistics(column.value)
+        assert approx.minimum == expected.minimum
+        assert approx.maximum == expected.maximum
+        np.testing.assert_allclose(approx.mean, expected.mean, rtol=1e-12)
+        np.testing.assert_allclose(
+            approx.standard_dev, expected.standard_dev, rtol=1e-12
+        )
+        values = exact.df[column.value]
+        # the median's rank interval must come within the error bound of n / 2
+        assert (values < approx.median).mean() <= 0.5 + 0.01
+        assert (values <= approx.median).mean() >= 0.5 - 0.01
+
+    assert streaming.calculate_boolean_statistics("smoking") == (
+        exact.calculate_boolean_statistics("smoking")
+    )
+    assert streaming.save_variable_distribution(Column.AGE) == (
+        exact.save_variable_distribution(Column.AGE)
+    )
+
+
+def test_column_summaries_merge_and_bound_counts() -> None:
+    df = pd.read_csv(CSV)
+    summaries = []
+    for start in (0, 2500):
+        summary = ColumnSummary("age", max_distinct=10)
+        summary.update(df["age"].iloc[start:start + 2500])
+        summaries.append(ColumnSummary.from_dict(summary.to_dict()))
+    summaries[0].merge(summaries[1])
+    merged = summaries[0]
+
+    assert merged.n == 5000
+    assert not merged.frequencies.exact
+    assert len(merged.distribution()) == 10
+    expected = df["age"].value_counts()
+    for value, count in merged.distribution().items():
+        # count-min never undercounts
+        assert expected[value] <= count <= expected[value] + 0.01 * 5000
+
+    sketch = FrequencySketch()
+    sketch.update(np.array([0, 1, 1, np.nan]))
+    assert sketch.exact and sketch.distribution() == {1.0: 2, 0.0: 1}
+
+
+def test_spearman_merges_shards_of_different_workers(tmp_path: Path) -> None:
+    df = pd.read_csv(CSV)
+    shards = []
+    for i, rows in enumerate((slice(0, 2000), slice(2000, 5000))):
+        csv = tmp_path / f"shard{i}.csv"
+        df.iloc[rows].to_csv(csv, index=False)
+        shards.append(StreamingCorrelationBackend(csv, chunksize=600))
+
+    # First pass: every worker sketches its own shard
+    sketched = [s.accumulate(CorrelationMethod.SPEARMAN, rank=False)
+                for s in shards]
+    ranked = [s.accumulate(CorrelationMethod.SPEARMAN) for s in shards]
+    with pytest.raises(ValueError, match="same sketches"):
+        SpearmanAccumulator.from_dict(ranked[0].to_dict()).merge(ranked[1])
+
+    merged = combine_accumulators([
+        SpearmanAccumulator.from_dict(s.to_dict()) for s in sketched
+    ])
+    assert not merged.ranked
+    assert merged.sketches["age"].n == 5000
+
+    # Second pass: every worker ranks its shard with the merged sketches
+    combined = combine_accumulators([
+        SpearmanAccumulator.from_dict(
+            s.accumulate(CorrelationMethod.SPEARMAN, merged.sketches).to_dict()
+        )
+        for s in shards
+    ])
+    assert combined.pearson.n == 5000
+    np.testing.assert_allclose(
+        combined.correlation(), df.corr(method="spearman"), atol=0.02
+    )
@@ -1,5 +1,13 @@
-from heartpredict.backend.survival import SurvivalBackend
+from heartpredict.backend.survival import (
+    Stratification,
+    SurvivalBackend,
+    load_survival_tables,
+    render_kaplan_meier_plot,
+    render_stratified_kaplan_meier_plots,
+    save_survival_tables,
+)
 from heartpredict.data import MLData
+from heartpredict.enums import BoolColumn
 
 from typing import Callable
 from pathlib import Path
@@ -15,3 +23,96 @@ def test_use_pretrained_regression_model_and_create_kaplan_meier_plot_42(
     survival_backend = SurvivalBackend(ml_data)
     survival_backend.create_kaplan_meier_plot_for(regressor_dir)
     assert Path("results/survival/kaplan_meier_plot.png").exists()
+
+
+def test_compare_risk_groups_with_logrank_tests_42(
+        ml_data_func: Callable[..., MLData]) -> None:
+    regressor_dir = Path("results/trained_models/regressor/"
+                         "LogisticRegression_model_42.joblib")
+    survival_backend = SurvivalBackend(ml_data_func())
+    survival_backend.assign_risk_groups(regressor_dir)
+    results = survival_backend.compare_risk_groups()
+    assert results[0].groups == ("Low Risk", "Medium Risk", "High Risk")
+    assert results[0].degrees_of_freedom == 2
+    assert results[0].p_value < 0.05
+    assert len(results) == 4
+
+
+def test_survival_tables_round_trip_and_render_42(
+        ml_data_func: Callable[..., MLData], tmp_path: Path) -> None:
+    regressor_dir = Path("results/trained_models/regressor/"
+                         "LogisticRegression_model_42.joblib")
+    survival_backend = SurvivalBackend(ml_data_func())
+    tables = survival_backend.calculate_survival_tables(regressor_dir)
+    assert list(tables["group"].unique()) == ["Low Risk", "Medium Risk", "High Risk"]
+    assert {"timeline", "at_risk", "survival", "ci_lower"} <= set(tables.columns)
+
+    save_survival_tables(tables, tmp_path / "tables.json")
+    loaded = load_survival_tables(tmp_path / "tables.json")
+    assert loaded.equals(tables)
+
+    render_kaplan_meier_plot(loaded, tmp_path / "plot.png")
+    assert (tmp_path / "plot.png").exists()
+
+
+def test_death_event_scores_are_cached_42(
+        ml_data_func: Callable[..., MLData], tmp_path: Path) -> None:
+    regressor_dir = Path("results/trained_models/regressor/"
+                         "LogisticRegression_model_42.joblib")
+    survival_backend = SurvivalBackend(ml_data_func())
+    survival_backend.scores_dir = tmp_path
+    scores = survival_backend.predict_death_event_prob(regressor_dir)
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+    survival_backend.model.model = None
+    cached = survival_backend.predict_death_event_prob(regressor_dir)
+    assert (cached == scores).all()
+
+
+def test_stratify_by_quantiles_and_covariates_42(
+        ml_data_func: Callable[..., MLData]) -> None:
+    regressor_dir = Path("results/trained_models/regressor/"
+                         "LogisticRegression_model_42.joblib")
+    survival_backend = SurvivalBackend(ml_data_func(), "time", "DEATH_EVENT")
+    tables = survival_backend.calculate_stratified_survival_tables(
+        [
+            Stratification(quantiles=5),
+            Stratification(covariates=(BoolColumn.SEX, BoolColumn.SMOKING)),
+            Stratification(quantiles=2, covariates=(BoolColumn.SEX,)),
+        ],
+        regressor_dir,
+    )
+    groups = tables.groupby("stratification", sort=False)["group"].unique()
+    assert list(groups["risk_q5"]) == [f"Risk Q{i}" for i in range(1, 6)]
+    assert list(groups["sex_x_smoking"]) == [
+        "Female, Not smoking", "Female, Is smoking",
+        "Male, Not smoking", "Male, Is smoking"
+    ]
+    assert list(groups["risk_q2_x_sex"])[-1] == "Risk Q2, Male"
+
+    # Each stratum starts with all of its patients at risk.
+    starts = tables[tables["timeline"] == 0].groupby("stratification")["at_risk"]
+    assert (starts.sum() == 5000).all()
+
+
+def test_render_saved_stratified_tables_per_stratification_42(
+        ml_data_func: Callable[..., MLData], tmp_path: Path) -> None:
+    regressor_dir = Path("results/trained_models/regressor/"
+                         "LogisticRegression_model_42.joblib")
+    stratifications = [
+        Stratification(quantiles=3),
+        Stratification(quantiles=2, covariates=(BoolColumn.HIGH_BLOOD_PRESSURE,)),
+    ]
+    tables = SurvivalBackend(ml_data_func()).calculate_stratified_survival_tables(
+        stratifications, regressor_dir
+    )
+    save_survival_tables(tables, tmp_path / "tables.json")
+    loaded = load_survival_tables(tmp_path / "tables.json")
+
+    assert [
+        Stratification.from_name(name) for name in loaded["stratification"].unique()
+    ] == stratifications
+    render_stratified_kaplan_meier_plots(loaded, output_file=tmp_path / "km.png")
+    assert sorted(p.name for p in tmp_path.glob("*.png")) == [
+        "km_risk_q2_x_high_blood_pressure.png", "km_risk_q3.png"
+    ]
@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import numpy as np
+from heartpredict.data import ProjectData
+from heartpredict.enums import BoolColumn, Column
+from heartpredict.synthetic import synthetic_cohort
+
+
+def test_synthetic_cohort_matches_schema(tmp_path: Path) -> None:
+    real = ProjectData.build(Path("data/heart_failure_clinical_records.csv")).df
+    cohort = synthetic_cohort(20_000, seed=1)
+
+    assert list(cohort.columns) == [c.value for c in Column]
+    assert (cohort.dtypes == real.dtypes).all()
+    assert cohort.equals(synthetic_cohort(20_000, seed=1))
+    for column in real.columns:
+        assert cohort[column].min() >= real[column].min()
+        assert cohort[column].max() <= real[column].max()
+    for column in [*BoolColumn, Column.DEATH_EVENT]:
+        assert set(np.unique(cohort[column.value])) == {0, 1}
+    # Older patients die more often, as in the real data
+    older = cohort["age"] > 70
+    assert cohort["DEATH_EVENT"][older].mean() > cohort["DEATH_EVENT"][~older].mean()
+
+    csv = tmp_path / "cohort.csv"
+    cohort.to_csv(csv, index=False)
+    assert ProjectData(csv).df.shape == (20_000, len(Column))